@@ -0,0 +1,45 @@
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+class ResponseCache:
+    """
+    Caché LRU con vigencia (TTL) para respuestas de la API. Cada entrada guarda
+    la generación de la bodega con la que se calculó: al cambiar la generación
+    toda la caché se descarta.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, generation: Hashable) -> Any:
+        """Valor vigente de `key` para `generation`, o None si no está en la caché."""
+        now = time.monotonic()
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+        return None
+
+    def put(self, key: Hashable, generation: Hashable, value: Any):
+        """Guarda `value`, salvo que la generación haya cambiado mientras se calculaba."""
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
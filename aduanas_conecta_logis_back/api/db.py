@@ -0,0 +1,161 @@
+
+import threading
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional
+import duckdb
+from fastapi import HTTPException
+from aduanas_conecta_logis_back.etl.generation import read_generation
+from aduanas_conecta_logis_back.etl.catalog import (
+    DATOS_IDTY_SQL, DECLARATION_TABLES, LAKE_TABLES, create_analytical_views, declaration_rollup_sql,
+    lake_table_sql, read_lake_pointer
+)
+
+# Nombre con el que se adjunta la bodega en las instancias de DuckDB de la API.
+_CATALOG = "bodega"
+
+class ConnectionPool:
+    """
+    Mantiene una única conexión de sólo lectura a la bodega por generación y
+    entrega a cada hilo su propio cursor sobre ella, reutilizándolo entre
+    peticiones. Cuando la ETL avanza la generación se abre otra conexión; la
+    anterior sigue abierta mientras algún hilo tenga su cursor sobre ella (las
+    consultas en curso terminan con la versión que empezaron) y se cierra
+    cuando el último de ellos pide un cursor nuevo.
+
+    Cada conexión es una instancia de DuckDB aparte, en memoria y con la bodega
+    adjunta en sólo lectura: `duckdb.connect` sobre la misma ruta devolvería
+    la instancia anterior, que todavía apunta al archivo reemplazado.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connection = None
+        self._generation = None
+        # Cantidad de hilos con su cursor sobre cada conexión, vigente o retirada.
+        self._users: Dict[duckdb.DuckDBPyConnection, int] = {}
+
+    def version(self) -> Hashable:
+        """Versión de los datos publicados; al cambiar se reabre la conexión y se descarta la caché."""
+        return read_generation()
+
+    def _check_exists(self):
+        if not self.db_path.exists():
+            raise HTTPException(
+                status_code=503,
+                detail=f"Base de datos no encontrada en la ruta '{self.db_path}'. Por favor, ejecute la ETL primero."
+            )
+
+    def _attach(self, config: Optional[Dict[str, Any]] = None) -> duckdb.DuckDBPyConnection:
+        """Instancia de DuckDB en memoria con la bodega adjunta en sólo lectura."""
+        self._check_exists()
+        try:
+            connection = duckdb.connect(config=config or {})
+            connection.execute(f"ATTACH '{self.db_path.as_posix()}' AS {_CATALOG} (READ_ONLY)")
+            connection.execute(f"USE {_CATALOG}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al conectar con la base de datos: {e}")
+        return connection
+
+    def _open(self, generation: Hashable):
+        self._connection = self._attach()
+        self._generation = generation
+
+    def _new_cursor(self, connection: duckdb.DuckDBPyConnection) -> duckdb.DuckDBPyConnection:
+        cursor = connection.cursor()
+        cursor.execute(f"USE {_CATALOG}")
+        return cursor
+
+    def open_snapshot(self, config: Optional[Dict[str, Any]] = None) -> duckdb.DuckDBPyConnection:
+        """
+        Abre una conexión propia para lecturas largas, como las exportaciones por
+        streaming, que el llamador debe cerrar. Es una instancia de DuckDB aparte
+        (en memoria, con la bodega adjunta en sólo lectura): sigue leyendo la
+        misma versión aunque la ETL publique otra, y no retiene la instancia
+        compartida, que DuckDB no dejaría reabrir mientras haya un resultado
+        en curso sobre ella. `config` son opciones de esa instancia, como
+        `memory_limit` y `temp_directory`.
+        """
+        return self._attach(config)
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        """Devuelve el cursor del hilo actual, abriendo o renovando la conexión si hace falta."""
+        previous = getattr(self._local, "connection", None)
+        with self._lock:
+            # La versión se lee bajo el lock: una lectura atrasada no retira una conexión más nueva.
+            generation = self.version()
+            if self._connection is None or self._generation != generation:
+                self._retire_connection()
+                self._open(generation)
+            connection = self._connection
+            # El cursor se renueva si la conexión cambió (nueva generación o tras close()).
+            # El hilo ya no usa el anterior: suelta su conexión, que se cierra si estaba retirada y sin otros hilos.
+            if previous is not connection:
+                self._local.cursor = self._new_cursor(connection)
+                self._local.connection = connection
+                self._users[connection] = self._users.get(connection, 0) + 1
+                if previous is not None:
+                    self._release(previous)
+        return self._local.cursor
+
+    def _release(self, connection: duckdb.DuckDBPyConnection):
+        self._users[connection] -= 1
+        if not self._users[connection]:
+            del self._users[connection]
+            if connection is not self._connection:
+                connection.close()
+
+    def _retire_connection(self):
+        """Deja de entregar la conexión vigente; se cierra ya si ningún hilo tiene un cursor sobre ella."""
+        if self._connection is not None and not self._users.get(self._connection):
+            self._connection.close()
+        self._connection = None
+        self._generation = None
+
+    def close(self):
+        """Retira la conexión compartida; los cursores se recrean en el próximo uso."""
+        with self._lock:
+            self._retire_connection()
+
+class ParquetPool(ConnectionPool):
+    """
+    Variante para réplicas de sólo consulta que no tienen acceso a la bodega;
+    `db_path` es la carpeta LAKE_DIR. Abre una base en memoria con vistas sobre
+    la instantánea Parquet publicada, `datos_idty` y los totales por
+    declaración calculados sobre ellas y las mismas vistas analíticas de la
+    bodega. La versión es la instantánea vigente, de modo que se renueva
+    cuando la ETL publica otra.
+    """
+
+    def version(self) -> Hashable:
+        pointer = read_lake_pointer(self.db_path)
+        return pointer["snapshot"] if pointer else None
+
+    def _lake_connection(self, snapshot: Hashable, config: Optional[Dict[str, Any]] = None) -> duckdb.DuckDBPyConnection:
+        if snapshot is None:
+            raise HTTPException(
+                status_code=503,
+                detail=f"No hay una copia en Parquet publicada en '{self.db_path}'. Por favor, ejecute la ETL con LAKE_EXPORT."
+            )
+        try:
+            connection = duckdb.connect(config=config or {})
+            for table_name in LAKE_TABLES:
+                connection.execute(f"CREATE VIEW {table_name} AS {lake_table_sql(self.db_path / snapshot, table_name)}")
+            connection.execute(f"CREATE VIEW datos_idty AS {DATOS_IDTY_SQL}")
+            for table_name in DECLARATION_TABLES:
+                connection.execute(f"CREATE VIEW {table_name} AS {declaration_rollup_sql(table_name)}")
+            create_analytical_views(connection)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al abrir la copia en Parquet: {e}")
+        return connection
+
+    def _open(self, snapshot: Hashable):
+        self._connection = self._lake_connection(snapshot)
+        self._generation = snapshot
+
+    def _new_cursor(self, connection: duckdb.DuckDBPyConnection) -> duckdb.DuckDBPyConnection:
+        return connection.cursor()
+
+    def open_snapshot(self, config: Optional[Dict[str, Any]] = None) -> duckdb.DuckDBPyConnection:
+        return self._lake_connection(self.version(), config)
@@ -0,0 +1,101 @@
+
+import asyncio
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+from fastapi import HTTPException
+from .metrics import QUERY_REQUESTS
+
+class QueryExecutor:
+    """
+    Ejecuta el trabajo bloqueante de las consultas (DuckDB, el índice en
+    memoria y la serialización) en un grupo propio de hilos, de modo que los
+    endpoints pueden ser `async` sin ocupar el threadpool de Starlette.
+
+    Cada endpoint admite a lo sumo `max_concurrency` ejecuciones a la vez (o la
+    cantidad indicada en `limits`); las demás esperan su turno hasta
+    `queue_timeout` segundos y después se rechazan con 503. Las consultas
+    idénticas que llegan mientras una está en curso no se vuelven a ejecutar:
+    esperan ese mismo resultado (single-flight) sin ocupar turno.
+    """
+
+    def __init__(self, max_workers: int, max_concurrency: int, queue_timeout: float, limits: Optional[Dict[str, int]] = None):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.limits = limits or {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="duckdb")
+        self._loop = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+    def _bind_loop(self):
+        """Los semáforos y tareas en curso pertenecen a un event loop: se renuevan si cambia (p. ej. con TestClient)."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphores = {}
+            self._in_flight = {}
+
+    def start(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """
+        Lanza `fn(*args)` en un hilo del grupo y devuelve su `Future`. A
+        diferencia de `submit`, permite saber cuándo termina la llamada aunque
+        se cancele la espera, porque el hilo no se puede interrumpir.
+        """
+        return self._executor.submit(fn, *args)
+
+    async def submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Ejecuta `fn(*args)` en un hilo del grupo, sin límite por endpoint."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def acquire(self, endpoint: str) -> asyncio.Semaphore:
+        """
+        Espera un turno de `endpoint` y devuelve el semáforo que el llamador debe
+        liberar. Responde 503 si no se libera ninguno dentro de `queue_timeout`.
+        """
+        self._bind_loop()
+        semaphore = self._semaphores.get(endpoint)
+        if semaphore is None:
+            semaphore = self._semaphores[endpoint] = asyncio.Semaphore(self.limits.get(endpoint, self.max_concurrency))
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            QUERY_REQUESTS.labels(endpoint=endpoint, result="rejected").inc()
+            raise HTTPException(
+                status_code=503,
+                detail="El servidor está atendiendo demasiadas consultas de este tipo. Intente nuevamente en unos segundos.",
+                headers={"Retry-After": "1"},
+            )
+        return semaphore
+
+    async def _execute(self, endpoint: str, fn: Callable[[], Any]) -> Any:
+        semaphore = await self.acquire(endpoint)
+        try:
+            QUERY_REQUESTS.labels(endpoint=endpoint, result="executed").inc()
+            return await self.submit(fn)
+        finally:
+            semaphore.release()
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Da el error por leído aunque todos los clientes se hayan desconectado.
+
+    async def run(self, endpoint: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Ejecuta `fn` con el límite de `endpoint`, o espera el resultado de la
+        ejecución en curso con la misma `key`. La ejecución sigue aunque el
+        cliente que la inició se desconecte, porque otros pueden estar esperándola.
+        """
+        self._bind_loop()
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._execute(endpoint, fn))
+            self._in_flight[key] = task
+            task.add_done_callback(functools.partial(self._forget, key))
+        else:
+            QUERY_REQUESTS.labels(endpoint=endpoint, result="coalesced").inc()
+        return await asyncio.shield(task)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
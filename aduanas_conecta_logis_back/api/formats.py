@@ -0,0 +1,111 @@
+
+import io
+from typing import Iterator, Optional, Tuple
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+# Formatos de respuesta de los endpoints de consulta. "json" (filas) es el
+# formato por defecto; los demás se serializan directamente desde el resultado
+# Arrow de DuckDB, sin pasar por pandas ni por los modelos de Pydantic.
+MEDIA_TYPES = {
+    "json": "application/json",
+    "columnar": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+_ACCEPT_FORMATS = {
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+}
+
+# Formatos de las exportaciones por streaming: se escriben lote a lote desde
+# un RecordBatchReader de DuckDB, así que la memoria no depende del total de filas.
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """
+    Elige el formato de la respuesta: el parámetro `format` tiene prioridad; si
+    no viene, se busca un tipo Arrow o Parquet en la cabecera Accept.
+    """
+    if requested is not None:
+        if requested not in MEDIA_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Formato desconocido: '{requested}'. Opciones: {', '.join(MEDIA_TYPES)}."
+            )
+        return requested
+    for media_type in (accept or "").split(","):
+        fmt = _ACCEPT_FORMATS.get(media_type.split(";")[0].strip())
+        if fmt is not None:
+            return fmt
+    return "json"
+
+def serialize_table(table: pa.Table, fmt: str, single: bool = False) -> Tuple[bytes, str]:
+    """
+    Serializa una tabla Arrow al formato pedido y devuelve (cuerpo, media type).
+    Con `single=True` el JSON por filas es el primer registro en lugar de una lista.
+    """
+    if fmt == "arrow":
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), MEDIA_TYPES[fmt]
+    if fmt == "parquet":
+        sink = pa.BufferOutputStream()
+        pq.write_table(table, sink)
+        return sink.getvalue().to_pybytes(), MEDIA_TYPES[fmt]
+    if fmt == "columnar":
+        content = table.to_pydict()
+    else:
+        rows = table.to_pylist()
+        content = rows[0] if single else rows
+    return JSONResponse(content).body, MEDIA_TYPES[fmt]
+
+def export_sql(query: str, fmt: str) -> str:
+    """
+    Adapta la consulta de una exportación a su formato. Para NDJSON, DuckDB
+    arma cada línea con `to_json`, mucho más rápido que serializar fila a fila
+    en Python; CSV y Parquet se escriben desde las columnas tal cual.
+    """
+    if fmt == "ndjson":
+        return f"SELECT to_json(fila)::VARCHAR AS linea FROM ({query}) AS fila"
+    return query
+
+def iter_export_chunks(reader: pa.RecordBatchReader, fmt: str) -> Iterator[bytes]:
+    """
+    Serializa los lotes de `reader` en el formato pedido y entrega un bloque de
+    bytes por lote (la cabecera CSV va sólo en el primero y el pie de Parquet
+    al final). Es un generador síncrono: cada lote se lee recién al pedirlo.
+    """
+    if fmt == "ndjson":
+        for batch in reader:
+            if batch.num_rows:
+                yield ("\n".join(batch.column(0).to_pylist()) + "\n").encode("utf-8")
+        return
+    buffer = io.BytesIO()
+    def drain() -> bytes:
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+    if fmt == "csv":
+        writer = pacsv.CSVWriter(buffer, reader.schema)
+    else:
+        writer = pq.ParquetWriter(buffer, reader.schema, compression="zstd")
+    try:
+        for batch in reader:
+            writer.write_batch(batch)
+            data = drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield drain()
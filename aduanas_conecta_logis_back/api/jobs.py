@@ -0,0 +1,123 @@
+
+import multiprocessing
+import os
+import re
+import socket
+import threading
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from aduanas_conecta_logis_back.etl.progress import JobProgress, new_status, read_status, write_status
+
+_JOB_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+def _run_job(status_path: str):
+    """Punto de entrada del proceso hijo: ejecuta el flujo completo de la ETL."""
+    from aduanas_conecta_logis_back.etl.main import etl_parent_flow
+    etl_parent_flow(status_path=status_path)
+
+def _process_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobManager:
+    """
+    Ejecuta los trabajos de ETL de a uno, cada uno en un proceso aparte para que
+    la carga no compita con las peticiones de la API. Mientras un trabajo corre
+    se admite a lo sumo uno en cola: pedir otro devuelve el que ya espera, que
+    de todos modos leerá los archivos más recientes. Entre procesos (varios
+    workers de la API, la ETL o el reproceso lanzados a mano) los ordena el
+    bloqueo de construcción de la bodega (ver `etl.generation.build_lock`).
+    """
+
+    def __init__(self, jobs_dir: Path):
+        self.jobs_dir = jobs_dir
+        self._context = multiprocessing.get_context("spawn")
+        self._condition = threading.Condition()
+        # Trabajos en espera; el que está corriendo ya no forma parte de la cola.
+        self._queue: "deque[str]" = deque()
+        self._worker: Optional[threading.Thread] = None
+
+    def _status_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _owner(self) -> Dict[str, Any]:
+        """Proceso de la API que encoló un trabajo y lo ejecuta."""
+        return {"host": socket.gethostname(), "pid": os.getpid()}
+
+    def _is_abandoned(self, job_id: str, owner: Optional[Dict[str, Any]]) -> bool:
+        """
+        Un trabajo sin terminar está abandonado si el proceso de la API que lo
+        encoló ya no existe. Los de este mismo proceso sólo lo están si ya no
+        esperan en su cola. Los de otro equipo no se pueden comprobar y se dejan
+        como están; los estados sin dueño son de versiones anteriores.
+        """
+        if not owner:
+            return True
+        if owner["host"] != socket.gethostname():
+            return False
+        if owner["pid"] == os.getpid():
+            return job_id not in self._queue
+        return not _process_exists(owner["pid"])
+
+    def _abandon_stale_jobs(self):
+        """
+        Marca como fallidos los trabajos que quedaron sin terminar porque el
+        proceso de la API que los ejecutaba ya no existe. Se hace al lanzar el
+        primer trabajo y no al construir el gestor, porque los procesos hijos
+        también importan este módulo. Los trabajos de otros workers de la API
+        que siguen vivos no se tocan.
+        """
+        if not self.jobs_dir.exists():
+            return
+        for status_path in self.jobs_dir.glob("*.json"):
+            status = read_status(status_path)
+            if status and status["state"] in ("queued", "running") and self._is_abandoned(status["job_id"], status.get("owner")):
+                JobProgress(status_path).fail(RuntimeError("La API se reinició antes de que el trabajo terminara."))
+
+    def submit(self) -> Tuple[Dict[str, Any], bool]:
+        """Encola un trabajo y devuelve su estado, junto con si se creó uno nuevo."""
+        with self._condition:
+            if self._queue:
+                return self.get(self._queue[-1]), False
+            if self._worker is None or not self._worker.is_alive():
+                self._abandon_stale_jobs()
+                self._worker = threading.Thread(target=self._work, name="etl-job-manager", daemon=True)
+                self._worker.start()
+            job_id = uuid.uuid4().hex
+            status = new_status(job_id)
+            status["owner"] = self._owner()
+            write_status(self._status_path(job_id), status)
+            self._queue.append(job_id)
+            self._condition.notify()
+        return self.get(job_id), True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado de un trabajo; None si el identificador no existe."""
+        if not _JOB_ID_PATTERN.fullmatch(job_id):
+            return None
+        return read_status(self._status_path(job_id))
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                job_id = self._queue.popleft()
+            status_path = self._status_path(job_id)
+            process = self._context.Process(target=_run_job, args=(str(status_path),), name=f"etl-{job_id}")
+            process.start()
+            process.join()
+            status = read_status(status_path)
+            if status is None:
+                # El archivo de estado se borró o quedó ilegible mientras corría el trabajo.
+                write_status(status_path, new_status(job_id))
+            if status is None or status["state"] not in ("succeeded", "failed"):
+                # El proceso terminó sin registrar su resultado (por ejemplo, fue terminado por el sistema).
+                JobProgress(status_path).fail(RuntimeError(f"El proceso de la ETL terminó con código {process.exitcode}."))
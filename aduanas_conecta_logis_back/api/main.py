@@ -1,17 +1,28 @@
 
-from datetime import date
-from typing import List, Optional
-import pandas as pd
-import duckdb
-import numpy as np
-from fastapi import FastAPI, HTTPException, Query, BackgroundTasks
+import asyncio
+from datetime import date, timedelta
+from typing import Any, AsyncIterator, Callable, Hashable, Iterator, List, Optional, Sequence, Tuple
+from fastapi import FastAPI, HTTPException, Query, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+import pyarrow as pa
 from pydantic import BaseModel
 
 # --- IMPORTACIONES CLAVE ---
 # Importamos la ruta a la DB y el flujo de la ETL desde su ÚNICA fuente de verdad en 'config.py'
-from aduanas_conecta_logis_back.etl.config import DB_PATH
-from aduanas_conecta_logis_back.etl.main import etl_parent_flow
+from aduanas_conecta_logis_back.etl.config import (
+    DB_PATH, ETL_JOBS_DIR, API_CACHE_MAXSIZE, API_CACHE_TTL_SECONDS, API_STORAGE, LAKE_DIR,
+    API_EXPORT_BATCH_ROWS, API_EXPORT_MEMORY_LIMIT, API_EXPORT_TEMP_DIR, TOP_EXPORTERS_PER_WEEK,
+    API_QUERY_WORKERS, API_ENDPOINT_CONCURRENCY, API_EXPORT_CONCURRENCY, API_QUEUE_TIMEOUT_SECONDS
+)
+from aduanas_conecta_logis_back.etl.catalog import TARIFF_CODE_DIGITS
+from .cache import ResponseCache
+from .db import ConnectionPool, ParquetPool
+from .executor import QueryExecutor
+from .formats import EXPORT_MEDIA_TYPES, negotiate_format, serialize_table, export_sql, iter_export_chunks
+from .jobs import JobManager
+from .memory_index import MemoryIndex
+from .metrics import REGISTRY, REQUEST_SECONDS, CACHE_REQUESTS, CONTENT_TYPE_LATEST, timed, EtlRunCollector, render_metrics
 
 # --- Configuración Inicial ---
 app = FastAPI(
@@ -22,18 +33,32 @@ app = FastAPI(
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
 # --- Lógica de la Base de Datos ---
+# Conexión de sólo lectura compartida (un cursor por hilo) y caché de respuestas,
+# ambas renovadas cuando la ETL avanza la generación de la bodega. Con
+# API_STORAGE=parquet la API consulta la copia en Parquet de LAKE_DIR y puede
+# correr como réplica sin acceso al archivo de la bodega.
+pool = ParquetPool(LAKE_DIR) if API_STORAGE == "parquet" else ConnectionPool(DB_PATH)
+response_cache = ResponseCache(maxsize=API_CACHE_MAXSIZE, ttl_seconds=API_CACHE_TTL_SECONDS)
+# Top de exportadores por semana y series por exportador, en memoria y
+# recargados con cada nueva versión de los datos.
+memory_index = MemoryIndex(pool.cursor, pool.version)
+# Los endpoints de consulta son async: DuckDB, el índice y la serialización
+# corren en estos hilos, con turnos limitados por endpoint y las consultas
+# idénticas simultáneas resueltas con una sola ejecución.
+query_executor = QueryExecutor(
+    max_workers=API_QUERY_WORKERS, max_concurrency=API_ENDPOINT_CONCURRENCY, queue_timeout=API_QUEUE_TIMEOUT_SECONDS,
+    limits={"export-declarations": API_EXPORT_CONCURRENCY}
+)
+# Los trabajos de ETL corren de a uno en un proceso aparte y publican la bodega
+# al terminar, por lo que la API no necesita soltar su conexión mientras tanto.
+job_manager = JobManager(ETL_JOBS_DIR)
+# Métricas por etapa de la última ejecución de la ETL, leídas de la bodega en cada scrape.
+REGISTRY.register(EtlRunCollector(pool.cursor))
+
 def get_db_connection():
-    """Establece y devuelve una conexión a la base de datos DuckDB."""
+    """Devuelve el cursor de sólo lectura del hilo actual sobre la base de datos DuckDB."""
     # DB_PATH ahora se importa directamente, garantizando que la API y la ETL siempre miren al mismo lugar.
-    if not DB_PATH.exists():
-        raise HTTPException(
-            status_code=503, 
-            detail=f"Base de datos no encontrada en la ruta '{DB_PATH}'. Por favor, ejecute la ETL primero."
-        )
-    try:
-        return duckdb.connect(database=str(DB_PATH), read_only=True)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al conectar con la base de datos: {e}")
+    return pool.cursor()
 
 # --- Modelos de Datos (Pydantic) ---
 class TrendData(BaseModel):
@@ -47,43 +72,402 @@ class ExporterRanking(BaseModel):
     nro_exportador: int
     total_fob: float
 
+class ExporterHistoryPoint(BaseModel):
+    period: str
+    total_fob: float
+
 class AverageWeight(BaseModel):
     average_weight_per_bulto: Optional[float]
 
-# --- Endpoint para Disparar la ETL ---
+class DeclarationItem(BaseModel):
+    fecha_aceptacion: str
+    numeroident: int
+    nro_exportador: Optional[int] = None
+    codigo_arancel: Optional[str] = None
+    fob_unitario: Optional[float] = None
+    peso_bruto_item: Optional[float] = None
+
+class EtlStage(BaseModel):
+    name: str
+    state: str
+    started_at: str
+    duration_seconds: Optional[float] = None
+    rows: Optional[int] = None
+
+class EtlJob(BaseModel):
+    job_id: str
+    state: str
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
+    generation: Optional[int] = None
+    stages: List[EtlStage] = []
+
+# --- Endpoints para Disparar y Seguir la ETL ---
 @app.post("/api/etl/trigger", status_code=202, tags=["ETL"])
-def trigger_etl(background_tasks: BackgroundTasks):
-    background_tasks.add_task(etl_parent_flow)
-    return {"message": "Proceso ETL iniciado en segundo plano. Revisa los logs de la consola para ver el progreso."}
+def trigger_etl():
+    job, created = job_manager.submit()
+    message = (
+        "Proceso ETL encolado; se ejecutará en un proceso aparte." if created
+        else "Ya hay un proceso ETL en espera; se devuelve ese trabajo."
+    )
+    return {"job_id": job["job_id"], "state": job["state"], "message": message}
+
+@app.get("/api/etl/jobs/{job_id}", response_model=EtlJob, tags=["ETL"])
+def get_etl_job(job_id: str):
+    """Estado de un trabajo de ETL: etapas, duración y filas cargadas en cada una."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No existe el trabajo de ETL '{job_id}'.")
+    return job
 
 # --- Endpoints de Consulta de Datos ---
+# Todos aceptan `format` (json, columnar, arrow o parquet) o una cabecera Accept
+# de Arrow/Parquet; el JSON por filas sigue siendo el formato por defecto. Los
+# endpoints que devuelven listas admiten paginación con `limit` y `offset`.
+# Los valores de los filtros nunca se interpolan en el SQL: se envían como
+# parámetros, con su tipo, y se comparan con columnas de fecha o enteras para
+# que DuckDB pueda descartar grupos de filas por sus mínimos y máximos.
+PAGE_SQL = "LIMIT ? OFFSET ?"
+
+def _week_start(day: date) -> date:
+    """Primer día de la semana '%Y-%W' que contiene a `day`: el lunes, o el 1 de enero para la semana 00."""
+    return max(day - timedelta(days=day.weekday()), day.replace(month=1, day=1))
+
+def _tariff_code_range(prefix: str) -> Tuple[int, int]:
+    """
+    Rango [desde, hasta) de los códigos arancelarios que empiezan con `prefix`:
+    en la bodega son enteros, sin los ceros a la izquierda.
+    """
+    scale = 10 ** (TARIFF_CODE_DIGITS - len(prefix))
+    return int(prefix) * scale, (int(prefix) + 1) * scale
+
+async def query_response(
+    key: Hashable, query: str, params: Sequence[Any], fmt: Optional[str], accept: Optional[str], single: bool = False
+) -> Response:
+    """
+    Toma la respuesta de la caché o ejecuta la consulta con sus parámetros en
+    `query_executor` y la serializa en el formato negociado. Las peticiones
+    idénticas simultáneas comparten una sola ejecución. Registra por separado
+    el tiempo de DuckDB y el de serialización.
+    """
+    fmt = negotiate_format(fmt, accept)
+    endpoint, key = key[0], (*key, fmt)
+    def compute():
+        with timed(endpoint, "execute"):
+            table = get_db_connection().execute(query, params).to_arrow_table()
+        with timed(endpoint, "serialize"):
+            result = serialize_table(table, fmt, single=single)
+        response_cache.put(key, version, result)
+        return result
+    with REQUEST_SECONDS.labels(endpoint=endpoint, format=fmt).time():
+        version = pool.version()
+        result = response_cache.get(key, version)
+        CACHE_REQUESTS.labels(endpoint=endpoint, result="miss" if result is None else "hit").inc()
+        if result is None:
+            result = await query_executor.run(endpoint, (key, version), compute)
+    body, media_type = result
+    return Response(content=body, media_type=media_type)
+
 @app.get("/api/trends/fob-daily", response_model=List[TrendData], tags=["Tendencias"])
-def get_daily_fob_trends(start_date: date, end_date: date):
+async def get_daily_fob_trends(
+    start_date: date,
+    end_date: date,
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    format: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
     """Consulta la vista pre-calculada de tendencias diarias."""
-    query = f"SELECT * FROM V_TENDENCIAS_DIARIAS WHERE CAST(period AS DATE) BETWEEN '{start_date}' AND '{end_date}';"
-    con = get_db_connection()
-    df = con.execute(query).fetchdf()
-    con.close()
-    df_cleaned = df.replace({np.nan: None})
-    return df_cleaned.to_dict(orient="records")
+    query = f"""
+        SELECT period, average_fob, change_from_previous
+        FROM V_TENDENCIAS_DIARIAS WHERE period_date BETWEEN ? AND ?
+        ORDER BY period_date {PAGE_SQL};
+    """
+    params = [start_date, end_date, limit, offset]
+    return await query_response(("fob-daily", start_date, end_date, limit, offset), query, params, format, accept)
 
 @app.get("/api/rankings/exporters-weekly", response_model=List[ExporterRanking], tags=["Rankings"])
-def get_weekly_exporter_rankings(start_date: date, end_date: date):
-    """Consulta la vista pre-calculada de rankings semanales."""
-    start_week = start_date.strftime('%Y-%W')
-    end_week = end_date.strftime('%Y-%W')
-    query = f"SELECT * FROM V_RANKING_SEMANAL WHERE week BETWEEN '{start_week}' AND '{end_week}';"
-    con = get_db_connection()
-    df = con.execute(query).fetchdf()
-    con.close()
-    df_cleaned = df.replace({np.nan: None})
-    return df_cleaned.to_dict(orient="records")
+async def get_weekly_exporter_rankings(
+    start_date: date,
+    end_date: date,
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    format: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
+    """Consulta la vista pre-calculada de rankings semanales (las semanas que tocan el rango de fechas)."""
+    query = f"""
+        SELECT week, rank, NRO_EXPORTADOR AS nro_exportador, total_fob
+        FROM V_RANKING_SEMANAL WHERE week_start BETWEEN ? AND ?
+        ORDER BY week_start, rank, nro_exportador {PAGE_SQL};
+    """
+    params = [_week_start(start_date), end_date, limit, offset]
+    return await query_response(("exporters-weekly", start_date, end_date, limit, offset), query, params, format, accept)
+
+async def index_response(
+    key: Hashable, lookup: Callable[[], Optional[pa.Table]], limit: Optional[int], offset: int,
+    fmt: Optional[str], accept: Optional[str]
+) -> Response:
+    """
+    Responde desde el índice en memoria: `lookup` recibe nada y devuelve la
+    tabla de la respuesta, o None si no existe el recurso pedido. No pasa por
+    la caché, porque la búsqueda ya es más barata que la serialización, pero
+    corre en `query_executor`: la primera petición tras publicar otra versión
+    carga el índice.
+    """
+    fmt = negotiate_format(fmt, accept)
+    endpoint = key[0]
+    def compute():
+        with timed(endpoint, "lookup"):
+            table = lookup()
+        if table is None:
+            raise HTTPException(status_code=404, detail="No hay datos para el recurso pedido.")
+        with timed(endpoint, "serialize"):
+            return serialize_table(table.slice(offset, limit), fmt)
+    with REQUEST_SECONDS.labels(endpoint=endpoint, format=fmt).time():
+        body, media_type = await query_executor.run(endpoint, (*key, fmt, pool.version()), compute)
+    return Response(content=body, media_type=media_type)
+
+@app.get("/api/rankings/exporters-weekly/top", response_model=List[ExporterRanking], tags=["Rankings"])
+async def get_weekly_top_exporters(
+    start_date: date,
+    end_date: date,
+    top: int = Query(10, ge=1, le=TOP_EXPORTERS_PER_WEEK),
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    format: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
+    """
+    Los `top` primeros exportadores de cada semana que toca el rango de fechas,
+    desde el ranking precalculado en memoria. Con empates en el último puesto
+    pueden aparecer más de `top` exportadores, como en el ranking completo.
+    """
+    lookup = lambda: memory_index.snapshot().top_exporters(_week_start(start_date), end_date, top)
+    key = ("exporters-weekly-top", start_date, end_date, top, limit, offset)
+    return await index_response(key, lookup, limit, offset, format, accept)
+
+@app.get("/api/exporters/{nro_exportador}/history", response_model=List[ExporterHistoryPoint], tags=["Exportadores"])
+async def get_exporter_history(
+    nro_exportador: int,
+    granularity: str = Query("weekly", pattern="^(daily|weekly)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    format: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
+    """
+    FOB total del exportador por semana ('%Y-%W') o por día, en orden
+    cronológico, desde la serie precalculada en memoria. Sin fechas devuelve
+    la serie completa; con `weekly` se incluye la semana que contiene a
+    `start_date`. Responde 404 si el exportador no tiene exportaciones.
+    """
+    if granularity == "weekly" and start_date is not None:
+        start_date = _week_start(start_date)
+    lookup = lambda: memory_index.snapshot().exporter_history(nro_exportador, granularity, start_date, end_date)
+    key = ("exporter-history", nro_exportador, granularity, start_date, end_date, limit, offset)
+    return await index_response(key, lookup, limit, offset, format, accept)
 
 @app.get("/api/stats/average-weight-per-bulto", response_model=AverageWeight, tags=["Estadísticas"])
-def get_average_weight_per_bulto(start_date: date, end_date: date):
+async def get_average_weight_per_bulto(
+    start_date: date,
+    end_date: date,
+    format: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
     """Consulta la vista pre-calculada de peso promedio por bulto."""
-    query = f"SELECT AVG(average_weight_per_bulto) as average_weight_per_bulto FROM V_PESO_PROMEDIO_BULTO WHERE fecha_aceptacion BETWEEN '{start_date}' AND '{end_date}';"
-    con = get_db_connection()
-    result = con.execute(query).fetchdf().to_dict(orient="records")
-    df_cleaned = pd.DataFrame(result).replace({np.nan: None})
-    return df_cleaned.to_dict(orient='records')[0]
\ No newline at end of file
+    query = "SELECT AVG(average_weight_per_bulto) as average_weight_per_bulto FROM V_PESO_PROMEDIO_BULTO WHERE fecha_aceptacion BETWEEN ? AND ?;"
+    params = [start_date, end_date]
+    return await query_response(("average-weight-per-bulto", start_date, end_date), query, params, format, accept, single=True)
+
+# Columnas y origen de los ítems de declaración, comunes a la consulta
+# paginada y a la exportación. 'datos_idty' guarda las claves sustitutas; el
+# exportador y el código se leen de sus dimensiones, que también reciben los
+# filtros (DuckDB los traslada al recorrido de los ítems como rango de claves).
+DECLARATION_COLUMNS = """
+    strftime(d.FECHAACEPT, '%Y-%m-%d') AS fecha_aceptacion,
+    d.NUMEROIDENT AS numeroident,
+    x.NRO_EXPORTADOR AS nro_exportador,
+    a.codigo_arancel,
+    d.FOBUNITARIO AS fob_unitario,
+    d.PESOBRUTOITEM AS peso_bruto_item
+"""
+DECLARATION_FROM = """
+    datos_idty AS d
+    LEFT JOIN dim_exportador AS x USING (exportador_id)
+    LEFT JOIN dim_arancel AS a USING (arancel_id)
+"""
+# Orden de los ítems. Los ítems de una declaración comparten fecha y número,
+# así que se desempata por el resto de las columnas de la respuesta (las claves
+# equivalen al exportador y al código): las filas que siguen empatadas son
+# idénticas, y cada página sale siempre igual. 'datos_idty' es una vista en
+# las réplicas sobre Parquet, sin rowid.
+DECLARATION_ORDER = "d.FECHAACEPT, d.NUMEROIDENT, d.exportador_id, d.arancel_id, d.FOBUNITARIO, d.PESOBRUTOITEM"
+
+def _declaration_filters(
+    start_date: date, end_date: date, nro_exportador: Optional[int], codigo_arancel: Optional[str]
+) -> Tuple[List[str], List[Any]]:
+    """Condiciones sobre DECLARATION_FROM y sus parámetros para los filtros de declaraciones."""
+    conditions = ["d.FECHAACEPT >= ?", "d.FECHAACEPT < ?"]
+    params: List[Any] = [start_date, end_date + timedelta(days=1)]
+    if nro_exportador is not None:
+        conditions.append("x.NRO_EXPORTADOR = ?")
+        params.append(nro_exportador)
+    if codigo_arancel is not None:
+        if len(codigo_arancel) == TARIFF_CODE_DIGITS:
+            # Código completo: igualdad, que puede resolverse con el índice de la dimensión.
+            conditions.append("a.CODIGOARANCEL = ?")
+            params.append(int(codigo_arancel))
+        else:
+            conditions.append("a.CODIGOARANCEL >= ? AND a.CODIGOARANCEL < ?")
+            params.extend(_tariff_code_range(codigo_arancel))
+    return conditions, params
+
+@app.get("/api/declarations", response_model=List[DeclarationItem], tags=["Declaraciones"])
+async def get_declarations(
+    start_date: date,
+    end_date: date,
+    nro_exportador: Optional[int] = Query(None, ge=0),
+    codigo_arancel: Optional[str] = Query(None, pattern=r"^\d{1,8}$", description="Código arancelario o prefijo (1 a 8 dígitos)."),
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    format: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
+    """
+    Ítems de las declaraciones aceptadas entre las fechas indicadas, filtrados
+    opcionalmente por exportador y por prefijo del código arancelario. Lee
+    'datos_idty', ordenada por fecha, de modo que sólo se recorren los grupos
+    de filas del rango pedido.
+    """
+    conditions, params = _declaration_filters(start_date, end_date, nro_exportador, codigo_arancel)
+    query = f"""
+        SELECT {DECLARATION_COLUMNS}
+        FROM {DECLARATION_FROM} WHERE {" AND ".join(conditions)}
+        ORDER BY {DECLARATION_ORDER} {PAGE_SQL};
+    """
+    params.extend([limit, offset])
+    key = ("declarations", start_date, end_date, nro_exportador, codigo_arancel, limit, offset)
+    return await query_response(key, query, params, format, accept)
+
+# --- Exportaciones por Streaming ---
+# Descargas completas de un rango, sin paginar ni pasar por la caché. Se leen
+# en lotes de API_EXPORT_BATCH_ROWS filas desde una conexión propia y cada lote
+# se envía en cuanto se serializa. El ORDER BY necesita ver todo el rango antes
+# de entregar la primera fila; con el límite de memoria DuckDB lo ordena por
+# partes en disco, así que la memoria no crece con el rango.
+EXPORT_DUCKDB_CONFIG = {"memory_limit": API_EXPORT_MEMORY_LIMIT, "temp_directory": str(API_EXPORT_TEMP_DIR)}
+
+def _release_from_thread(loop: asyncio.AbstractEventLoop, slot: asyncio.Semaphore):
+    """Libera `slot` desde un hilo del grupo. Si su event loop ya terminó, el turno no tiene a quién liberar."""
+    try:
+        loop.call_soon_threadsafe(slot.release)
+    except RuntimeError:
+        pass
+
+async def _stream_export(chunks: Iterator[bytes], connection, slot: asyncio.Semaphore) -> AsyncIterator[bytes]:
+    """
+    Entrega los bloques de `chunks` leyendo cada uno en `query_executor`. Si el
+    cliente se desconecta, Starlette cancela este generador: el `finally`
+    detiene la lectura, cierra la conexión y libera el turno de la descarga
+    sin consumir el resto del resultado. Si la desconexión llega mientras un
+    hilo lee un bloque, el generador no se puede cerrar todavía: el cierre
+    queda a cargo de ese hilo cuando termina la lectura.
+    """
+    loop = asyncio.get_running_loop()
+    reading = None
+
+    def close():
+        try:
+            chunks.close()
+        finally:
+            connection.close()
+
+    try:
+        while True:
+            reading = query_executor.start(next, chunks, None)
+            chunk = await asyncio.wrap_future(reading)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        if reading is None or reading.done():
+            try:
+                close()
+            finally:
+                slot.release()
+        else:
+            def close_after_read(_):
+                try:
+                    close()
+                finally:
+                    _release_from_thread(loop, slot)
+            reading.add_done_callback(close_after_read)
+
+@app.get("/api/export/declarations", tags=["Exportación"])
+async def export_declarations(
+    start_date: date,
+    end_date: date,
+    nro_exportador: Optional[int] = Query(None, ge=0),
+    codigo_arancel: Optional[str] = Query(None, pattern=r"^\d{1,8}$", description="Código arancelario o prefijo (1 a 8 dígitos)."),
+    include_bultos: bool = Query(False, description="Agrega el total de bultos de cada declaración."),
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$")
+):
+    """
+    Descarga todos los ítems de declaración del rango (con los mismos filtros
+    que /api/declarations) como CSV, NDJSON o Parquet, enviados por partes a
+    medida que DuckDB entrega cada lote. Con `include_bultos` se agrega el total
+    de bultos de la declaración. La descarga lee una misma versión de la bodega
+    de principio a fin, aunque la ETL publique otra mientras tanto.
+    """
+    conditions, params = _declaration_filters(start_date, end_date, nro_exportador, codigo_arancel)
+    columns, join = DECLARATION_COLUMNS, ""
+    if include_bultos:
+        columns += ", CAST(b.total_bultos AS BIGINT) AS total_bultos"
+        join = "LEFT JOIN bultos_por_declaracion AS b USING (NUMEROIDENT)"
+    query = f"""
+        SELECT {columns}
+        FROM {DECLARATION_FROM} {join}
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {DECLARATION_ORDER}
+    """
+    def open_reader():
+        connection = pool.open_snapshot(EXPORT_DUCKDB_CONFIG)
+        try:
+            return connection, connection.execute(export_sql(query, format), params).to_arrow_reader(API_EXPORT_BATCH_ROWS)
+        except Exception as e:
+            connection.close()
+            raise HTTPException(status_code=500, detail=f"Error al consultar la base de datos: {e}")
+    # El turno se ocupa durante toda la descarga y lo libera _stream_export.
+    slot = await query_executor.acquire("export-declarations")
+    opening = query_executor.start(open_reader)
+    try:
+        connection, reader = await asyncio.wrap_future(opening)
+    except BaseException:
+        # Si el cliente se fue mientras se abría la consulta, open_reader sigue
+        # en su hilo: la conexión se cierra y el turno se libera cuando termine.
+        loop = asyncio.get_running_loop()
+        def close_after_open(future):
+            try:
+                if not future.cancelled() and future.exception() is None:
+                    future.result()[0].close()
+            finally:
+                _release_from_thread(loop, slot)
+        opening.add_done_callback(close_after_open)
+        raise
+    filename = f"declaraciones_{start_date}_{end_date}.{format}"
+    return StreamingResponse(
+        _stream_export(iter_export_chunks(reader, format), connection, slot),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# --- Métricas de Rendimiento ---
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Métricas de la API y de la última ejecución de la ETL en formato de texto de Prometheus."""
+    return Response(content=await query_executor.submit(render_metrics), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,96 @@
+
+import threading
+from datetime import date
+from typing import Callable, Hashable, Optional
+import duckdb
+import numpy as np
+import pyarrow as pa
+
+# Índice en memoria de los resúmenes precalculados más consultados: el top de
+# exportadores por semana y la serie de FOB semanal y diaria de cada
+# exportador. Se carga una vez por versión de los datos publicados y responde
+# con búsquedas binarias sobre arreglos ordenados, sin pasar por DuckDB.
+
+def _dates(table: pa.Table, column: str) -> np.ndarray:
+    return table.column(column).to_numpy().astype("datetime64[D]")
+
+def _day(value: date) -> np.datetime64:
+    return np.datetime64(value, "D")
+
+class _ExporterSeries:
+    """Serie de un resumen ordenada por (NRO_EXPORTADOR, fecha), con el tramo de filas de cada exportador."""
+
+    def __init__(self, table: pa.Table, date_column: str):
+        self.table = table.combine_chunks()
+        self.dates = _dates(self.table, date_column)
+        nros = self.table.column("NRO_EXPORTADOR").to_numpy()
+        self.nros, self.starts = np.unique(nros, return_index=True)
+        self.ends = np.append(self.starts[1:], len(nros))
+
+    def lookup(self, nro: int, start: Optional[date], end: Optional[date]) -> Optional[pa.Table]:
+        position = np.searchsorted(self.nros, nro)
+        if position == len(self.nros) or self.nros[position] != nro:
+            return None
+        first, last = int(self.starts[position]), int(self.ends[position])
+        dates = self.dates[first:last]
+        if start is not None:
+            first += int(np.searchsorted(dates, _day(start), "left"))
+        if end is not None:
+            last = int(self.starts[position]) + int(np.searchsorted(dates, _day(end), "right"))
+        return self.table.slice(first, max(last - first, 0)).select(["period", "total_fob"])
+
+class IndexSnapshot:
+    """Contenido del índice para una versión de los datos."""
+
+    def __init__(self, connection: duckdb.DuckDBPyConnection):
+        self.top = connection.execute("""
+            SELECT week_start, week, rank, NRO_EXPORTADOR AS nro_exportador, total_fob
+            FROM V_TOP_EXPORTADORES_SEMANAL
+            ORDER BY week_start, rank, nro_exportador
+        """).to_arrow_table().combine_chunks()
+        self.top_weeks = _dates(self.top, "week_start")
+        self.top_ranks = self.top.column("rank").to_numpy()
+        self.weekly = _ExporterSeries(connection.execute("""
+            SELECT NRO_EXPORTADOR, week_start, week AS period, total_fob
+            FROM V_FOB_EXPORTADOR_SEMANAL
+            ORDER BY NRO_EXPORTADOR, week_start
+        """).to_arrow_table(), "week_start")
+        self.daily = _ExporterSeries(connection.execute("""
+            SELECT NRO_EXPORTADOR, fecha, strftime(fecha, '%Y-%m-%d') AS period, total_fob
+            FROM V_FOB_EXPORTADOR_DIARIO
+            ORDER BY NRO_EXPORTADOR, fecha
+        """).to_arrow_table(), "fecha")
+
+    def top_exporters(self, first_week: date, end: date, top: int) -> pa.Table:
+        """Los `top` primeros de cada semana que empieza entre `first_week` y `end`, por semana y puesto."""
+        first = int(np.searchsorted(self.top_weeks, _day(first_week), "left"))
+        last = int(np.searchsorted(self.top_weeks, _day(end), "right"))
+        rows = np.flatnonzero(self.top_ranks[first:last] <= top) + first
+        return self.top.take(rows).select(["week", "rank", "nro_exportador", "total_fob"])
+
+    def exporter_history(self, nro: int, granularity: str, start: Optional[date], end: Optional[date]) -> Optional[pa.Table]:
+        """Serie del exportador entre `start` y `end` (fechas del período), o None si no tiene exportaciones."""
+        series = self.weekly if granularity == "weekly" else self.daily
+        return series.lookup(nro, start, end)
+
+class MemoryIndex:
+    """
+    Mantiene el IndexSnapshot de la versión vigente de los datos y lo recarga
+    cuando la versión cambia. La recarga se hace bajo un lock: las peticiones
+    que llegan mientras tanto esperan esa misma carga en lugar de repetirla.
+    """
+
+    def __init__(self, cursor_factory: Callable[[], duckdb.DuckDBPyConnection], version: Callable[[], Hashable]):
+        self.cursor_factory = cursor_factory
+        self.version = version
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+
+    def snapshot(self) -> IndexSnapshot:
+        version = self.version()
+        with self._lock:
+            if self._snapshot is None or self._version != version:
+                self._snapshot = IndexSnapshot(self.cursor_factory())
+                self._version = version
+            return self._snapshot
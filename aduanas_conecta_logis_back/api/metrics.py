@@ -0,0 +1,96 @@
+
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+import duckdb
+from fastapi import HTTPException
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+from aduanas_conecta_logis_back.etl.catalog import RUNS_TABLE
+
+# Métricas de la API en formato Prometheus, expuestas en /metrics. Se usa un
+# registro propio para no mezclarlas con las del proceso de Prefect.
+REGISTRY = CollectorRegistry()
+
+QUERY_SECONDS = Histogram(
+    "aduanas_api_query_seconds",
+    "Duración de cada fase de las consultas: 'execute' (DuckDB), 'lookup' (índice en memoria) y 'serialize' (formato de respuesta).",
+    ["endpoint", "phase"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    registry=REGISTRY,
+)
+REQUEST_SECONDS = Histogram(
+    "aduanas_api_request_seconds",
+    "Duración total de las consultas, incluida la caché.",
+    ["endpoint", "format"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    registry=REGISTRY,
+)
+CACHE_REQUESTS = Counter(
+    "aduanas_api_cache_requests_total",
+    "Consultas encontradas en la caché ('hit') o no ('miss'); ver aduanas_api_query_requests_total.",
+    ["endpoint", "result"],
+    registry=REGISTRY,
+)
+
+QUERY_REQUESTS = Counter(
+    "aduanas_api_query_requests_total",
+    "Consultas ejecutadas ('executed'), unidas a una idéntica en curso ('coalesced') o rechazadas por falta de turno ('rejected').",
+    ["endpoint", "result"],
+    registry=REGISTRY,
+)
+
+@contextmanager
+def timed(endpoint: str, phase: str) -> Iterator[None]:
+    """Mide una fase de la consulta de `endpoint`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        QUERY_SECONDS.labels(endpoint=endpoint, phase=phase).observe(time.perf_counter() - started)
+
+class EtlRunCollector:
+    """
+    Publica las métricas por etapa de la última ejecución de la ETL guardada en
+    la tabla `etl_runs` de la bodega. Se leen en cada consulta a /metrics, de
+    modo que reflejan siempre la generación publicada.
+    """
+
+    _FIELDS = {
+        "wall_seconds": "Tiempo de reloj de la etapa en la última ejecución de la ETL.",
+        "cpu_seconds": "Tiempo de CPU del proceso durante la etapa en la última ejecución de la ETL.",
+        "peak_rss_mb": "RSS máximo del proceso durante la etapa, en MB.",
+        "rows_in": "Filas recibidas por la etapa.",
+        "rows_out": "Filas producidas por la etapa.",
+        "rows_rejected": "Filas rechazadas por la etapa.",
+        "bytes_read": "Bytes de archivos de origen leídos por la etapa.",
+    }
+
+    def __init__(self, cursor_factory: Callable[[], duckdb.DuckDBPyConnection]):
+        self.cursor_factory = cursor_factory
+
+    def collect(self):
+        try:
+            rows = self.cursor_factory().execute(f"""
+                SELECT stage, {", ".join(self._FIELDS)}, started_at
+                FROM {RUNS_TABLE}
+                WHERE run_id = (SELECT arg_max(run_id, started_at) FROM {RUNS_TABLE}) AND file_path IS NULL
+            """).fetchall()
+        except (HTTPException, duckdb.Error):
+            # Sin bodega o sin ejecuciones registradas todavía.
+            return
+        if not rows:
+            return
+        started = GaugeMetricFamily("aduanas_etl_last_run_started_timestamp_seconds", "Inicio de la última ejecución de la ETL.")
+        started.add_metric([], rows[0][-1].timestamp())
+        yield started
+        for position, field in enumerate(self._FIELDS, start=1):
+            family = GaugeMetricFamily(f"aduanas_etl_stage_{field}", self._FIELDS[field], labels=["stage"])
+            for row in rows:
+                if row[position] is not None:
+                    family.add_metric([row[0]], row[position])
+            yield family
+
+def render_metrics() -> bytes:
+    return generate_latest(REGISTRY)
+
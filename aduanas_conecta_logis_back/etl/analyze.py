@@ -1,131 +1,264 @@
 
 import duckdb
+import pandas as pd
+from datetime import datetime
 from pathlib import Path
 from prefect import task, get_run_logger
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+from .config import QUALITY_PROFILE_MODE, TABLE_NAMES
+from .load import partition_filter
+from .instrumentation import instrumented
 
-def _build_quality_query(table_name: str, columns_to_check: List[str]) -> str:
+# Tablas perfiladas: las dos tablas base y la tabla intermedia del modelado.
+PROFILED_TABLES = [TABLE_NAMES["exportaciones"], TABLE_NAMES["bultos"], "datos_idty"]
+PROFILE_MODES = ("approx", "exact")
+
+# Métricas numéricas por tabla, partición (AAAAMM) y columna. Se guardan por
+# partición para que una carga incremental sólo perfile las particiones nuevas;
+# el reporte suma los conteos de todas a partir de esta tabla, sin volver a
+# recorrer los datos.
+METRICS_TABLE = "quality_metrics"
+
+# Cuantiles de las columnas numéricas; los deciles forman un histograma de igual frecuencia.
+QUANTILES = [0.01, 0.1, 0.2, 0.25, 0.3, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.9, 0.99]
+
+# Cotas de error del modo aproximado, guardadas junto a cada métrica.
+# approx_count_distinct de DuckDB es un HyperLogLog de 64 registros: su error
+# relativo estándar es 1.04 / sqrt(64). approx_quantile (t-digest) se mantuvo
+# bajo 0,1% de error de rango con 2 millones de filas; se declara 1% de rango
+# como cota conservadora. Mínimos, máximos, promedios y conteos son exactos.
+DISTINCT_RELATIVE_ERROR = 1.04 / 64 ** 0.5
+QUANTILE_RANK_ERROR = 0.01
+
+_PARTITION_KEY = "CAST(year(FECHAACEPT) * 100 + month(FECHAACEPT) AS INTEGER)"
+_NUMERIC_TYPES = (
+    "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT",
+    "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT", "FLOAT", "DOUBLE", "DECIMAL"
+)
+# Conteos que el reporte suma entre particiones y expresa como fracción de las filas.
+_COUNT_METRICS = ("non_null", "distinct", "negative", "future", "blank")
+
+def _column_metrics(col: str, data_type: str, mode: str) -> List[Tuple[str, str, float]]:
+    """Métricas de una columna según su tipo, como (nombre, expresión SQL, cota de error)."""
+    quoted = f'"{col}"'
+    metrics = [("non_null", f"COUNT({quoted})", 0.0)]
+    if mode == "exact":
+        metrics.append(("distinct", f"COUNT(DISTINCT {quoted})", 0.0))
+    else:
+        metrics.append(("distinct", f"approx_count_distinct({quoted})", DISTINCT_RELATIVE_ERROR))
+
+    if data_type.startswith(_NUMERIC_TYPES):
+        value = f"CAST({quoted} AS DOUBLE)"
+        metrics += [
+            ("min", f"MIN({value})", 0.0),
+            ("max", f"MAX({value})", 0.0),
+            ("mean", f"AVG({value})", 0.0),
+            ("negative", f"COUNT(*) FILTER (WHERE {quoted} < 0)", 0.0),
+        ]
+        if mode == "exact":
+            metrics.append(("quantiles", f"quantile_cont({value}, {QUANTILES})", 0.0))
+        else:
+            metrics.append(("quantiles", f"approx_quantile({value}, {QUANTILES})", QUANTILE_RANK_ERROR))
+    elif data_type.startswith(("TIMESTAMP", "DATE")):
+        # Fechas como segundos desde 1970, para guardarlas como número.
+        metrics += [
+            ("min", f"epoch(MIN({quoted}))", 0.0),
+            ("max", f"epoch(MAX({quoted}))", 0.0),
+            ("future", f"COUNT(*) FILTER (WHERE {quoted} > current_localtimestamp())", 0.0),
+        ]
+    elif data_type == "VARCHAR":
+        metrics += [
+            ("blank", f"COUNT(*) FILTER (WHERE trim({quoted}) = '')", 0.0),
+            ("max_length", f"MAX(length({quoted}))", 0.0),
+        ]
+    return metrics
+
+def profile_table(
+    con: duckdb.DuckDBPyConnection, table_name: str, mode: str, partitions: Optional[List[int]] = None
+) -> List[Tuple]:
+    """
+    Perfila todas las columnas de la tabla con una única consulta agrupada por
+    partición, es decir, una sola pasada sobre los datos. Con `partitions` sólo
+    se leen esas particiones. Devuelve filas (tabla, partición, columna,
+    métrica, valor, cota de error).
+    """
+    columns = con.execute(
+        "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = ? ORDER BY ordinal_position",
+        [table_name]
+    ).fetchall()
+    specs = [(None, "row_count", "COUNT(*)", 0.0)]
+    for col, data_type in columns:
+        specs += [(col, metric, expr, error) for metric, expr, error in _column_metrics(col, data_type, mode)]
+
+    where = ""
+    if partitions is not None:
+        where = f"WHERE {partition_filter(partitions, 'year(FECHAACEPT)', 'month(FECHAACEPT)')}"
+    selections = ", ".join(f"{expr} AS m{i}" for i, (_, _, expr, _) in enumerate(specs))
+    query = f"SELECT {_PARTITION_KEY} AS partition_key, {selections} FROM {table_name} {where} GROUP BY partition_key"
+
+    records = []
+    for partition_key, *values in con.execute(query).fetchall():
+        for (col, metric, _, error), value in zip(specs, values):
+            if metric == "quantiles":
+                for q, quantile in zip(QUANTILES, value or []):
+                    records.append((table_name, partition_key, col, f"p{round(q * 100):02d}", quantile, error))
+            else:
+                records.append((table_name, partition_key, col, metric, value, error))
+    return records
+
+def _save_metrics(
+    con: duckdb.DuckDBPyConnection, records: List[Tuple], mode: str, partitions: Optional[List[int]]
+):
+    """Reemplaza en `quality_metrics` las particiones perfiladas de cada tabla."""
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {METRICS_TABLE} (
+            table_name VARCHAR,
+            partition_key INTEGER,
+            column_name VARCHAR,
+            metric VARCHAR,
+            value DOUBLE,
+            error_bound DOUBLE,
+            mode VARCHAR,
+            profiled_at TIMESTAMP
+        )
+    """)
+    df = pd.DataFrame(records, columns=["table_name", "partition_key", "column_name", "metric", "value", "error_bound"])
+    df["mode"] = mode
+    df["profiled_at"] = datetime.now()
+
+    tables = ", ".join(f"'{table}'" for table in PROFILED_TABLES)
+    scope = ""
+    if partitions is not None:
+        scope = f"AND partition_key IN ({', '.join(str(int(key)) for key in partitions)})"
+    con.execute("BEGIN TRANSACTION")
+    con.execute(f"DELETE FROM {METRICS_TABLE} WHERE table_name IN ({tables}) {scope}")
+    con.register("new_metrics", df)
+    con.execute(f"INSERT INTO {METRICS_TABLE} SELECT * FROM new_metrics")
+    con.unregister("new_metrics")
+    con.execute("COMMIT")
+
+def _summarize(con: duckdb.DuckDBPyConnection) -> Dict[str, Any]:
     """
-    Construye una única consulta SQL para calcular todas las métricas de calidad de datos.
+    Resume por tabla y columna el perfil guardado. Los conteos se suman entre
+    particiones; la unicidad es la menor entre particiones, porque los
+    distintos no se pueden sumar.
     """
-    selections = ["COUNT(*) AS total_rows"]
-    
-    for col in columns_to_check:
-        # Métrica de Completitud (conteo de no nulos)
-        selections.append(f"COUNT({col}) AS non_null_{col}")
-        
-        # Métrica de Unicidad (conteo de distintos)
-        selections.append(f"COUNT(DISTINCT {col}) AS distinct_{col}")
-
-        # Métricas de Validez (ejemplos específicos)
-        if col == "FECHAACEPT":
-            selections.append(f"SUM(CASE WHEN strftime({col}, '%Y') = '2025' THEN 1 ELSE 0 END) AS valid_year_{col}")
-        if col == "FOBUNITARIO":
-            selections.append(f"SUM(CASE WHEN {col} >= 0 THEN 1 ELSE 0 END) AS valid_positive_{col}")
-            
-    query = f"SELECT {', '.join(selections)} FROM {table_name};"
-    return query
+    rows = con.execute(f"""
+        WITH partition_rows AS (
+            SELECT table_name, partition_key, value AS row_count FROM {METRICS_TABLE} WHERE metric = 'row_count'
+        )
+        SELECT m.table_name, m.column_name, m.metric, SUM(m.value), MIN(m.value / NULLIF(r.row_count, 0)),
+               MAX(m.error_bound), COUNT(*)
+        FROM {METRICS_TABLE} AS m JOIN partition_rows AS r USING (table_name, partition_key)
+        WHERE m.metric IN ('row_count', {", ".join(f"'{metric}'" for metric in _COUNT_METRICS)})
+        GROUP BY ALL
+        ORDER BY m.table_name, m.column_name NULLS FIRST
+    """).fetchall()
+
+    tables = {}
+    for table_name, col, metric, total, min_ratio, error_bound, partitions in rows:
+        table = tables.setdefault(table_name, {"total_rows": 0, "partitions": 0, "columns": {}})
+        if metric == "row_count":
+            table["total_rows"], table["partitions"] = int(total), partitions
+            continue
+        column = table["columns"].setdefault(col, {"validity": {}})
+        if not table["total_rows"]:
+            continue
+        if metric == "non_null":
+            column["completeness"] = total / table["total_rows"]
+        elif metric == "distinct":
+            # HyperLogLog puede sobrestimar: la unicidad no pasa de 100%.
+            column["uniqueness"] = min(min_ratio, 1.0)
+            column["uniqueness_error"] = error_bound
+        else:
+            column["validity"][metric] = total / table["total_rows"]
+    return tables
 
 @task(name="Generate Data Quality Report")
-def generate_quality_report(db_path: Path, table_name: str, columns_to_check: List[str]) -> Dict[str, Any]:
+@instrumented("quality_report")
+def generate_quality_report(
+    db_path: Path, partitions: Optional[List[int]] = None, mode: str = QUALITY_PROFILE_MODE
+) -> Dict[str, Any]:
     """
-    Se conecta a la base de datos y genera un reporte de calidad de datos
-    utilizando una única y eficiente consulta SQL.
+    Perfila las tablas base y `datos_idty` (una pasada por tabla), guarda las
+    métricas en `quality_metrics` y devuelve el reporte resumido a partir de
+    esa tabla. Con `partitions` (carga incremental) sólo se perfilan esas
+    particiones y se conserva el perfil guardado de las demás.
     """
     logger = get_run_logger()
-    logger.info(f"Generando reporte de calidad para la tabla '{table_name}'...")
-    
-    report = {"table": table_name, "columns": {}}
-    
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Modo de perfil desconocido: '{mode}'. Opciones: {', '.join(PROFILE_MODES)}.")
+
+    report = {"mode": mode, "profiled_rows": 0, "total_rows": 0, "tables": {}}
     try:
-        con = duckdb.connect(database=str(db_path), read_only=True)
-        
-        query = _build_quality_query(table_name, columns_to_check)
-        logger.info(f"Ejecutando consulta de calidad:\n{query}")
-        
-        results = con.execute(query).fetchone()
-        
-        # Obtenemos los nombres de las columnas del resultado para mapear los valores
-        col_names = [desc[0] for desc in con.description]
-        result_dict = dict(zip(col_names, results))
-        
-        con.close()
-
-        total_rows = result_dict.get("total_rows", 0)
-        if total_rows == 0:
-            logger.warning("La tabla está vacía. No se puede generar el reporte.")
-            return report
-        
-        report["total_rows"] = total_rows
-
-        for col in columns_to_check:
-            non_null_count = result_dict.get(f"non_null_{col}", 0)
-            distinct_count = result_dict.get(f"distinct_{col}", 0)
-            
-            completeness = (non_null_count / total_rows) * 100
-            uniqueness = (distinct_count / total_rows) * 100
-            
-            validity_metrics = {}
-            if f"valid_year_{col}" in result_dict:
-                valid_count = result_dict[f"valid_year_{col}"]
-                validity_metrics["percentage_in_2025"] = f"{(valid_count / total_rows) * 100:.2f}%"
-            if f"valid_positive_{col}" in result_dict:
-                valid_count = result_dict[f"valid_positive_{col}"]
-                validity_metrics["percentage_positive"] = f"{(valid_count / total_rows) * 100:.2f}%"
-
-            report["columns"][col] = {
-                "completeness": f"{completeness:.2f}%",
-                "uniqueness": f"{uniqueness:.2f}%",
-                "validity": validity_metrics or "No checks defined"
-            }
-            
+        with duckdb.connect(database=str(db_path), read_only=False) as con:
+            if partitions is not None and not partitions:
+                logger.info("No hay particiones nuevas que perfilar; se conserva el perfil anterior.")
+            else:
+                scope = "todas las particiones" if partitions is None else f"las particiones {partitions}"
+                logger.info(f"Perfilando {', '.join(PROFILED_TABLES)} ({scope}) en modo '{mode}'...")
+                records = []
+                for table_name in PROFILED_TABLES:
+                    records += profile_table(con, table_name, mode, partitions)
+                _save_metrics(con, records, mode, partitions)
+                report["profiled_rows"] = int(sum(r[4] for r in records if r[3] == "row_count"))
+
+            report["tables"] = _summarize(con)
+            report["total_rows"] = report["tables"].get(TABLE_NAMES["exportaciones"], {}).get("total_rows", 0)
+
     except Exception as e:
-        logger.error(f"Fallo al generar el reporte de calidad para '{table_name}': {e}", exc_info=True)
-        
+        logger.error(f"Fallo al generar el reporte de calidad: {e}", exc_info=True)
+
     return report
 
 def print_report_and_recommendations(report: Dict[str, Any]):
     """Imprime el reporte de calidad de forma legible y añade recomendaciones."""
     logger = get_run_logger()
     logger.info("--- INICIO REPORTE DE CALIDAD DE DATOS ---")
-    
-    table = report.get('table', 'N/A')
-    total_rows = report.get('total_rows', 'N/A')
-    
-    logger.info(f"Tabla: {table}")
-    logger.info(f"Total de Filas Analizadas: {total_rows}")
-    
-    if not report.get("columns"):
-        logger.warning("No se generaron métricas para las columnas.")
+    logger.info(f"Modo: {report.get('mode', 'N/A')}. Filas perfiladas en esta ejecución: {report.get('profiled_rows', 0)}")
+
+    if not report.get("tables"):
+        logger.warning("No se generaron métricas para las tablas.")
         logger.info("--- FIN REPORTE DE CALIDAD DE DATOS ---")
         return
-        
+
     recommendations = []
-    for col, metrics in report.get("columns", {}).items():
-        logger.info(f"\n  Columna: {col}")
-        completeness = metrics.get('completeness', '0.00%')
-        uniqueness = metrics.get('uniqueness', '0.00%')
-        validity = metrics.get('validity', {})
-
-        logger.info(f"    - Completitud: {completeness}")
-        logger.info(f"    - Unicidad: {uniqueness}")
-        if isinstance(validity, dict) and validity:
-            logger.info("    - Chequeos de Validez:")
-            for check, value in validity.items():
-                logger.info(f"      - {check}: {value}")
-
-        # Lógica para generar recomendaciones
-        completeness_val = float(completeness.replace('%',''))
-        if completeness_val < 98.0:
-            recommendations.append(f"- {col}: Completitud baja ({completeness}). Investigar el origen de valores nulos o problemas de parseo.")
-        
-        if col == "NUMEROIDENT" and float(uniqueness.replace('%','')) < 100.0:
-            recommendations.append(f"- {col}: Se esperan valores únicos, pero la unicidad es del {uniqueness}. Revisar posibles duplicados en la fuente.")
-            
+    for table_name, table in report["tables"].items():
+        logger.info(f"\nTabla: {table_name}")
+        logger.info(f"Total de Filas: {table['total_rows']} en {table['partitions']} partición(es)")
+
+        for col, metrics in table["columns"].items():
+            logger.info(f"\n  Columna: {col}")
+            completeness = metrics.get("completeness", 0.0)
+            uniqueness = metrics.get("uniqueness")
+            error = metrics.get("uniqueness_error") or 0.0
+
+            logger.info(f"    - Completitud: {completeness:.2%}")
+            if uniqueness is not None:
+                margin = f" (±{error:.0%})" if error else ""
+                logger.info(f"    - Unicidad (menor por partición): {uniqueness:.2%}{margin}")
+            if metrics["validity"]:
+                logger.info("    - Chequeos de Validez:")
+                for check, value in metrics["validity"].items():
+                    logger.info(f"      - {check}: {value:.2%}")
+
+            # Lógica para generar recomendaciones
+            if completeness < 0.98:
+                recommendations.append(f"- {table_name}.{col}: Completitud baja ({completeness:.2%}). Investigar el origen de valores nulos o problemas de parseo.")
+
+            # Con el modo aproximado sólo se avisa si la unicidad queda bajo 100% aun con el margen de error.
+            if table_name == TABLE_NAMES["exportaciones"] and col == "NUMEROIDENT" and uniqueness is not None and uniqueness * (1 + error) < 1.0:
+                recommendations.append(f"- {table_name}.{col}: Se esperan valores únicos, pero la unicidad es del {uniqueness:.2%}. Revisar posibles duplicados en la fuente.")
+
+            if metrics["validity"].get("negative"):
+                recommendations.append(f"- {table_name}.{col}: {metrics['validity']['negative']:.2%} de valores negativos.")
+            if metrics["validity"].get("future"):
+                recommendations.append(f"- {table_name}.{col}: {metrics['validity']['future']:.2%} de fechas en el futuro.")
+
     logger.info("\n--- Recomendaciones Basadas en Hallazgos ---")
     if recommendations:
         for rec in recommendations:
             logger.info(rec)
     else:
         logger.info("¡No se encontraron problemas críticos de calidad de datos! Los datos parecen consistentes.")
-    logger.info("--- FIN REPORTE DE CALIDAD DE DATOS ---")
\ No newline at end of file
+    logger.info("--- FIN REPORTE DE CALIDAD DE DATOS ---")
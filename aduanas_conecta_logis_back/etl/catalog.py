@@ -0,0 +1,186 @@
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import duckdb
+
+# Nombres y SQL de lo que la ETL publica y la API consulta: la tabla de
+# métricas de las ejecuciones, las dimensiones y la tabla base de los modelos,
+# las vistas analíticas y la distribución de la copia en Parquet. Sólo depende de DuckDB y
+# de la biblioteca estándar, para que la API pueda importarlo al iniciar sin
+# cargar Prefect, pandas ni las tareas de la ETL.
+
+RUNS_TABLE = "etl_runs"
+
+# Códigos arancelarios de 8 dígitos; en las tablas de origen son enteros, sin
+# los ceros a la izquierda.
+TARIFF_CODE_DIGITS = 8
+_TARIFF_CODE = f"lpad(CAST(CODIGOARANCEL AS VARCHAR), {TARIFF_CODE_DIGITS}, '0')"
+
+# Dimensiones de exportadores y códigos arancelarios. Cada valor distinto de la
+# clave natural recibe una clave sustituta entera y densa, y los ítems de
+# 'datos_idty' y los resúmenes guardan sólo esa clave. Las claves no cambian
+# entre cargas (los valores nuevos se numeran a continuación del mayor), así
+# que las particiones ya exportadas siguen siendo válidas. `attributes` son
+# columnas derivadas de la clave natural: para los aranceles, el código con
+# sus ceros y la jerarquía del Sistema Armonizado (capítulo, partida y
+# subpartida), para agregar por ella sin recorrer los ítems.
+DIMENSION_TABLES: Dict[str, Dict[str, Any]] = {
+    "dim_exportador": {"key": "exportador_id", "natural_key": "NRO_EXPORTADOR", "attributes": {}},
+    "dim_arancel": {
+        "key": "arancel_id",
+        "natural_key": "CODIGOARANCEL",
+        "attributes": {
+            "codigo_arancel": _TARIFF_CODE,
+            "capitulo": f"left({_TARIFF_CODE}, 2)",
+            "partida": f"left({_TARIFF_CODE}, 4)",
+            "subpartida": f"left({_TARIFF_CODE}, 6)",
+        },
+    },
+}
+
+# Ítems de las declaraciones con las claves de las dimensiones, base de los
+# totales y resúmenes y de la consulta filtrada de declaraciones de la API.
+DATOS_IDTY_SQL = """
+    SELECT
+        e.FECHAACEPT,
+        e.NUMEROIDENT,
+        x.exportador_id,
+        a.arancel_id,
+        CAST(e.FOBUNITARIO AS DOUBLE) AS FOBUNITARIO,
+        CAST(e.PESOBRUTOITEM AS DOUBLE) AS PESOBRUTOITEM
+    FROM exportaciones AS e
+    LEFT JOIN dim_exportador AS x ON x.NRO_EXPORTADOR = CAST(e.NRO_EXPORTADOR AS BIGINT)
+    LEFT JOIN dim_arancel AS a ON a.CODIGOARANCEL = CAST(e.CODIGOARANCEL AS BIGINT)
+"""
+
+# Totales por declaración (NUMEROIDENT). Se cruzan uno a uno entre sí para
+# calcular el peso por bulto: cruzar directamente ítems con líneas de bultos
+# multiplicaría las filas (ítems × bultos) e inflaría ambas sumas.
+DECLARATION_TABLES = {
+    "bultos_por_declaracion": ("bultos_exportaciones", "SUM(CANTIDADBULTO) AS total_bultos"),
+    "peso_por_declaracion": ("datos_idty", "SUM(PESOBRUTOITEM) AS peso_total"),
+}
+
+def declaration_rollup_sql(table_name: str, where: str = "") -> str:
+    """Una fila por NUMEROIDENT con su primera FECHAACEPT y el total agregado."""
+    source_table, aggregate = DECLARATION_TABLES[table_name]
+    return f"""
+        SELECT NUMEROIDENT, MIN(FECHAACEPT) AS FECHAACEPT, {aggregate}
+        FROM {source_table}
+        {where}
+        GROUP BY NUMEROIDENT
+    """
+
+# Vistas analíticas que consulta la API, definidas sobre las tablas de resumen.
+# Las réplicas de consulta las crean igual sobre las copias en Parquet.
+ANALYTICAL_VIEWS = {
+    # Tendencias diarias de FOB
+    "V_TENDENCIAS_DIARIAS": """
+        WITH daily_trends AS (
+            SELECT fecha AS period_date, fob_sum / NULLIF(fob_count, 0) AS average_fob
+            FROM agg_fob_diario
+        ),
+        daily_lag AS (
+            SELECT strftime(period_date, '%Y-%m-%d') AS period, period_date, average_fob,
+                   LAG(average_fob, 1) OVER (ORDER BY period_date) AS prev_day_avg
+            FROM daily_trends
+        )
+        SELECT period, period_date, average_fob,
+               CASE WHEN prev_day_avg > 0 THEN ((average_fob - prev_day_avg) / prev_day_avg) * 100 ELSE NULL END AS change_from_previous
+        FROM daily_lag
+    """,
+    # Ranking semanal de exportadores
+    "V_RANKING_SEMANAL": """
+        SELECT s.week, s.week_start, RANK() OVER (PARTITION BY s.week_start ORDER BY s.total_fob DESC) AS rank,
+               x.NRO_EXPORTADOR, s.total_fob
+        FROM agg_fob_semanal_exportador AS s
+        LEFT JOIN dim_exportador AS x USING (exportador_id)
+    """,
+    # Primeros exportadores de cada semana, precalculados (ver TOP_EXPORTERS_PER_WEEK)
+    "V_TOP_EXPORTADORES_SEMANAL": """
+        SELECT t.week, t.week_start, t.rank, x.NRO_EXPORTADOR, t.total_fob
+        FROM agg_top_exportadores_semanal AS t
+        LEFT JOIN dim_exportador AS x USING (exportador_id)
+    """,
+    # Series de FOB de cada exportador, por semana y por día
+    "V_FOB_EXPORTADOR_SEMANAL": """
+        SELECT x.NRO_EXPORTADOR, s.week, s.week_start, s.total_fob
+        FROM agg_fob_semanal_exportador AS s
+        JOIN dim_exportador AS x USING (exportador_id)
+    """,
+    "V_FOB_EXPORTADOR_DIARIO": """
+        SELECT x.NRO_EXPORTADOR, s.fecha, s.total_fob
+        FROM agg_fob_diario_exportador AS s
+        JOIN dim_exportador AS x USING (exportador_id)
+    """,
+    # Peso promedio por bulto
+    "V_PESO_PROMEDIO_BULTO": """
+        SELECT
+            peso_sum / NULLIF(bultos_sum, 0) AS average_weight_per_bulto,
+            fecha AS fecha_aceptacion
+        FROM agg_peso_bultos_diario
+    """,
+}
+
+def create_analytical_views(con: duckdb.DuckDBPyConnection) -> List[str]:
+    """Crea (o reemplaza) las vistas analíticas en la conexión y devuelve sus nombres."""
+    for view_name, query in ANALYTICAL_VIEWS.items():
+        con.execute(f"CREATE OR REPLACE VIEW {view_name} AS {query}")
+    return list(ANALYTICAL_VIEWS)
+
+# Copia en Parquet (ver `lake.py`): archivo que indica la instantánea publicada.
+POINTER_FILE = "CURRENT"
+
+# Tablas exportadas: columnas de partición (con la expresión que las calcula)
+# y orden de las filas dentro de cada archivo. En las tablas de hechos año y
+# mes son columnas propias y se guardan también en los archivos, para conservar
+# el orden de las columnas; en las de resumen se derivan de la fecha, sólo
+# aparecen en la ruta y no forman parte de la tabla. Las tablas con
+# `incremental` en falso se exportan completas aunque la carga sea incremental.
+LAKE_TABLES: Dict[str, Dict[str, Any]] = {
+    "exportaciones": {
+        "partition_by": {"año": "año", "mes": "mes"}, "order_by": "FECHAACEPT, NUMEROIDENT", "derived": False, "incremental": True,
+    },
+    "bultos_exportaciones": {
+        "partition_by": {"año": "año", "mes": "mes"}, "order_by": "FECHAACEPT, NUMEROIDENT", "derived": False, "incremental": True,
+    },
+    "agg_fob_diario": {
+        "partition_by": {"año": "year(fecha)", "mes": "month(fecha)"}, "order_by": "fecha", "derived": True, "incremental": True,
+    },
+    # Los bultos de un mes pueden cambiar el total de una fecha de otro mes
+    # (ver modeling.TOUCHED_DECLARATION_DATES); es chica y se reescribe completa.
+    "agg_peso_bultos_diario": {
+        "partition_by": {"año": "year(fecha)", "mes": "month(fecha)"}, "order_by": "fecha", "derived": True, "incremental": False,
+    },
+    # Las semanas ('%Y-%W') pueden cruzar meses pero no años.
+    "agg_fob_semanal_exportador": {
+        "partition_by": {"año": "CAST(left(week, 4) AS INTEGER)"}, "order_by": "week, exportador_id", "derived": True, "incremental": True,
+    },
+    "agg_top_exportadores_semanal": {
+        "partition_by": {"año": "CAST(left(week, 4) AS INTEGER)"}, "order_by": "week, rank", "derived": True, "incremental": True,
+    },
+    "agg_fob_diario_exportador": {
+        "partition_by": {"año": "year(fecha)", "mes": "month(fecha)"}, "order_by": "exportador_id, fecha", "derived": True, "incremental": True,
+    },
+    # Las dimensiones son chicas y no se particionan: se reescriben completas.
+    "dim_exportador": {"partition_by": {}, "order_by": "exportador_id", "derived": False, "incremental": True},
+    "dim_arancel": {"partition_by": {}, "order_by": "arancel_id", "derived": False, "incremental": True},
+}
+
+def read_lake_pointer(lake_dir: Path) -> Optional[Dict[str, Any]]:
+    """Instantánea publicada ({"snapshot", "generation"}), o None si aún no hay ninguna."""
+    try:
+        return json.loads((lake_dir / POINTER_FILE).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+def lake_table_sql(snapshot_dir: Path, table_name: str) -> str:
+    """Consulta que lee una tabla de la instantánea con el mismo esquema que en la bodega."""
+    spec = LAKE_TABLES[table_name]
+    pattern = (snapshot_dir / table_name).as_posix() + "/**/*.parquet"
+    if not spec["partition_by"]:
+        return f"SELECT * FROM read_parquet('{pattern}', hive_partitioning=false)"
+    hive_types = ", ".join(f"'{col}': INTEGER" for col in spec["partition_by"])
+    exclude = f" EXCLUDE ({', '.join(spec['partition_by'])})" if spec["derived"] else ""
+    return f"SELECT *{exclude} FROM read_parquet('{pattern}', hive_partitioning=true, hive_types={{{hive_types}}})"
@@ -1,13 +1,53 @@
 
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
-load_dotenv()
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
+# El .env se busca en la raíz del proyecto, no a partir del directorio de trabajo.
+load_dotenv(BASE_DIR / ".env")
 DATA_DIR = BASE_DIR / os.getenv("DATA_FOLDER", "data")
 DB_PATH = DATA_DIR / os.getenv("DATABASE_FILENAME", "datawarehouse.db")
-REJECTED_DATA_PATH = BASE_DIR / "rejected_records.txt"
+GENERATION_PATH = DB_PATH.with_name(DB_PATH.name + ".generation")
+# La ETL construye la nueva versión de la bodega en este archivo y sólo al
+# terminar lo reemplaza atómicamente por DB_PATH.
+STAGING_DB_PATH = DB_PATH.with_name(DB_PATH.name + ".staging")
+# Bloqueo entre procesos que toma cada ejecución de la ETL mientras construye
+# y publica la bodega, porque todas comparten STAGING_DB_PATH.
+BUILD_LOCK_PATH = DB_PATH.with_name(DB_PATH.name + ".lock")
+# Estado de los trabajos de ETL lanzados desde la API (un JSON por trabajo).
+ETL_JOBS_DIR = DATA_DIR / "etl_jobs"
+
+# Motor de la ETL: "pandas" lee cada fuente completa en memoria; "streaming"
+# la procesa por bloques acotados por CHUNK_MAX_ROWS y CHUNK_MAX_BYTES;
+# "duckdb" lee y cura los archivos directamente en DuckDB; "parallel" extrae y
+# cura cada archivo en un proceso distinto, con hasta ETL_MAX_WORKERS a la vez.
+ETL_ENGINE = os.getenv("ETL_ENGINE", "pandas")
+ETL_MAX_WORKERS = int(os.getenv("ETL_MAX_WORKERS", str(os.cpu_count() or 1)))
+CHUNK_MAX_ROWS = int(os.getenv("CHUNK_MAX_ROWS", "250000"))
+CHUNK_MAX_BYTES = int(os.getenv("CHUNK_MAX_BYTES", str(128 * 1024 * 1024)))
+
+# Carga incremental: sólo se leen los archivos nuevos o modificados según el
+# manifiesto guardado en la bodega, reemplazando sus particiones (año, mes).
+INCREMENTAL_LOAD = os.getenv("INCREMENTAL_LOAD", "false").lower() in ("1", "true", "yes")
+
+# Perfil de calidad: "approx" usa HyperLogLog para los distintos y t-digest para
+# los cuantiles (una pasada, memoria acotada); "exact" los calcula exactos.
+QUALITY_PROFILE_MODE = os.getenv("QUALITY_PROFILE_MODE", "approx")
+
+# Exportadores por semana que se guardan en el ranking precalculado; la API no
+# puede pedir un `top` mayor. Al cambiarlo hace falta una carga completa para
+# recalcular todas las semanas.
+TOP_EXPORTERS_PER_WEEK = int(os.getenv("TOP_EXPORTERS_PER_WEEK", "100"))
+
+# Copia en Parquet de la bodega (particionada por año y mes) para lectores
+# externos y réplicas de consulta de la API; se activa con LAKE_EXPORT.
+LAKE_EXPORT = os.getenv("LAKE_EXPORT", "false").lower() in ("1", "true", "yes")
+LAKE_DIR = DATA_DIR / os.getenv("LAKE_FOLDER", "lake")
+LAKE_COMPRESSION = os.getenv("LAKE_COMPRESSION", "zstd")
+LAKE_ROW_GROUP_SIZE = int(os.getenv("LAKE_ROW_GROUP_SIZE", "122880"))
+
 BULTOS_COLS_MAP = {
     "NUMEROIDENT": 0, "FECHAACEPT": 1, "CANTIDADBULTO": 4
 }
@@ -21,4 +61,25 @@ DATA_SOURCES = {
     "bultos": { "files": [DATA_DIR/"bultosAbril2025.txt", DATA_DIR/"bultosMarzo2025.txt"], "cols_map": BULTOS_COLS_MAP, "separator": ";", "decimal_separator": "." }
 }
 
-TABLE_NAMES = { "exportaciones": "exportaciones", "bultos": "bultos_exportaciones" }
\ No newline at end of file
+TABLE_NAMES = { "exportaciones": "exportaciones", "bultos": "bultos_exportaciones" }
+
+# Caché de respuestas de la API: cantidad máxima de entradas y vigencia en segundos.
+API_CACHE_MAXSIZE = int(os.getenv("API_CACHE_MAXSIZE", "256"))
+API_CACHE_TTL_SECONDS = float(os.getenv("API_CACHE_TTL_SECONDS", "300"))
+# Origen de las consultas de la API: "duckdb" (la bodega) o "parquet" (la copia
+# publicada en LAKE_DIR, para réplicas que sólo consultan).
+API_STORAGE = os.getenv("API_STORAGE", "duckdb")
+# Ejecución de las consultas de la API fuera del event loop: hilos dedicados a
+# DuckDB (cada uno con su cursor), consultas simultáneas por endpoint y espera
+# máxima por un turno antes de responder 503. Las exportaciones por streaming
+# ocupan su turno durante toda la descarga y tienen su propio límite.
+API_QUERY_WORKERS = int(os.getenv("API_QUERY_WORKERS", str(os.cpu_count() or 1)))
+API_ENDPOINT_CONCURRENCY = int(os.getenv("API_ENDPOINT_CONCURRENCY", "8"))
+API_EXPORT_CONCURRENCY = int(os.getenv("API_EXPORT_CONCURRENCY", "2"))
+API_QUEUE_TIMEOUT_SECONDS = float(os.getenv("API_QUEUE_TIMEOUT_SECONDS", "10"))
+# Exportaciones por streaming de la API: filas por lote enviado y memoria de
+# la instancia de DuckDB de cada descarga. El ordenamiento que exceda el límite
+# se vuelca a API_EXPORT_TEMP_DIR, así que la memoria no crece con el rango.
+API_EXPORT_BATCH_ROWS = int(os.getenv("API_EXPORT_BATCH_ROWS", "100000"))
+API_EXPORT_MEMORY_LIMIT = os.getenv("API_EXPORT_MEMORY_LIMIT", "512MB")
+API_EXPORT_TEMP_DIR = Path(os.getenv("API_EXPORT_TEMP_DIR", str(Path(tempfile.gettempdir()) / "aduanas_export")))
@@ -1,39 +1,99 @@
 
+import time
+import warnings
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterator
 import pandas as pd
 from prefect import task, get_run_logger
+from .instrumentation import instrumented, record_file
+from .rejects import add_lineage, malformed_records, skipped_lines
+
+# Filas leídas para estimar la memoria que ocupa cada fila de un archivo.
+_SAMPLE_ROWS = 1000
+
+def _read_options(cols_map: Dict[str, int], separator: str, decimal_separator: str) -> Dict:
+    """
+    Opciones de lectura comunes al modo completo y al modo por bloques. Sólo el
+    campo vacío es nulo: textos como "NULL", "N/A" o "nan" se conservan tal
+    cual, igual que en el lector CSV de DuckDB (ver `native.py`).
+    """
+    return dict(
+        sep=separator,
+        header=None,
+        usecols=list(cols_map.values()),
+        decimal=decimal_separator,
+        encoding='latin-1',
+        on_bad_lines='warn',
+        dtype=str,
+        keep_default_na=False,
+        na_values=[""]
+    )
+
+def _rename_columns(df: pd.DataFrame, cols_map: Dict[str, int]) -> pd.DataFrame:
+    """
+    Asigna los nombres según la posición de cada columna. pandas entrega las
+    columnas de `usecols` en el orden del archivo, no en el orden del mapa.
+    """
+    positions_to_names = {pos: name for name, pos in cols_map.items()}
+    return df.rename(columns=positions_to_names)[list(cols_map.keys())]
+
+def _read_with_bad_lines(read):
+    """
+    Ejecuta una lectura de pandas y devuelve su resultado junto a los números de
+    las líneas que descartó por mal formadas (`on_bad_lines='warn'`).
+    """
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", pd.errors.ParserWarning)
+        result = read()
+    return result, skipped_lines(caught)
+
+def _with_malformed_lines(
+    df: pd.DataFrame, bad_lines: List[int], file_path: Path, file_paths: List[Path], cols_map: Dict[str, int]
+) -> pd.DataFrame:
+    """Agrega a los registros leídos las líneas mal formadas, para que se guarden como rechazos."""
+    if not bad_lines:
+        return df
+    get_run_logger().warning(f"{len(bad_lines)} línea(s) mal formada(s) en {file_path.name}, la primera en la línea {bad_lines[0]}.")
+    malformed = malformed_records(file_path, bad_lines, file_paths, list(cols_map.keys()))
+    return pd.concat([df, malformed], ignore_index=True)
+
+def _rows_per_chunk(file_path: Path, read_options: Dict, max_rows: int, max_bytes: int) -> int:
+    """
+    Calcula cuántas filas caben en un bloque sin superar `max_bytes`, a partir
+    del tamaño en memoria de una muestra del archivo. Nunca supera `max_rows`.
+    """
+    sample = pd.read_csv(file_path, nrows=_SAMPLE_ROWS, **read_options)
+    if sample.empty:
+        return max_rows
+    bytes_per_row = sample.memory_usage(index=False, deep=True).sum() / len(sample)
+    return max(1, min(max_rows, int(max_bytes // bytes_per_row)))
 
 @task(name="Extract Data from Local Files")
+@instrumented("extract")
 def extract_from_files(
     file_paths: List[Path],
     cols_map: Dict[str, int],
     separator: str,
     decimal_separator: str
 ) -> pd.DataFrame:
+    """
+    Lee los archivos de una fuente como texto y los combina. Cada registro
+    lleva su archivo y su posición de origen (ver `rejects.add_lineage`).
+    """
     logger = get_run_logger()
     dataframes = []
-
-    final_col_names = list(cols_map.keys())
-    col_positions = list(cols_map.values())
+    read_options = _read_options(cols_map, separator, decimal_separator)
 
     for file_path in file_paths:
         if not file_path.exists():
             logger.warning(f"Archivo no encontrado: {file_path}. Saltando.")
             continue
         try:
-            df = pd.read_csv(
-                file_path,
-                sep=separator,
-                header=None,
-                usecols=col_positions,
-                names=final_col_names,
-                decimal=decimal_separator,
-                encoding='latin-1',
-                on_bad_lines='warn',
-                dtype=str 
-            )
-            dataframes.append(df)
+            started = time.perf_counter()
+            df, bad_lines = _read_with_bad_lines(lambda: pd.read_csv(file_path, **read_options))
+            df = add_lineage(_rename_columns(df, cols_map), file_path, file_paths)
+            record_file("extract", file_path, rows=len(df), seconds=time.perf_counter() - started)
+            dataframes.append(_with_malformed_lines(df, bad_lines, file_path, file_paths, cols_map))
         except Exception as e:
             logger.error(f"Error al leer el archivo {file_path.name}: {e}", exc_info=True)
 
@@ -42,4 +102,52 @@ def extract_from_files(
 
     combined_df = pd.concat(dataframes, ignore_index=True)
     logger.info(f"Extracción completada. {len(combined_df)} filas combinadas.")
-    return combined_df
\ No newline at end of file
+    return combined_df
+
+def iter_chunks_from_files(
+    file_paths: List[Path],
+    cols_map: Dict[str, int],
+    separator: str,
+    decimal_separator: str,
+    max_rows: int,
+    max_bytes: int
+) -> Iterator[pd.DataFrame]:
+    """
+    Versión por bloques de `extract_from_files`: recorre los archivos en orden y
+    entrega DataFrames de tamaño acotado, de modo que la memoria máxima no
+    depende de la cantidad ni del tamaño de los archivos de origen.
+    """
+    logger = get_run_logger()
+    read_options = _read_options(cols_map, separator, decimal_separator)
+    files_read = 0
+
+    for file_path in file_paths:
+        if not file_path.exists():
+            logger.warning(f"Archivo no encontrado: {file_path}. Saltando.")
+            continue
+        # Sólo se salta un archivo que no se puede abrir: un error a mitad de la
+        # lectura se propaga, para que la carga en curso se revierta completa.
+        try:
+            chunk_rows = _rows_per_chunk(file_path, read_options, max_rows, max_bytes)
+            reader = pd.read_csv(file_path, chunksize=chunk_rows, **read_options)
+        except Exception as e:
+            logger.error(f"Error al leer el archivo {file_path.name}: {e}", exc_info=True)
+            continue
+        logger.info(f"Leyendo {file_path.name} en bloques de hasta {chunk_rows} filas.")
+        # Sólo se mide la lectura: el tiempo que el consumidor tarda con cada bloque queda fuera.
+        rows, seconds = 0, 0.0
+        with reader:
+            while True:
+                started = time.perf_counter()
+                chunk, bad_lines = _read_with_bad_lines(lambda: next(reader, None))
+                seconds += time.perf_counter() - started
+                if chunk is None:
+                    break
+                chunk = add_lineage(_rename_columns(chunk, cols_map), file_path, file_paths, first_record=rows + 1)
+                rows += len(chunk)
+                yield _with_malformed_lines(chunk, bad_lines, file_path, file_paths, cols_map)
+        record_file("extract", file_path, rows=rows, seconds=seconds)
+        files_read += 1
+
+    if not files_read:
+        raise ValueError("No se pudieron leer datos de los archivos de origen.")
@@ -0,0 +1,80 @@
+import fcntl
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+from .config import GENERATION_PATH, BUILD_LOCK_PATH
+
+# Contador de generación de la bodega. La ETL lo incrementa cada vez que publica
+# una nueva versión de la bodega; la API lo compara para saber cuándo reabrir
+# conexiones e invalidar su caché de respuestas.
+
+def read_generation() -> int:
+    """Devuelve la generación actual de la bodega (0 si nunca se ha escrito)."""
+    try:
+        return int(GENERATION_PATH.read_text().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def bump_generation() -> int:
+    """Incrementa la generación de forma atómica (escritura a un temporal + rename)."""
+    generation = read_generation() + 1
+    GENERATION_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = GENERATION_PATH.with_suffix(".tmp")
+    tmp_path.write_text(str(generation))
+    os.replace(tmp_path, GENERATION_PATH)
+    return generation
+
+@contextmanager
+def build_lock(on_wait: Optional[Callable[[], None]] = None, lock_path: Path = BUILD_LOCK_PATH) -> Iterator[None]:
+    """
+    Bloqueo exclusivo entre procesos para construir y publicar una versión de la
+    bodega. Las ejecuciones lanzadas desde la API, la línea de comandos o el
+    reproceso de rechazos comparten la copia de trabajo: sin el bloqueo, una
+    podría borrar la de otra o publicar a la vez. La que llega segunda espera
+    (llamando antes a `on_wait`) y parte de la bodega que publicó la primera.
+    El sistema lo libera aunque el proceso termine abruptamente.
+    """
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if on_wait is not None:
+                on_wait()
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _wal_path(db_path: Path) -> Path:
+    return db_path.with_name(db_path.name + ".wal")
+
+def discard_build(staging_path: Path):
+    """Elimina la copia de trabajo de la bodega y su WAL, si existen."""
+    for path in (staging_path, _wal_path(staging_path)):
+        path.unlink(missing_ok=True)
+
+def prepare_build(db_path: Path, staging_path: Path) -> Path:
+    """
+    Prepara la copia de trabajo donde la ETL construye la nueva bodega. Parte
+    de la bodega publicada (para conservar el manifiesto y las tablas que la
+    carga incremental no reemplaza) o de un archivo vacío si aún no existe.
+    Se llama con `build_lock` tomado, igual que `publish_build` y `discard_build`.
+    """
+    discard_build(staging_path)
+    staging_path.parent.mkdir(parents=True, exist_ok=True)
+    if db_path.exists():
+        shutil.copyfile(db_path, staging_path)
+    return staging_path
+
+def publish_build(staging_path: Path, db_path: Path) -> int:
+    """
+    Reemplaza atómicamente la bodega publicada por la copia de trabajo y avanza
+    la generación. Los lectores con la versión anterior abierta la siguen viendo
+    completa hasta que reabren la conexión.
+    """
+    os.replace(staging_path, db_path)
+    return bump_generation()
@@ -0,0 +1,215 @@
+
+import inspect
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import duckdb
+import pandas as pd
+from .catalog import RUNS_TABLE
+
+# Instrumentación liviana de las tareas de la ETL. Cada tarea decorada con
+# `instrumented` registra, en la ejecución activa, su tiempo de reloj y de CPU,
+# el RSS máximo del proceso y las filas de entrada, salida y rechazadas; la
+# extracción registra además los bytes leídos por archivo. Al terminar el flujo
+# las métricas se guardan en la tabla `etl_runs` de la bodega.
+
+def current_rss() -> int:
+    """RSS actual del proceso en bytes (Linux); en otros sistemas, el máximo histórico."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        factor = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * factor
+
+class PeakRSS:
+    """Muestrea el RSS en un hilo mientras dura el bloque y guarda el máximo observado."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self) -> "PeakRSS":
+        self.peak = current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+_COUNTERS = ("calls", "wall_seconds", "cpu_seconds", "rows_in", "rows_out", "rows_rejected", "bytes_read")
+
+class RunMetrics:
+    """Métricas de una ejecución de la ETL, acumuladas por etapa y por archivo."""
+
+    def __init__(self, engine: Optional[str] = None, incremental: Optional[bool] = None):
+        self.run_id = uuid.uuid4().hex
+        self.started_at = datetime.now()
+        self.engine = engine
+        self.incremental = incremental
+        self.records: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    def add(self, stage: str, file_path: Optional[str] = None, peak_rss: Optional[int] = None, **counters):
+        """Suma los contadores a la etapa (y archivo) indicados; el RSS se guarda como máximo."""
+        with self._lock:
+            record = self.records.setdefault((stage, file_path), {"stage": stage, "file_path": file_path, "peak_rss_mb": None})
+            for name, value in counters.items():
+                if value is not None:
+                    record[name] = (record.get(name) or 0) + value
+            if peak_rss is not None:
+                record["peak_rss_mb"] = max(record["peak_rss_mb"] or 0, round(peak_rss / 2**20, 1))
+
+    def merge(self, records: List[Dict[str, Any]]):
+        """Incorpora métricas registradas en otro proceso (por ejemplo, un trabajador del pool)."""
+        for record in records:
+            counters = {name: record.get(name) for name in _COUNTERS}
+            peak = record["peak_rss_mb"] * 2**20 if record.get("peak_rss_mb") is not None else None
+            self.add(record["stage"], record["file_path"], peak_rss=peak, **counters)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(record) for record in self.records.values()]
+
+    def finish(self):
+        """Registra la etapa 'flow' con el total de la ejecución y el mayor RSS observado en el proceso."""
+        peaks = [record["peak_rss_mb"] * 2**20 for record in self.snapshot() if record["peak_rss_mb"] is not None]
+        self.add(
+            "flow", calls=1,
+            wall_seconds=time.perf_counter() - self._wall_start,
+            cpu_seconds=time.process_time() - self._cpu_start,
+            peak_rss=max(peaks + [current_rss()])
+        )
+
+_active: Optional[RunMetrics] = None
+
+def start_run_metrics(engine: Optional[str] = None, incremental: Optional[bool] = None) -> RunMetrics:
+    """Activa la recolección de métricas de una nueva ejecución en este proceso."""
+    global _active
+    _active = RunMetrics(engine, incremental)
+    return _active
+
+def stop_run_metrics():
+    global _active
+    _active = None
+
+@contextmanager
+def collect_run_metrics(engine: Optional[str] = None, incremental: Optional[bool] = None) -> Iterator[RunMetrics]:
+    """Activa la recolección de métricas mientras dura el bloque."""
+    try:
+        yield start_run_metrics(engine, incremental)
+    finally:
+        stop_run_metrics()
+
+def active_run_metrics() -> Optional[RunMetrics]:
+    return _active
+
+def record_file(stage: str, file_path: Path, rows: int, seconds: float):
+    """Registra la lectura de un archivo: bytes, filas y duración."""
+    if _active is not None:
+        size = file_path.stat().st_size if file_path.exists() else None
+        _active.add(stage, str(file_path), calls=1, wall_seconds=seconds, rows_out=rows, bytes_read=size)
+
+def record_rows(stage: str, **counts: int):
+    """Suma contadores de filas a una etapa cuando no se pueden deducir de sus argumentos ni de su resultado."""
+    if _active is not None:
+        _active.add(stage, **counts)
+
+def _rows_in(arguments: Dict[str, Any]) -> Optional[int]:
+    df = arguments.get("df")
+    return len(df) if isinstance(df, pd.DataFrame) else None
+
+def _bytes_read(arguments: Dict[str, Any]) -> Optional[int]:
+    files = arguments.get("file_paths") or (arguments.get("source_config") or {}).get("files")
+    if not files:
+        return None
+    return sum(Path(f).stat().st_size for f in files if Path(f).exists())
+
+def _rows_out(result: Any) -> Dict[str, Optional[int]]:
+    if isinstance(result, pd.DataFrame):
+        return {"rows_out": len(result)}
+    if isinstance(result, tuple) and len(result) == 2 and all(isinstance(r, pd.DataFrame) for r in result):
+        return {"rows_out": len(result[0]), "rows_rejected": len(result[1])}
+    if isinstance(result, int) and not isinstance(result, bool):
+        return {"rows_out": result}
+    return {}
+
+def instrumented(stage: str) -> Callable:
+    """
+    Decorador para las funciones de las tareas (debajo de `@task`). Sin una
+    ejecución activa no hace nada. Las filas se deducen del argumento `df` y
+    del resultado (DataFrame, par válidos/rechazados o cantidad de filas), y
+    los bytes de `file_paths` o de `source_config["files"]`.
+    """
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            metrics = _active
+            if metrics is None:
+                return func(*args, **kwargs)
+            # Prefect puede pasar los parámetros por posición: se leen por nombre.
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            result, rss = None, PeakRSS()
+            try:
+                with rss:
+                    result = func(*args, **kwargs)
+                return result
+            finally:
+                metrics.add(
+                    stage, calls=1,
+                    wall_seconds=time.perf_counter() - wall_start,
+                    cpu_seconds=time.process_time() - cpu_start,
+                    rows_in=_rows_in(arguments), bytes_read=_bytes_read(arguments),
+                    peak_rss=rss.peak, **_rows_out(result)
+                )
+        return wrapper
+    return decorator
+
+def save_run_metrics(db_path: Path, metrics: RunMetrics):
+    """Guarda las métricas de la ejecución en la tabla `etl_runs`, una fila por etapa y archivo."""
+    columns = ["stage", "file_path", *_COUNTERS, "peak_rss_mb"]
+    rows = [
+        [metrics.run_id, metrics.started_at, metrics.engine, metrics.incremental, *[record.get(c) for c in columns]]
+        for record in metrics.snapshot()
+    ]
+    with duckdb.connect(database=str(db_path), read_only=False) as con:
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {RUNS_TABLE} (
+                run_id VARCHAR,
+                started_at TIMESTAMP,
+                engine VARCHAR,
+                incremental BOOLEAN,
+                stage VARCHAR,
+                file_path VARCHAR,
+                calls INTEGER,
+                wall_seconds DOUBLE,
+                cpu_seconds DOUBLE,
+                rows_in BIGINT,
+                rows_out BIGINT,
+                rows_rejected BIGINT,
+                bytes_read BIGINT,
+                peak_rss_mb DOUBLE
+            )
+        """)
+        con.executemany(f"INSERT INTO {RUNS_TABLE} VALUES ({', '.join('?' * (4 + len(columns)))})", rows)
@@ -0,0 +1,156 @@
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import duckdb
+from prefect import task, get_run_logger
+from .catalog import POINTER_FILE, LAKE_TABLES, read_lake_pointer
+from .instrumentation import instrumented
+
+# Copia de la bodega en Parquet para lectores externos y réplicas de consulta.
+# Cada exportación escribe una instantánea completa en LAKE_DIR/<id>/, con una
+# carpeta por tabla particionada al estilo Hive (año=AAAA/mes=M/data.parquet),
+# cada archivo ordenado y con estadísticas por grupo de filas para que los
+# lectores descarten archivos y grupos por fecha. En una carga incremental sólo
+# se reescriben las particiones tocadas; las demás se enlazan (hard link) desde
+# la instantánea anterior. Las dimensiones no se particionan: son un único
+# archivo por tabla. LAKE_DIR/CURRENT indica la instantánea publicada y la
+# generación de la bodega a la que corresponde.
+
+def _write_lake_pointer(lake_dir: Path, pointer: Dict[str, Any]):
+    """Escribe el puntero de forma atómica (escritura a un temporal + rename)."""
+    tmp_path = lake_dir / (POINTER_FILE + ".tmp")
+    tmp_path.write_text(json.dumps(pointer))
+    os.replace(tmp_path, lake_dir / POINTER_FILE)
+
+def _partition_dir(table_dir: Path, columns: List[str], values: Tuple[int, ...]) -> Path:
+    return table_dir.joinpath(*(f"{col}={value}" for col, value in zip(columns, values)))
+
+def _touched_values(columns: List[str], partitions: List[int]) -> set:
+    """
+    Valores de partición de una tabla que cubren las claves AAAAMM tocadas. Una
+    tabla sin particionar se reescribe completa si se tocó alguna.
+    """
+    return {tuple({"año": key // 100, "mes": key % 100}[col] for col in columns) for key in partitions}
+
+def _existing_values(table_dir: Path, columns: List[str]) -> List[Tuple[int, ...]]:
+    """Particiones presentes en la carpeta de una tabla de una instantánea anterior."""
+    if not columns:
+        return [()] if any(table_dir.glob("*.parquet")) else []
+    values = []
+    for path in table_dir.glob("/".join(["*=*"] * len(columns))):
+        parts = path.relative_to(table_dir).parts
+        values.append(tuple(int(part.split("=", 1)[1]) for part in parts))
+    return values
+
+def _same_columns(con: duckdb.DuckDBPyConnection, table_dir: Path, table_name: str) -> bool:
+    """Indica si los archivos de una tabla en una instantánea anterior tienen las columnas actuales de la tabla."""
+    files = sorted(table_dir.glob("**/*.parquet"))
+    if not files:
+        return False
+    previous = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM read_parquet('{files[0].as_posix()}', hive_partitioning=false)").fetchall()]
+    current = [row[0] for row in con.execute(f"DESCRIBE {table_name}").fetchall()]
+    return previous == current
+
+def _link_partition(source: Path, target: Path):
+    """Reutiliza los archivos de una partición sin cambios: hard link, o copia si no se puede enlazar."""
+    target.mkdir(parents=True, exist_ok=True)
+    for file_path in source.glob("*.parquet"):
+        try:
+            os.link(file_path, target / file_path.name)
+        except OSError:
+            shutil.copy2(file_path, target / file_path.name)
+
+@task(name="Export Warehouse to Parquet")
+@instrumented("lake_export")
+def export_lake_snapshot(
+    db_path: Path,
+    lake_dir: Path,
+    snapshot_id: str,
+    base_generation: int,
+    partitions: Optional[List[int]] = None,
+    compression: str = "zstd",
+    row_group_size: int = 122880
+) -> Dict[str, Any]:
+    """
+    Exporta las tablas de LAKE_TABLES a una nueva instantánea sin publicarla.
+    Con `partitions` (claves AAAAMM) sólo se escriben esas particiones y el
+    resto se toma de la instantánea publicada, siempre que ésta corresponda a
+    `base_generation`, la generación de la que partió la bodega; si no, se
+    exporta todo. Devuelve el id, la carpeta, los archivos y los bytes escritos.
+    """
+    logger = get_run_logger()
+    snapshot_dir = lake_dir / snapshot_id
+    previous = read_lake_pointer(lake_dir)
+    previous_dir = lake_dir / previous["snapshot"] if previous else None
+    if partitions is not None and (
+        previous is None or previous.get("generation") != base_generation or not previous_dir.exists()
+    ):
+        logger.info("La copia en Parquet publicada no corresponde a la bodega de partida; se exportará completa.")
+        partitions = None
+
+    files_written, bytes_written = 0, 0
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    try:
+        with duckdb.connect(database=str(db_path), read_only=False) as con:
+            for table_name, spec in LAKE_TABLES.items():
+                columns = list(spec["partition_by"])
+                table_dir = snapshot_dir / table_name
+                keys = ", ".join(f"{expr} AS {col}" for col, expr in spec["partition_by"].items())
+                table_partitions = partitions if spec["incremental"] else None
+                if table_partitions is not None and not _same_columns(con, previous_dir / table_name, table_name):
+                    logger.info(f"Cambiaron las columnas de '{table_name}'; se exportará completa.")
+                    table_partitions = None
+                if table_partitions is None:
+                    # Una tabla sin particionar es una única "partición" vacía: la carpeta de la tabla.
+                    values = con.execute(f"SELECT DISTINCT {keys} FROM {table_name} ORDER BY ALL").fetchall() if columns else [()]
+                else:
+                    touched = _touched_values(columns, table_partitions)
+                    for value in _existing_values(previous_dir / table_name, columns):
+                        if value not in touched:
+                            _link_partition(_partition_dir(previous_dir / table_name, columns, value), _partition_dir(table_dir, columns, value))
+                    values = sorted(touched)
+
+                for value in values:
+                    if None in value:
+                        continue
+                    target = _partition_dir(table_dir, columns, value) / "data.parquet"
+                    where = " AND ".join(f"{expr} = {v}" for expr, v in zip(spec["partition_by"].values(), value)) or "TRUE"
+                    if not con.execute(f"SELECT EXISTS (SELECT 1 FROM {table_name} WHERE {where})").fetchone()[0]:
+                        continue
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    con.execute(f"""
+                        COPY (SELECT * FROM {table_name} WHERE {where} ORDER BY {spec['order_by']})
+                        TO '{target.as_posix()}'
+                        (FORMAT parquet, COMPRESSION {compression}, ROW_GROUP_SIZE {int(row_group_size)})
+                    """)
+                    files_written += 1
+                    bytes_written += target.stat().st_size
+                logger.info(f"Tabla '{table_name}' exportada a '{table_dir}'.")
+    except Exception as e:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        logger.error(f"Error al exportar la bodega a Parquet: {e}", exc_info=True)
+        raise
+
+    scope = "completa" if partitions is None else f"de las particiones {partitions}"
+    logger.info(f"Exportación {scope} a Parquet terminada: {files_written} archivo(s), {bytes_written / 2**20:.1f} MB en '{snapshot_dir}'.")
+    return {"snapshot": snapshot_id, "path": str(snapshot_dir), "files": files_written, "bytes": bytes_written}
+
+def publish_lake_snapshot(lake_dir: Path, snapshot_id: str, generation: int):
+    """
+    Publica la instantánea como la vigente para `generation` y elimina las demás
+    salvo la que estaba publicada, que pueden seguir leyendo las réplicas hasta
+    que noten el cambio.
+    """
+    previous = read_lake_pointer(lake_dir)
+    _write_lake_pointer(lake_dir, {"snapshot": snapshot_id, "generation": generation})
+    keep = {snapshot_id, previous["snapshot"] if previous else None}
+    for path in lake_dir.iterdir():
+        if path.is_dir() and path.name not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+def discard_lake_snapshot(lake_dir: Path, snapshot_id: str):
+    """Elimina una instantánea que no llegó a publicarse."""
+    shutil.rmtree(lake_dir / snapshot_id, ignore_errors=True)
@@ -2,41 +2,172 @@
 import duckdb
 import pandas as pd
 from pathlib import Path
+from typing import Iterable, List, Optional
 from prefect import task, get_run_logger
+from .transform import NUMERIC_COLUMNS
+from .instrumentation import instrumented
+
+def _table_exists(con: duckdb.DuckDBPyConnection, table_name: str) -> bool:
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table_name]
+    ).fetchone()[0] > 0
+
+def partition_filter(partitions: List[int], year_expr: str = "año", month_expr: str = "mes") -> str:
+    """Filtro SQL para las particiones indicadas como claves AAAAMM."""
+    keys = ", ".join(str(int(key)) for key in partitions) or "NULL"
+    return f"{year_expr} * 100 + {month_expr} IN ({keys})"
+
+def delete_partitions(con: duckdb.DuckDBPyConnection, table_name: str, partitions: List[int]):
+    """Elimina de la tabla las filas de las particiones (año, mes) indicadas."""
+    if _table_exists(con, table_name):
+        con.execute(f"DELETE FROM {table_name} WHERE {partition_filter(partitions)}")
+
+@task(name="Delete Partitions from DuckDB")
+def clear_partitions(db_path: Path, table_name: str, partitions: List[int]):
+    """Vacía las particiones de una tabla cuando ya no queda ningún archivo que las cargue."""
+    logger = get_run_logger()
+    with duckdb.connect(database=str(db_path), read_only=False) as con:
+        delete_partitions(con, table_name, partitions)
+    logger.info(f"Particiones {partitions} eliminadas de '{table_name}'.")
+
+def widen_integer_columns(con: duckdb.DuckDBPyConnection, table_name: str, source_sql: str, columns: List[str]):
+    """
+    Antes de insertar en una tabla existente, convierte a DOUBLE las columnas
+    BIGINT que recibirían valores con decimales, para no truncarlos.
+    """
+    table_types = dict(con.execute(f"SELECT column_name, column_type FROM (DESCRIBE {table_name})").fetchall())
+    source_types = dict(con.execute(f"SELECT column_name, column_type FROM (DESCRIBE {source_sql})").fetchall())
+    for col in columns:
+        if table_types.get(col) != "BIGINT" or source_types.get(col) != "DOUBLE":
+            continue
+        all_integral = con.execute(f"SELECT COALESCE(bool_and({col} % 1 = 0), TRUE) FROM ({source_sql})").fetchone()[0]
+        if not all_integral:
+            con.execute(f"ALTER TABLE {table_name} ALTER COLUMN {col} TYPE DOUBLE")
+
+def frame_select_sql(df: pd.DataFrame, relation: str = "incoming", integer_candidates: List[str] = NUMERIC_COLUMNS) -> str:
+    """
+    Consulta sobre un DataFrame registrado que conserva los tipos de la bodega:
+    las columnas numéricas con enteros compactos (int8/16/32) se escriben como
+    BIGINT, igual que si vinieran en int64.
+    """
+    narrow = [
+        col for col, dtype in df.dtypes.items()
+        if col in integer_candidates and dtype.kind in "iu" and dtype.itemsize < 8
+    ]
+    if not narrow:
+        return f"SELECT * FROM {relation}"
+    replaced = ", ".join(f"CAST({col} AS BIGINT) AS {col}" for col in narrow)
+    return f"SELECT * REPLACE ({replaced}) FROM {relation}"
+
+def insert_rows(
+    con: duckdb.DuckDBPyConnection,
+    table_name: str,
+    source_sql: str,
+    partitions: Optional[List[int]] = None,
+    integer_candidates: List[str] = ()
+):
+    """
+    Inserta el resultado de `source_sql` en la tabla, creándola si no existe.
+    Si se indican particiones, sólo se insertan las filas que pertenecen a ellas.
+    """
+    where = f"WHERE {partition_filter(partitions)}" if partitions is not None else ""
+    if not _table_exists(con, table_name):
+        con.execute(f"CREATE TABLE {table_name} AS SELECT * FROM ({source_sql}) {where}")
+        return
+    widen_integer_columns(con, table_name, source_sql, list(integer_candidates))
+    con.execute(f"INSERT INTO {table_name} BY NAME SELECT * FROM ({source_sql}) {where}")
 
 @task(name="Load Good Data to DuckDB")
-def load_to_duckdb(df: pd.DataFrame, db_path: Path, table_name: str):
-    """Carga un DataFrame de datos válidos en una tabla de DuckDB."""
+@instrumented("load")
+def load_to_duckdb(df: pd.DataFrame, db_path: Path, table_name: str, partitions: Optional[List[int]] = None) -> int:
+    """
+    Carga un DataFrame de datos válidos en una tabla de DuckDB. Sin `partitions`
+    reemplaza la tabla completa; con una lista de claves AAAAMM reemplaza sólo
+    esas particiones (año, mes) dentro de una transacción, de modo que la tabla
+    sigue consultable durante la carga. Devuelve la cantidad de filas cargadas.
+    """
     logger = get_run_logger()
-    if df.empty:
+    if df.empty and partitions is None:
         logger.warning(f"No hay datos válidos para cargar en la tabla '{table_name}'. Saltando.")
-        return
+        return 0
         
     db_path.parent.mkdir(parents=True, exist_ok=True)
     logger.info(f"Cargando {len(df)} filas en la tabla '{table_name}' en '{db_path}'...")
     try:
         con = duckdb.connect(database=str(db_path), read_only=False)
-        con.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM df")
+        con.register("incoming", df)
+        if partitions is None:
+            con.execute(f"CREATE OR REPLACE TABLE {table_name} AS {frame_select_sql(df)}")
+        else:
+            con.execute("BEGIN TRANSACTION")
+            delete_partitions(con, table_name, partitions)
+            if not df.empty:
+                insert_rows(con, table_name, frame_select_sql(df), partitions, NUMERIC_COLUMNS)
+            con.execute("COMMIT")
+            logger.info(f"Particiones reemplazadas en '{table_name}': {partitions}.")
         con.close()
         logger.info(f"Carga a la tabla '{table_name}' completada.")
+        return len(df)
     except Exception as e:
         logger.error(f"Error al cargar datos en DuckDB: {e}")
         raise
 
-@task(name="Save Rejected Data to TXT")
-def save_rejected_records(df: pd.DataFrame, file_path: Path, separator: str = ';'):
-    """Guarda los registros rechazados en un archivo de texto."""
-    logger = get_run_logger()
-    if df.empty:
-        logger.info("No se encontraron registros para guardar en el archivo de rechazos.")
-        return
+def downcast_integral_columns(con: duckdb.DuckDBPyConnection, table_name: str, columns: List[str]):
+    """
+    Convierte a BIGINT las columnas DOUBLE cuyos valores son todos enteros,
+    replicando en DuckDB la conversión que `clean_and_transform_split` hace
+    sobre un DataFrame completo.
+    """
+    table_types = dict(con.execute(f"SELECT column_name, column_type FROM (DESCRIBE {table_name})").fetchall())
+    for col in columns:
+        if table_types.get(col) != "DOUBLE":
+            continue
+        all_integral = con.execute(f"SELECT COALESCE(bool_and({col} % 1 = 0), TRUE) FROM {table_name}").fetchone()[0]
+        if all_integral:
+            con.execute(f"ALTER TABLE {table_name} ALTER COLUMN {col} TYPE BIGINT")
 
-    logger.info(f"Guardando {len(df)} filas rechazadas en el archivo: {file_path}")
+def load_chunks_to_duckdb(
+    chunks: Iterable[pd.DataFrame],
+    db_path: Path,
+    table_name: str,
+    integer_candidates: List[str],
+    partitions: Optional[List[int]] = None
+) -> int:
+    """
+    Carga una secuencia de DataFrames en una tabla de DuckDB dentro de una sola
+    transacción. Sin `partitions` reemplaza la tabla; con ellas reemplaza sólo
+    esas particiones. Sólo un bloque se mantiene en memoria a la vez.
+    """
+    logger = get_run_logger()
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    rows_loaded = 0
+    con = duckdb.connect(database=str(db_path), read_only=False)
     try:
-        # Asegurarse de que el directorio de salida exista
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        df.to_csv(file_path, sep=separator, index=False, header=False, mode='a') # mode='a' para añadir (append)
-        logger.info("Archivo de rechazos guardado exitosamente.")
+        con.execute("BEGIN TRANSACTION")
+        if partitions is None:
+            con.execute(f"DROP TABLE IF EXISTS {table_name}")
+        else:
+            delete_partitions(con, table_name, partitions)
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            con.register("incoming", chunk)
+            insert_rows(con, table_name, frame_select_sql(chunk, integer_candidates=integer_candidates), partitions, integer_candidates)
+            con.unregister("incoming")
+            rows_loaded += len(chunk)
+            logger.info(f"{rows_loaded} filas cargadas en la tabla '{table_name}'...")
+        if rows_loaded:
+            downcast_integral_columns(con, table_name, integer_candidates)
+        con.execute("COMMIT")
     except Exception as e:
-        logger.error(f"Error al guardar el archivo de rechazos: {e}")
-        raise
\ No newline at end of file
+        con.execute("ROLLBACK")
+        logger.error(f"Error al cargar datos por bloques en DuckDB: {e}")
+        raise
+    finally:
+        con.close()
+
+    if rows_loaded:
+        logger.info(f"Carga por bloques a la tabla '{table_name}' completada. {rows_loaded} filas.")
+    else:
+        logger.warning(f"No hay datos válidos para cargar en la tabla '{table_name}'. Saltando.")
+    return rows_loaded
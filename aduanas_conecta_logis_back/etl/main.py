@@ -1,71 +1,287 @@
 
-from prefect import flow, get_run_logger
-import os
-from .config import DATA_SOURCES, DB_PATH, TABLE_NAMES, REJECTED_DATA_PATH
-from .extract import extract_from_files
-from .transform import clean_and_transform_split
-from .load import load_to_duckdb, save_rejected_records
+from prefect import flow, task, get_run_logger
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
+import pandas as pd
+from .config import (
+    DATA_SOURCES, DB_PATH, STAGING_DB_PATH, TABLE_NAMES, ETL_ENGINE, ETL_MAX_WORKERS,
+    CHUNK_MAX_ROWS, CHUNK_MAX_BYTES, INCREMENTAL_LOAD, LAKE_EXPORT, LAKE_DIR, LAKE_COMPRESSION, LAKE_ROW_GROUP_SIZE
+)
+from .extract import extract_from_files, iter_chunks_from_files
+from .transform import clean_and_transform_split, SeenRows, NUMERIC_COLUMNS
+from .load import load_to_duckdb, load_chunks_to_duckdb, clear_partitions
+from .rejects import save_rejected_records, clear_rejected_records
 from .analyze import generate_quality_report, print_report_and_recommendations
 from .modeling import create_analytical_models
+from .native import ingest_with_duckdb
+from .manifest import plan_incremental_load, record_manifest, fingerprint_source
+from .parallel import open_file_pool, submit_source_files, load_extracted_files
+from .generation import build_lock, prepare_build, publish_build, discard_build, read_generation
+from .lake import export_lake_snapshot, publish_lake_snapshot, discard_lake_snapshot
+from .progress import JobProgress
+from .instrumentation import instrumented, start_run_metrics, stop_run_metrics, save_run_metrics
+
+ENGINES = ("pandas", "streaming", "duckdb", "parallel")
+
+@task(name="Stream Source to DuckDB")
+@instrumented("stream_source")
+def stream_source_to_duckdb(
+    source_config: Dict[str, Any],
+    db_path: Path,
+    table_name: str,
+    source_name: str,
+    run_id: Optional[str] = None,
+    partitions: Optional[List[int]] = None
+) -> int:
+    """
+    Extrae, transforma y carga una fuente bloque a bloque. Cada bloque se cura
+    y se inserta antes de leer el siguiente, por lo que la memoria máxima queda
+    acotada por CHUNK_MAX_ROWS / CHUNK_MAX_BYTES. Los duplicados se eliminan en
+    toda la fuente, como en el motor "pandas": sólo se guardan las claves de
+    los registros ya vistos (ver `SeenRows`). Los rechazos, pocos en
+    comparación, se acumulan y se guardan al final.
+    """
+    rejected = []
+    seen_rows = SeenRows()
+
+    def good_chunks() -> Iterator[pd.DataFrame]:
+        chunks = iter_chunks_from_files(
+            file_paths=source_config["files"],
+            cols_map=source_config["cols_map"],
+            separator=source_config["separator"],
+            decimal_separator=source_config["decimal_separator"],
+            max_rows=CHUNK_MAX_ROWS,
+            max_bytes=CHUNK_MAX_BYTES
+        )
+        for chunk in chunks:
+            df_good, df_rejected = clean_and_transform_split.fn(
+                df=chunk,
+                decimal_separator=source_config["decimal_separator"],
+                downcast_integers=False,
+                seen_rows=seen_rows
+            )
+            rejected.append(df_rejected)
+            yield df_good
+
+    rows_loaded = load_chunks_to_duckdb(
+        good_chunks(), db_path=db_path, table_name=table_name,
+        integer_candidates=NUMERIC_COLUMNS, partitions=partitions
+    )
+    if rejected:
+        save_rejected_records.fn(df=pd.concat(rejected, ignore_index=True), db_path=db_path, source_name=source_name, run_id=run_id)
+    return rows_loaded
+
+def _run_pandas_source(
+    source_config: Dict[str, Any],
+    db_path: Path,
+    table_name: str,
+    source_name: str,
+    run_id: Optional[str] = None,
+    partitions: Optional[List[int]] = None
+):
+    """Procesa una fuente completa en memoria: extracción, curación y carga."""
+    df_raw = extract_from_files(
+        file_paths=source_config["files"],
+        cols_map=source_config["cols_map"],
+        separator=source_config["separator"],
+        decimal_separator=source_config["decimal_separator"]
+    )
+    df_good, df_rejected = clean_and_transform_split(df=df_raw, decimal_separator=source_config["decimal_separator"])
+    load_task = load_to_duckdb(df=df_good, db_path=db_path, table_name=table_name, partitions=partitions)
+    save_rejected_records(df=df_rejected, db_path=db_path, source_name=source_name, run_id=run_id)
+    return load_task
+
+def _run_source(
+    engine: str,
+    source_config: Dict[str, Any],
+    db_path: Path,
+    table_name: str,
+    source_name: str,
+    run_id: Optional[str] = None,
+    partitions: Optional[List[int]] = None
+) -> int:
+    """Extrae, cura y carga una fuente con el motor indicado. Devuelve las filas cargadas."""
+    if engine == "streaming":
+        return stream_source_to_duckdb(
+            source_config=source_config, db_path=db_path, table_name=table_name,
+            source_name=source_name, run_id=run_id, partitions=partitions
+        )
+    if engine == "duckdb":
+        return ingest_with_duckdb(
+            source_config=source_config, db_path=db_path, table_name=table_name,
+            source_name=source_name, run_id=run_id, partitions=partitions
+        )
+    return _run_pandas_source(source_config, db_path, table_name, source_name, run_id, partitions)
 
 @flow(name="ETL Pipeline - Aduanas a DuckDB")
-def etl_parent_flow():
+def etl_parent_flow(
+    engine: str = ETL_ENGINE,
+    incremental: bool = INCREMENTAL_LOAD,
+    status_path: Optional[str] = None,
+    export_lake: bool = LAKE_EXPORT
+):
     """
     Flujo principal que orquesta la extracción, transformación, carga, modelado y
     análisis de los datos de exportaciones y bultos.
+
+    `engine` elige cómo se procesan las fuentes: "pandas" (todo en memoria),
+    "streaming" (por bloques de tamaño acotado), "duckdb" (lector CSV y
+    curación nativos de DuckDB, sin pasar por pandas) o "parallel" (cada
+    archivo de cada fuente se extrae y cura en paralelo en un pool de
+    ETL_MAX_WORKERS procesos; sólo la carga se hace en serie).
+
+    Con `incremental=True` sólo se leen los archivos nuevos o modificados según
+    el manifiesto de la bodega, y se reemplazan únicamente las particiones
+    (año, mes) que contienen.
+
+    La nueva versión se construye en una copia de trabajo (STAGING_DB_PATH) que
+    reemplaza atómicamente a la bodega sólo si todo el flujo termina bien; las
+    consultas nunca ven tablas a medio cargar. Si otra ejecución está
+    construyendo la bodega, el flujo espera a que publique y parte de su versión. `status_path` es el archivo de
+    estado del trabajo cuando el flujo se lanza desde la API.
+
+    Las métricas de cada tarea (tiempos, memoria, filas y bytes leídos) se
+    guardan en la tabla `etl_runs` de la nueva versión antes de publicarla, y
+    los registros rechazados en `rejected_records`, con el `run_id` de la
+    ejecución; los rechazos de los archivos que se vuelven a leer se reemplazan.
+
+    Con `export_lake=True` las tablas de hechos y de resumen se exportan además
+    a Parquet en LAKE_DIR (ver `lake.py`); la copia se publica junto con la
+    bodega y, en una carga incremental, sólo se reescriben las particiones
+    tocadas.
     """
     logger = get_run_logger()
-    logger.info("Iniciando el flujo principal de la ETL...")
-    
-    if os.path.exists(REJECTED_DATA_PATH):
+    logger.info(f"Iniciando el flujo principal de la ETL con el motor '{engine}'...")
+
+    if engine not in ENGINES:
+        raise ValueError(f"Motor de ETL desconocido: '{engine}'. Opciones: {', '.join(ENGINES)}.")
+
+    progress = JobProgress(Path(status_path) if status_path else None)
+    progress.start()
+
+    run_metrics = start_run_metrics(engine=engine, incremental=incremental)
+    executor = None
+    lake_snapshot = None
+    # Una sola ejecución a la vez construye y publica la bodega (ver `build_lock`).
+    with build_lock(on_wait=lambda: logger.info("Otra ejecución de la ETL está construyendo la bodega; esperando a que termine...")):
         try:
-            os.remove(REJECTED_DATA_PATH)
-            logger.info(f"Archivo de rechazos anterior eliminado: {REJECTED_DATA_PATH}")
-        except OSError as e:
-            logger.error(f"No se pudo eliminar el archivo de rechazos anterior: {e}")
-
-    try:
-        # --- PASO 1: Extracción y Transformación ---
-        export_config = DATA_SOURCES["exportaciones"]
-        df_exportaciones_raw = extract_from_files(
-            file_paths=export_config["files"],
-            cols_map=export_config["cols_map"],
-            separator=export_config["separator"],
-            decimal_separator=export_config["decimal_separator"]
-        )
-        df_exp_good, df_exp_rejected = clean_and_transform_split(df=df_exportaciones_raw)
-        
-        bultos_config = DATA_SOURCES["bultos"]
-        df_bultos_raw = extract_from_files(
-            file_paths=bultos_config["files"],
-            cols_map=bultos_config["cols_map"],
-            separator=bultos_config["separator"],
-            decimal_separator=bultos_config["decimal_separator"]
-        )
-        df_bul_good, df_bul_rejected = clean_and_transform_split(df=df_bultos_raw)
-        load_exp_task = load_to_duckdb(df=df_exp_good, db_path=DB_PATH, table_name=TABLE_NAMES["exportaciones"])
-        save_rejected_records(df=df_exp_rejected, file_path=REJECTED_DATA_PATH, separator=export_config["separator"])
-        
-        load_bul_task = load_to_duckdb(df=df_bul_good, db_path=DB_PATH, table_name=TABLE_NAMES["bultos"])
-        save_rejected_records(df=df_bul_rejected, file_path=REJECTED_DATA_PATH, separator=bultos_config["separator"])
-        modeling_task = create_analytical_models(
-            db_path=DB_PATH,
-            wait_for=[load_exp_task, load_bul_task]
-        )
-        
-        report = generate_quality_report(
-            db_path=DB_PATH,
-            table_name=TABLE_NAMES["exportaciones"],
-            columns_to_check=list(export_config["cols_map"].keys()),
-            wait_for=[modeling_task]
-        )
-        print_report_and_recommendations(report)
-        
-        logger.info("¡Flujo ETL completado exitosamente!")
+            base_generation = read_generation()
+            build_path = prepare_build(DB_PATH, STAGING_DB_PATH)
+            logger.info(f"Construyendo la nueva versión de la bodega en '{build_path}'.")
+
+            # --- PASO 1: Extracción, Transformación y Carga ---
+            # Archivos a leer y particiones a reemplazar por fuente; en una carga
+            # completa se leen todos y las particiones son None (tabla completa).
+            plans = {}
+            with progress.stage("plan"):
+                for source_name, source_config in DATA_SOURCES.items():
+                    if incremental:
+                        plans[source_name] = plan_incremental_load(db_path=build_path, source_name=source_name, source_config=source_config)
+                    else:
+                        plans[source_name] = {"files": source_config["files"], "partitions": None, "manifest": None, "removed": []}
+
+            # Con el motor "parallel" se encolan de una vez los archivos de todas las
+            # fuentes, para que se extraigan mientras se cargan los ya terminados.
+            pending = {}
+            if engine == "parallel":
+                executor = open_file_pool(ETL_MAX_WORKERS)
+                logger.info(f"Extrayendo y curando archivos en paralelo con hasta {ETL_MAX_WORKERS} procesos.")
+                for source_name, plan in plans.items():
+                    pending[source_name] = submit_source_files(executor, DATA_SOURCES[source_name], plan["files"])
+
+            load_tasks = []
+            # Particiones tocadas por esta carga; None significa carga completa.
+            touched_partitions = set() if incremental else None
+            for source_name, source_config in DATA_SOURCES.items():
+                table_name = TABLE_NAMES[source_name]
+                plan = plans[source_name]
+                with progress.stage(f"load:{source_name}") as stage:
+                    rows_loaded = 0
+                    if plan["files"] or plan["removed"]:
+                        clear_rejected_records(
+                            db_path=build_path, source_name=source_name,
+                            files=[*plan["files"], *plan["removed"]] if incremental else None
+                        )
+                    if plan["files"]:
+                        plan_config = {**source_config, "files": plan["files"]}
+                        if engine == "parallel":
+                            rows_loaded = load_extracted_files(
+                                pending[source_name], plan_config, build_path, table_name,
+                                source_name, run_metrics.run_id, plan["partitions"]
+                            )
+                        else:
+                            rows_loaded = _run_source(
+                                engine, plan_config, build_path, table_name, source_name, run_metrics.run_id, plan["partitions"]
+                            )
+                    elif plan["partitions"]:
+                        # Sólo se eliminaron archivos y ningún otro comparte sus particiones.
+                        clear_partitions(db_path=build_path, table_name=table_name, partitions=plan["partitions"])
+                    if incremental:
+                        touched_partitions.update(plan["partitions"])
+                        manifest_entries = plan["manifest"]
+                    else:
+                        manifest_entries = fingerprint_source(source_config=source_config)
+                    load_tasks.append(rows_loaded)
+                    stage["rows"] = rows_loaded
+                    record_manifest(
+                        db_path=build_path, source_name=source_name, entries=manifest_entries,
+                        removed=plan["removed"], replace=not incremental, wait_for=load_tasks
+                    )
+
+            # --- PASO 2: Modelado y Análisis ---
+            with progress.stage("modeling"):
+                modeling_task = create_analytical_models(
+                    db_path=build_path,
+                    partitions=sorted(touched_partitions) if incremental else None,
+                    wait_for=load_tasks
+                )
+
+            with progress.stage("quality_report") as stage:
+                report = generate_quality_report(
+                    db_path=build_path,
+                    partitions=sorted(touched_partitions) if incremental else None,
+                    wait_for=[modeling_task]
+                )
+                stage["rows"] = report.get("profiled_rows")
+                print_report_and_recommendations(report)
+
+            if export_lake:
+                with progress.stage("lake_export"):
+                    lake_snapshot = export_lake_snapshot(
+                        db_path=build_path,
+                        lake_dir=LAKE_DIR,
+                        snapshot_id=run_metrics.run_id,
+                        base_generation=base_generation,
+                        partitions=sorted(touched_partitions) if incremental else None,
+                        compression=LAKE_COMPRESSION,
+                        row_group_size=LAKE_ROW_GROUP_SIZE
+                    )
+
+            run_metrics.finish()
+            save_run_metrics(build_path, run_metrics)
+
+            # --- PASO 3: Publicación atómica de la nueva bodega ---
+            with progress.stage("publish"):
+                generation = publish_build(build_path, DB_PATH)
+                if lake_snapshot is not None:
+                    publish_lake_snapshot(LAKE_DIR, lake_snapshot["snapshot"], generation)
+            logger.info(f"Bodega publicada en '{DB_PATH}' (generación {generation}).")
+            progress.finish(generation)
+
+            logger.info("¡Flujo ETL completado exitosamente!")
 
-    except Exception as e:
-        logger.error(f"El flujo ETL falló con un error: {e}", exc_info=True)
-        raise
+        except Exception as e:
+            # La bodega publicada no se tocó: se descarta la copia de trabajo.
+            discard_build(STAGING_DB_PATH)
+            if lake_snapshot is not None:
+                discard_lake_snapshot(LAKE_DIR, lake_snapshot["snapshot"])
+            progress.fail(e)
+            logger.error(f"El flujo ETL falló con un error: {e}", exc_info=True)
+            raise
+        finally:
+            stop_run_metrics()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
 
 if __name__ == "__main__":
-    etl_parent_flow()
\ No newline at end of file
+    etl_parent_flow()
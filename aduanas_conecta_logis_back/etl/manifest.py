@@ -0,0 +1,182 @@
+
+import hashlib
+import duckdb
+from pathlib import Path
+from typing import Dict, Any, List, Sequence
+from prefect import task, get_run_logger
+from .native import build_read_csv_sql, build_date_sql
+from .instrumentation import instrumented
+
+# El manifiesto registra, por archivo de origen, su huella (tamaño, mtime y hash
+# del contenido), cuántas líneas tenía y qué particiones (año, mes) generó. Con
+# él la carga incremental decide qué archivos leer y qué particiones reemplazar.
+MANIFEST_TABLE = "etl_manifest"
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+def _ensure_manifest(con: duckdb.DuckDBPyConnection):
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+            source VARCHAR,
+            file_path VARCHAR,
+            size_bytes BIGINT,
+            mtime DOUBLE,
+            content_hash VARCHAR,
+            row_count BIGINT,
+            partitions INTEGER[],
+            loaded_at TIMESTAMP,
+            PRIMARY KEY (source, file_path)
+        )
+    """)
+
+def file_fingerprint(file_path: Path) -> Dict[str, Any]:
+    """Calcula tamaño, mtime, hash SHA-256 y cantidad de líneas leyendo el archivo por bloques."""
+    digest = hashlib.sha256()
+    row_count = 0
+    with open(file_path, "rb") as f:
+        while block := f.read(_HASH_BLOCK_SIZE):
+            digest.update(block)
+            row_count += block.count(b"\n")
+    stat = file_path.stat()
+    return {
+        "file_path": str(file_path),
+        "size_bytes": stat.st_size,
+        "mtime": stat.st_mtime,
+        "content_hash": digest.hexdigest(),
+        "row_count": row_count,
+    }
+
+def scan_file_partitions(file_path: Path, cols_map: Dict[str, int], separator: str) -> List[int]:
+    """Obtiene las particiones (AAAAMM) presentes en un archivo leyendo sólo su columna de fecha."""
+    date_only = {"FECHAACEPT": cols_map["FECHAACEPT"]}
+    query = f"""
+        SELECT DISTINCT year(d) * 100 + month(d) AS partition_key
+        FROM (SELECT {build_date_sql("trim(FECHAACEPT)")} AS d FROM ({build_read_csv_sql([file_path], date_only, separator)}))
+        WHERE d IS NOT NULL
+        ORDER BY partition_key
+    """
+    with duckdb.connect() as con:
+        return [row[0] for row in con.execute(query).fetchall()]
+
+@task(name="Plan Incremental Load")
+@instrumented("plan_incremental")
+def plan_incremental_load(db_path: Path, source_name: str, source_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compara los archivos de una fuente con el manifiesto y devuelve:
+      - files: archivos que hay que leer (nuevos, modificados y los que comparten
+        partición con ellos, para poder reconstruir esas particiones completas).
+      - partitions: claves AAAAMM de las particiones a reemplazar.
+      - manifest: entradas del manifiesto a registrar tras la carga.
+      - removed: archivos del manifiesto que ya no están en la fuente o en
+        disco. Sus particiones se reemplazan como las de un archivo modificado,
+        así que sus filas desaparecen como en una carga completa.
+    """
+    logger = get_run_logger()
+    previous: Dict[str, Dict[str, Any]] = {}
+    if db_path.exists():
+        with duckdb.connect(database=str(db_path), read_only=True) as con:
+            has_manifest = con.execute(
+                "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [MANIFEST_TABLE]
+            ).fetchone()[0]
+            if has_manifest:
+                cursor = con.execute(f"SELECT * FROM {MANIFEST_TABLE} WHERE source = ?", [source_name])
+                col_names = [desc[0] for desc in cursor.description]
+                for row in cursor.fetchall():
+                    entry = dict(zip(col_names, row))
+                    previous[entry["file_path"]] = entry
+
+    changed, unchanged, manifest = [], [], []
+    for file_path in source_config["files"]:
+        if not file_path.exists():
+            logger.warning(f"Archivo no encontrado: {file_path}. Saltando.")
+            continue
+        prev = previous.get(str(file_path))
+        stat = file_path.stat()
+        if prev and prev["size_bytes"] == stat.st_size and prev["mtime"] == stat.st_mtime:
+            unchanged.append(file_path)
+            continue
+        fingerprint = file_fingerprint(file_path)
+        if prev and prev["content_hash"] == fingerprint["content_hash"]:
+            # Sólo cambió el mtime: se actualiza el manifiesto sin recargar el archivo.
+            fingerprint["partitions"] = list(prev["partitions"])
+            manifest.append(fingerprint)
+            unchanged.append(file_path)
+            continue
+        fingerprint["partitions"] = scan_file_partitions(file_path, source_config["cols_map"], source_config["separator"])
+        manifest.append(fingerprint)
+        changed.append(file_path)
+
+    current = {str(f) for f in source_config["files"] if f.exists()}
+    removed = sorted(path for path in previous if path not in current)
+
+    affected = set()
+    for path in removed:
+        affected.update(previous[path]["partitions"])
+    for file_path in changed:
+        prev = previous.get(str(file_path))
+        if prev is not None:
+            affected.update(prev["partitions"])
+    for entry in manifest:
+        if Path(entry["file_path"]) in changed:
+            affected.update(entry["partitions"])
+
+    siblings = [
+        f for f in unchanged
+        if str(f) in previous and affected.intersection(previous[str(f)]["partitions"])
+    ]
+    files = [f for f in source_config["files"] if f in changed or f in siblings]
+
+    if changed or removed:
+        logger.info(
+            f"Fuente '{source_name}': {len(changed)} archivo(s) nuevo(s) o modificado(s) y {len(removed)} eliminado(s); "
+            f"se reemplazarán las particiones {sorted(affected)} leyendo {len(files)} archivo(s)."
+        )
+    else:
+        logger.info(f"Fuente '{source_name}': sin archivos nuevos, modificados ni eliminados.")
+    return {"files": files, "partitions": sorted(affected), "manifest": manifest, "removed": removed}
+
+@task(name="Record Load Manifest")
+@instrumented("record_manifest")
+def record_manifest(
+    db_path: Path, source_name: str, entries: List[Dict[str, Any]], removed: Sequence[str] = (), replace: bool = False
+):
+    """
+    Registra (o actualiza) en el manifiesto las huellas de los archivos cargados
+    y quita las de los archivos `removed`. Con `replace` (carga completa) antes
+    se quitan todas las de la fuente.
+    """
+    if not entries and not removed and not replace:
+        return
+    logger = get_run_logger()
+    with duckdb.connect(database=str(db_path), read_only=False) as con:
+        _ensure_manifest(con)
+        if replace:
+            con.execute(f"DELETE FROM {MANIFEST_TABLE} WHERE source = ?", [source_name])
+        elif removed:
+            con.execute(
+                f"DELETE FROM {MANIFEST_TABLE} WHERE source = ? AND list_contains(?, file_path)", [source_name, list(removed)]
+            )
+            logger.info(f"Se quitaron del manifiesto {len(removed)} archivo(s) eliminado(s) de la fuente '{source_name}'.")
+        if not entries:
+            return
+        con.executemany(
+            f"INSERT OR REPLACE INTO {MANIFEST_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, current_localtimestamp())",
+            [
+                [source_name, e["file_path"], e["size_bytes"], e["mtime"], e["content_hash"], e["row_count"], e["partitions"]]
+                for e in entries
+            ]
+        )
+    logger.info(f"Manifiesto actualizado para {len(entries)} archivo(s) de la fuente '{source_name}'.")
+
+@task(name="Fingerprint Source Files")
+@instrumented("fingerprint")
+def fingerprint_source(source_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Huellas de todos los archivos de una fuente, usadas tras una carga completa."""
+    entries = []
+    for file_path in source_config["files"]:
+        if not file_path.exists():
+            continue
+        fingerprint = file_fingerprint(file_path)
+        fingerprint["partitions"] = scan_file_partitions(file_path, source_config["cols_map"], source_config["separator"])
+        entries.append(fingerprint)
+    return entries
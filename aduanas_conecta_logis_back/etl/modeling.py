@@ -1,84 +1,266 @@
 
 import duckdb
 from pathlib import Path
+from typing import List, Optional
 from prefect import task, get_run_logger
+from .config import TOP_EXPORTERS_PER_WEEK
+from .load import partition_filter
+from .catalog import (
+    DATOS_IDTY_SQL, DECLARATION_TABLES, DIMENSION_TABLES, create_analytical_views, declaration_rollup_sql
+)
+from .instrumentation import instrumented
+
+# Tablas de resumen que respaldan las vistas analíticas. Se recalculan sólo
+# para las fechas de las particiones tocadas por la última carga, y las vistas
+# aplican LAG y RANK sobre ellas en lugar de recorrer todas las declaraciones.
+SUMMARY_TABLES = {
+    # Suma y conteo diario de FOB, para el promedio y la variación diaria.
+    "agg_fob_diario": """
+        SELECT CAST(FECHAACEPT AS DATE) AS fecha, SUM(FOBUNITARIO) AS fob_sum, COUNT(FOBUNITARIO) AS fob_count
+        FROM datos_idty
+        {where}
+        GROUP BY fecha
+    """,
+    # FOB semanal por exportador, para el ranking. `week_start` es el primer día
+    # de la semana '%Y-%W' (el lunes, o el 1 de enero para la semana 00), para
+    # filtrar por fecha en lugar de por el texto de la semana.
+    "agg_fob_semanal_exportador": """
+        SELECT
+            strftime(FECHAACEPT, '%Y-%W') AS week,
+            CAST(greatest(date_trunc('week', FECHAACEPT), date_trunc('year', FECHAACEPT)) AS DATE) AS week_start,
+            exportador_id, SUM(FOBUNITARIO) AS total_fob
+        FROM datos_idty
+        {where}
+        GROUP BY week, week_start, exportador_id
+    """,
+    # Los primeros TOP_EXPORTERS_PER_WEEK exportadores de cada semana, con el
+    # mismo ranking de V_RANKING_SEMANAL, para los tableros que sólo piden el top.
+    "agg_top_exportadores_semanal": f"""
+        SELECT week, week_start, rank, exportador_id, total_fob
+        FROM (
+            SELECT week, week_start, exportador_id, total_fob,
+                   RANK() OVER (PARTITION BY week_start ORDER BY total_fob DESC) AS rank
+            FROM agg_fob_semanal_exportador
+            {{where}}
+        )
+        WHERE rank <= {TOP_EXPORTERS_PER_WEEK}
+    """,
+    # FOB diario por exportador, para su serie histórica.
+    "agg_fob_diario_exportador": """
+        SELECT CAST(FECHAACEPT AS DATE) AS fecha, exportador_id, SUM(FOBUNITARIO) AS total_fob
+        FROM datos_idty
+        {where}
+        GROUP BY fecha, exportador_id
+    """,
+    # Peso y bultos diarios, para el peso promedio por bulto.
+    "agg_peso_bultos_diario": """
+        SELECT CAST(p.FECHAACEPT AS DATE) AS fecha, SUM(p.peso_total) AS peso_sum, SUM(b.total_bultos) AS bultos_sum
+        FROM peso_por_declaracion AS p
+        JOIN bultos_por_declaracion AS b ON p.NUMEROIDENT = b.NUMEROIDENT
+        {where}
+        GROUP BY fecha
+    """,
+}
+
+# Resúmenes por semana ('%Y-%W') y la expresión de la semana en su origen: en
+# una carga incremental se recalculan las semanas completas que tocan las particiones.
+WEEKLY_SUMMARIES = {
+    "agg_fob_semanal_exportador": "strftime(FECHAACEPT, '%Y-%W')",
+    "agg_top_exportadores_semanal": "week",
+}
+
+def _table_exists(con: duckdb.DuckDBPyConnection, table_name: str) -> bool:
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ? AND table_type = 'BASE TABLE'", [table_name]
+    ).fetchone()[0] > 0
+
+def _same_columns(con: duckdb.DuckDBPyConnection, table_name: str, query: str) -> bool:
+    """Indica si la tabla guardada tiene las mismas columnas que produce su consulta actual."""
+    expected = [row[0] for row in con.execute(f"DESCRIBE {query.format(where='')}").fetchall()]
+    actual = [row[0] for row in con.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = ? ORDER BY ordinal_position", [table_name]
+    ).fetchall()]
+    return expected == actual
+
+def _touched_weeks_sql(partitions: List[int]) -> str:
+    """
+    Semanas ('%Y-%W') con al menos un día en las particiones. Las semanas pueden
+    cruzar el límite de un mes, así que se recalculan completas.
+    """
+    months = ", ".join(f"make_date({key // 100}, {key % 100}, 1)" for key in partitions)
+    return f"""
+        SELECT DISTINCT strftime(day, '%Y-%W')
+        FROM (SELECT unnest([{months}]) AS month_start) AS m,
+             LATERAL (SELECT unnest(generate_series(month_start, month_start + INTERVAL 1 MONTH - INTERVAL 1 DAY, INTERVAL 1 DAY)) AS day)
+    """
+
+def _ensure_dimension(con: duckdb.DuckDBPyConnection, table_name: str):
+    spec = DIMENSION_TABLES[table_name]
+    attributes = "".join(f", {name} VARCHAR" for name in spec["attributes"])
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            {spec['key']} INTEGER PRIMARY KEY,
+            {spec['natural_key']} BIGINT NOT NULL UNIQUE{attributes}
+        )
+    """)
+
+def _refresh_dimension(con: duckdb.DuckDBPyConnection, table_name: str, partitions: Optional[List[int]]):
+    """
+    Agrega a la dimensión los valores de la clave natural que aparecen en
+    'exportaciones' (en las particiones tocadas, si las hay) y todavía no
+    tienen clave, numerándolos a continuación de la mayor. Nunca se borran ni
+    se renumeran filas, ni siquiera al reconstruir todo.
+    """
+    spec = DIMENSION_TABLES[table_name]
+    key, natural_key = spec["key"], spec["natural_key"]
+    source_filter = "" if partitions is None else f"AND {partition_filter(partitions)}"
+    attributes = "".join(f", {expr} AS {name}" for name, expr in spec["attributes"].items())
+    con.execute(f"""
+        INSERT INTO {table_name}
+        SELECT
+            (SELECT COALESCE(MAX({key}), 0) FROM {table_name}) + CAST(row_number() OVER (ORDER BY {natural_key}) AS INTEGER) AS {key},
+            {natural_key}{attributes}
+        FROM (
+            SELECT DISTINCT CAST({natural_key} AS BIGINT) AS {natural_key}
+            FROM exportaciones
+            WHERE {natural_key} IS NOT NULL {source_filter}
+        ) AS nuevos
+        WHERE {natural_key} NOT IN (SELECT {natural_key} FROM {table_name})
+    """)
+
+def _refresh_datos_idty(con: duckdb.DuckDBPyConnection, partitions: Optional[List[int]]):
+    """
+    Las filas se escriben ordenadas por FECHAACEPT, para que los filtros por
+    fecha descarten grupos de filas completos.
+    """
+    if partitions is None:
+        con.execute(f"CREATE OR REPLACE TABLE datos_idty AS {DATOS_IDTY_SQL} ORDER BY FECHAACEPT")
+    else:
+        con.execute(f"DELETE FROM datos_idty WHERE {partition_filter(partitions, 'year(FECHAACEPT)', 'month(FECHAACEPT)')}")
+        con.execute(f"INSERT INTO datos_idty {DATOS_IDTY_SQL} WHERE {partition_filter(partitions)} ORDER BY FECHAACEPT")
+
+# Fechas de 'agg_peso_bultos_diario' que recalcular en una carga incremental,
+# además de las de las particiones: las de las declaraciones con ítems o bultos
+# en las particiones tocadas, que pueden caer en otro mes (por ejemplo, bultos
+# registrados en abril de una declaración aceptada en marzo).
+TOUCHED_DECLARATION_DATES = "fechas_declaraciones_tocadas"
+
+def _record_touched_declaration_dates(con: duckdb.DuckDBPyConnection, partitions: List[int]):
+    """
+    Agrega a TOUCHED_DECLARATION_DATES la fecha actual de esas declaraciones
+    en 'peso_por_declaracion'. Se llama antes y después de recalcular los
+    totales por declaración, para recalcular también la fecha que una
+    declaración deja cuando un ítem nuevo la adelanta.
+    """
+    touched_ids = " UNION ".join(
+        f"SELECT NUMEROIDENT FROM {source_table} WHERE {partition_filter(partitions, 'year(FECHAACEPT)', 'month(FECHAACEPT)')}"
+        for source_table, _ in DECLARATION_TABLES.values()
+    )
+    con.execute(f"CREATE TEMP TABLE IF NOT EXISTS {TOUCHED_DECLARATION_DATES} (fecha DATE)")
+    con.execute(f"""
+        INSERT INTO {TOUCHED_DECLARATION_DATES}
+        SELECT DISTINCT CAST(FECHAACEPT AS DATE) FROM peso_por_declaracion WHERE NUMEROIDENT IN ({touched_ids})
+    """)
+
+def _refresh_declaration_rollup(con: duckdb.DuckDBPyConnection, table_name: str, partitions: Optional[List[int]]):
+    """
+    Una fila por NUMEROIDENT con su primera FECHAACEPT y el total agregado. En
+    una carga incremental se recalculan completas las declaraciones que tienen
+    filas en las particiones tocadas.
+    """
+    source_table, _ = DECLARATION_TABLES[table_name]
+    if partitions is None:
+        con.execute(f"CREATE OR REPLACE TABLE {table_name} AS {declaration_rollup_sql(table_name)}")
+        return
+    touched_ids = f"""
+        SELECT DISTINCT NUMEROIDENT FROM {source_table}
+        WHERE {partition_filter(partitions, 'year(FECHAACEPT)', 'month(FECHAACEPT)')}
+    """
+    con.execute(f"""
+        DELETE FROM {table_name}
+        WHERE NUMEROIDENT IN ({touched_ids})
+           OR {partition_filter(partitions, 'year(FECHAACEPT)', 'month(FECHAACEPT)')}
+    """)
+    con.execute(f"INSERT INTO {table_name} {declaration_rollup_sql(table_name, f'WHERE NUMEROIDENT IN ({touched_ids})')}")
+
+def _refresh_summary(con: duckdb.DuckDBPyConnection, table_name: str, partitions: Optional[List[int]]):
+    query = SUMMARY_TABLES[table_name]
+    if partitions is None:
+        con.execute(f"CREATE OR REPLACE TABLE {table_name} AS {query.format(where='')}")
+        return
+    if table_name in WEEKLY_SUMMARIES:
+        weeks_sql = _touched_weeks_sql(partitions)
+        source_filter = f"{WEEKLY_SUMMARIES[table_name]} IN ({weeks_sql})"
+        con.execute(f"DELETE FROM {table_name} WHERE week IN ({weeks_sql})")
+    elif table_name == "agg_peso_bultos_diario":
+        touched_dates = f"SELECT fecha FROM {TOUCHED_DECLARATION_DATES}"
+        source_filter = f"({partition_filter(partitions, 'year(p.FECHAACEPT)', 'month(p.FECHAACEPT)')} OR CAST(p.FECHAACEPT AS DATE) IN ({touched_dates}))"
+        con.execute(f"DELETE FROM {table_name} WHERE {partition_filter(partitions, 'year(fecha)', 'month(fecha)')} OR fecha IN ({touched_dates})")
+    else:
+        source_filter = partition_filter(partitions, "year(FECHAACEPT)", "month(FECHAACEPT)")
+        con.execute(f"DELETE FROM {table_name} WHERE {partition_filter(partitions, 'year(fecha)', 'month(fecha)')}")
+    con.execute(f"INSERT INTO {table_name} {query.format(where='WHERE ' + source_filter)}")
 
 @task(name="Create Analytical Models (Table and Views)")
-def create_analytical_models(db_path: Path):
+@instrumented("modeling")
+def create_analytical_models(db_path: Path, partitions: Optional[List[int]] = None):
     """
-    Crea la tabla intermedia 'datos_idty' y las vistas analíticas,
-    utilizando los tipos de datos correctos para los identificadores grandes.
+    Crea las dimensiones de exportadores y aranceles, la tabla intermedia
+    'datos_idty' (que guarda sólo sus claves sustitutas), las tablas de resumen
+    y las vistas analíticas.
+
+    Con `partitions` (claves AAAAMM tocadas por una carga incremental) sólo se
+    recalculan esas fechas; sin ellas se reconstruye todo.
     """
     logger = get_run_logger()
     logger.info("Iniciando la creación de modelos de datos analíticos (tabla y vistas)...")
-    
+
     try:
         con = duckdb.connect(database=str(db_path), read_only=False)
 
-        # --- 1. Crear la tabla intermedia 'datos_idty' ---
-        create_table_sql = """
-        CREATE OR REPLACE TABLE datos_idty AS
-        SELECT
-            FECHAACEPT,
-            NUMEROIDENT,
-            CAST(NRO_EXPORTADOR AS BIGINT) AS NRO_EXPORTADOR,
-            CAST(CODIGOARANCEL AS BIGINT) AS CODIGOARANCEL,
-            CAST(FOBUNITARIO AS DOUBLE) AS FOBUNITARIO,
-            CAST(PESOBRUTOITEM AS DOUBLE) AS PESOBRUTOITEM
-        FROM exportaciones;
-        """
-        con.execute(create_table_sql)
-        logger.info("Tabla 'datos_idty' creada exitosamente.")
-
-        # --- 2. Crear las Vistas (Views) Analíticas ---
-        # Vista para tendencias diarias de FOB
-        create_view_trends_sql = """
-        CREATE OR REPLACE VIEW V_TENDENCIAS_DIARIAS AS
-        WITH daily_avg AS (
-            SELECT CAST(FECHAACEPT AS DATE) AS period_date, AVG(FOBUNITARIO) AS average_fob
-            FROM datos_idty GROUP BY period_date
-        ),
-        daily_trends AS (
-            SELECT strftime(period_date, '%Y-%m-%d') AS period, average_fob,
-                   LAG(average_fob, 1) OVER (ORDER BY period_date) AS prev_day_avg
-            FROM daily_avg
-        )
-        SELECT period, average_fob,
-               CASE WHEN prev_day_avg > 0 THEN ((average_fob - prev_day_avg) / prev_day_avg) * 100 ELSE NULL END AS change_from_previous
-        FROM daily_trends;
-        """
-        con.execute(create_view_trends_sql)
-        logger.info("Vista 'V_TENDENCIAS_DIARIAS' creada exitosamente.")
-        
-        # Vista para el ranking semanal de exportadores
-        create_view_ranking_sql = """
-        CREATE OR REPLACE VIEW V_RANKING_SEMANAL AS
-        WITH weekly_fob AS (
-            SELECT strftime(FECHAACEPT, '%Y-%W') AS week, NRO_EXPORTADOR, SUM(FOBUNITARIO) AS total_fob
-            FROM datos_idty GROUP BY week, NRO_EXPORTADOR
-        )
-        SELECT week, RANK() OVER (PARTITION BY week ORDER BY total_fob DESC) AS rank, NRO_EXPORTADOR, total_fob
-        FROM weekly_fob;
-        """
-        con.execute(create_view_ranking_sql)
-        logger.info("Vista 'V_RANKING_SEMANAL' creada exitosamente.")
-
-        # Vista para el peso promedio por bulto
-        create_view_avg_weight_sql = """
-        CREATE OR REPLACE VIEW V_PESO_PROMEDIO_BULTO AS
-        SELECT
-            SUM(d.PESOBRUTOITEM) / NULLIF(SUM(b.CANTIDADBULTO), 0) AS average_weight_per_bulto,
-            CAST(d.FECHAACEPT AS DATE) AS fecha_aceptacion
-        FROM datos_idty AS d
-        JOIN bultos_exportaciones AS b ON d.NUMEROIDENT = b.NUMEROIDENT
-        GROUP BY fecha_aceptacion;
-        """
-        con.execute(create_view_avg_weight_sql)
-        logger.info("Vista 'V_PESO_PROMEDIO_BULTO' creada exitosamente.")
+        for table_name in DIMENSION_TABLES:
+            _ensure_dimension(con, table_name)
+        required = ["datos_idty", *DECLARATION_TABLES, *SUMMARY_TABLES]
+        if partitions is not None and not (
+            all(_table_exists(con, t) for t in required)
+            and _same_columns(con, "datos_idty", DATOS_IDTY_SQL)
+            and all(_same_columns(con, t, query) for t, query in SUMMARY_TABLES.items())
+        ):
+            logger.info("Faltan tablas de resumen o cambió su estructura; se reconstruirán completas.")
+            partitions = None
+        if partitions is not None and not partitions:
+            logger.info("La carga no tocó particiones; los modelos analíticos están al día.")
+        else:
+            con.execute("BEGIN TRANSACTION")
+            # --- 1. Agregar las claves nuevas a las dimensiones y actualizar la tabla intermedia 'datos_idty' ---
+            for table_name in DIMENSION_TABLES:
+                _refresh_dimension(con, table_name, partitions)
+                logger.info(f"Dimensión '{table_name}' actualizada exitosamente.")
+            _refresh_datos_idty(con, partitions)
+            logger.info("Tabla 'datos_idty' actualizada exitosamente.")
+
+            # --- 2. Crear o actualizar los totales por declaración y las tablas de resumen ---
+            if partitions is not None:
+                _record_touched_declaration_dates(con, partitions)
+            for table_name in DECLARATION_TABLES:
+                _refresh_declaration_rollup(con, table_name, partitions)
+                logger.info(f"Tabla '{table_name}' actualizada exitosamente.")
+            if partitions is not None:
+                _record_touched_declaration_dates(con, partitions)
+            for table_name in SUMMARY_TABLES:
+                _refresh_summary(con, table_name, partitions)
+                logger.info(f"Tabla de resumen '{table_name}' actualizada exitosamente.")
+            con.execute("COMMIT")
+            scope = "completa" if partitions is None else f"de las particiones {partitions}"
+            logger.info(f"Actualización {scope} de los modelos terminada.")
+
+        # --- 3. Crear las Vistas (Views) Analíticas sobre las tablas de resumen ---
+        for view_name in create_analytical_views(con):
+            logger.info(f"Vista '{view_name}' creada exitosamente.")
 
         con.close()
         logger.info("Todos los modelos de datos analíticos han sido creados.")
 
     except Exception as e:
         logger.error(f"Error creando los modelos de datos analíticos: {e}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
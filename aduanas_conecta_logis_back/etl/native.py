@@ -0,0 +1,176 @@
+
+import duckdb
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from prefect import task, get_run_logger
+from .transform import NUMERIC_COLUMNS
+from .load import downcast_integral_columns, delete_partitions, insert_rows
+from .instrumentation import instrumented, record_rows
+from .rejects import (
+    save_rejected_records, SOURCE_FILE_COLUMN, RECORD_COLUMN, RAW_LINE_COLUMN, REASON_COLUMN,
+    MALFORMED_LINE, BAD_NUMEROIDENT, BAD_DATE
+)
+
+# Motor alternativo que usa el lector CSV paralelo de DuckDB y expresa en SQL
+# las mismas reglas de `clean_and_transform_split`, sin pasar por pandas.
+
+def _count_fields(file_path: Path, separator: str) -> int:
+    """Cuenta los campos de la primera línea, igual que hace pandas para fijar el ancho."""
+    with open(file_path, encoding="latin-1") as f:
+        return f.readline().rstrip("\r\n").count(separator) + 1
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+def build_read_csv_sql(files: List[Path], cols_map: Dict[str, int], separator: str, lineage: bool = False) -> str:
+    """
+    Construye una consulta que lee las columnas de `cols_map` como texto, con
+    sus nombres finales y sin aplicar ninguna limpieza. Las líneas con más
+    campos que la primera se descartan, como hace `on_bad_lines` en pandas.
+    Con `lineage=True` agrega el archivo de origen de cada registro y guarda
+    las líneas descartadas en la tabla temporal `reject_errors` de la conexión.
+    """
+    n_fields = max(_count_fields(f, separator) for f in files)
+    columns = ", ".join(f"'c{i}': 'VARCHAR'" for i in range(n_fields))
+    file_list = ", ".join(_quote(str(f)) for f in files)
+    selections = ", ".join(f"c{pos} AS {name}" for name, pos in cols_map.items())
+    options = ""
+    if lineage:
+        selections += f", filename AS {SOURCE_FILE_COLUMN}"
+        options = ", filename=true, store_rejects=true"
+    return f"""
+        SELECT {selections}
+        FROM read_csv([{file_list}], delim={_quote(separator)}, header=false, auto_detect=false,
+                      columns={{{columns}}}, encoding='latin-1', null_padding=true, ignore_errors=true{options})
+    """
+
+def build_date_sql(col: str) -> str:
+    """Equivalente SQL de `str.zfill(8)` seguido de `to_datetime(format='%d%m%Y')`."""
+    padded = f"CASE WHEN length({col}) < 8 THEN lpad({col}, 8, '0') ELSE {col} END"
+    return f"CAST(try_strptime({padded}, '%d%m%Y') AS TIMESTAMP_NS)"
+
+def _try_double(value: str) -> str:
+    """Equivalente SQL de `pd.to_numeric(errors='coerce')`: el texto "nan" también queda nulo."""
+    return f"nullif(TRY_CAST({value} AS DOUBLE), 'NaN'::DOUBLE)"
+
+def _numeric_expr(col: str, decimal_separator: str) -> str:
+    value = col if decimal_separator == "." else f"replace({col}, {_quote(decimal_separator)}, '.')"
+    return f"COALESCE({_try_double(value)}, 0)"
+
+@task(name="Ingest Source with DuckDB")
+@instrumented("ingest_duckdb")
+def ingest_with_duckdb(
+    source_config: Dict[str, Any],
+    db_path: Path,
+    table_name: str,
+    source_name: str,
+    run_id: Optional[str] = None,
+    partitions: Optional[List[int]] = None
+) -> int:
+    """
+    Lee, cura y carga una fuente completamente dentro de DuckDB. Produce la misma
+    tabla de datos válidos y los mismos rechazos que el motor de pandas, que se
+    guardan en `rejected_records` junto a las líneas mal formadas que descarta
+    el lector. Con `partitions` reemplaza sólo esas particiones (año, mes) de
+    la tabla.
+    """
+    logger = get_run_logger()
+    cols_map = source_config["cols_map"]
+    files = [f for f in source_config["files"] if f.exists()]
+    for missing in set(source_config["files"]) - set(files):
+        logger.warning(f"Archivo no encontrado: {missing}. Saltando.")
+    if not files:
+        raise ValueError("No se pudieron leer datos de los archivos de origen.")
+
+    raw_cols = list(cols_map.keys())
+    good_cols = []
+    for col in raw_cols:
+        if col == "FECHAACEPT":
+            good_cols.append("FECHAACEPT_clean AS FECHAACEPT")
+        elif col == "NUMEROIDENT":
+            good_cols.append("CAST(trunc(NUMEROIDENT_clean) AS BIGINT) AS NUMEROIDENT")
+        elif col in NUMERIC_COLUMNS:
+            good_cols.append(f"{_numeric_expr('t_' + col, source_config['decimal_separator'])} AS {col}")
+        else:
+            good_cols.append(f"t_{col} AS {col}")
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    con = duckdb.connect(database=str(db_path), read_only=False)
+    try:
+        logger.info(f"Leyendo {len(files)} archivo(s) con el lector CSV de DuckDB...")
+        # Los registros se guardan en el orden de los archivos: su rowid da la
+        # posición de cada uno dentro de su archivo.
+        con.execute(f"CREATE OR REPLACE TEMP TABLE raw AS {build_read_csv_sql(files, cols_map, source_config['separator'], lineage=True)}")
+        # Registros crudos sin duplicados (se conserva la primera aparición),
+        # junto a su versión limpia y los valores convertidos.
+        con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE staged AS
+            WITH file_starts AS (
+                SELECT {SOURCE_FILE_COLUMN}, MIN(rowid) AS first_row FROM raw GROUP BY {SOURCE_FILE_COLUMN}
+            ),
+            first_seen AS (
+                SELECT {", ".join(raw_cols)}, arg_min({SOURCE_FILE_COLUMN}, rowid) AS {SOURCE_FILE_COLUMN}, MIN(rowid) AS row_id
+                FROM raw
+                GROUP BY {", ".join(raw_cols)}
+            ),
+            deduped AS (
+                SELECT first_seen.* EXCLUDE (row_id), row_id - first_row + 1 AS {RECORD_COLUMN}
+                FROM first_seen JOIN file_starts USING ({SOURCE_FILE_COLUMN})
+            ),
+            trimmed AS (
+                SELECT *, {", ".join(f"trim({c}) AS t_{c}" for c in raw_cols)} FROM deduped
+            )
+            SELECT *,
+                   {build_date_sql("t_FECHAACEPT")} AS FECHAACEPT_clean,
+                   {_try_double("t_NUMEROIDENT")} AS NUMEROIDENT_clean
+            FROM trimmed
+        """)
+        con.execute("DROP TABLE raw")
+        bad_rows = "NUMEROIDENT_clean IS NULL OR FECHAACEPT_clean IS NULL"
+        df_rejected = con.execute(f"""
+            SELECT {', '.join(raw_cols)}, {SOURCE_FILE_COLUMN}, {RECORD_COLUMN},
+                   CASE WHEN NUMEROIDENT_clean IS NULL THEN '{BAD_NUMEROIDENT}' ELSE '{BAD_DATE}' END AS {REASON_COLUMN}
+            FROM staged WHERE {bad_rows}
+        """).fetchdf()
+        logger.info(f"{len(df_rejected)} filas fueron rechazadas por datos críticos inválidos.")
+        df_malformed = con.execute(f"""
+            SELECT DISTINCT scans.file_path AS {SOURCE_FILE_COLUMN}, errors.line AS {RECORD_COLUMN},
+                   errors.csv_line AS {RAW_LINE_COLUMN}, '{MALFORMED_LINE}' AS {REASON_COLUMN}
+            FROM reject_errors AS errors JOIN reject_scans AS scans USING (scan_id, file_id)
+            ORDER BY ALL
+        """).fetchdf()
+        if not df_malformed.empty:
+            logger.warning(f"{len(df_malformed)} línea(s) mal formada(s) descartadas por el lector CSV.")
+            df_rejected = pd.concat([df_rejected, df_malformed], ignore_index=True)
+
+        con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE curated AS
+            SELECT {", ".join(good_cols)},
+                   CAST(current_localtimestamp() AS TIMESTAMP) AS hora_lectura_archivo,
+                   CAST(year(FECHAACEPT_clean) AS INTEGER) AS año,
+                   CAST(month(FECHAACEPT_clean) AS INTEGER) AS mes,
+                   CAST(current_localtimestamp() AS TIMESTAMP) AS hora_procesamiento
+            FROM staged
+            WHERE NOT ({bad_rows})
+        """)
+        rows_loaded = con.execute("SELECT COUNT(*) FROM curated").fetchone()[0]
+
+        con.execute("BEGIN TRANSACTION")
+        if partitions is None:
+            con.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM curated")
+        else:
+            delete_partitions(con, table_name, partitions)
+            insert_rows(con, table_name, "SELECT * FROM curated", partitions, NUMERIC_COLUMNS)
+        downcast_integral_columns(con, table_name, NUMERIC_COLUMNS)
+        con.execute("COMMIT")
+    except Exception as e:
+        logger.error(f"Error en la ingesta nativa con DuckDB para '{table_name}': {e}", exc_info=True)
+        raise
+    finally:
+        con.close()
+
+    save_rejected_records.fn(df=df_rejected, db_path=db_path, source_name=source_name, run_id=run_id)
+    record_rows("ingest_duckdb", rows_rejected=len(df_rejected))
+    logger.info(f"Ingesta nativa completada. Filas válidas: {rows_loaded}. Filas rechazadas: {len(df_rejected)}.")
+    return rows_loaded
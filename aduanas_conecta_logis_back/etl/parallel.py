@@ -0,0 +1,109 @@
+
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from prefect import get_run_logger
+from prefect.logging import disable_run_logger
+from .instrumentation import active_run_metrics, collect_run_metrics
+from .extract import extract_from_files
+from .transform import clean_and_transform_split, row_keys, SeenRows, NUMERIC_COLUMNS
+from .load import load_chunks_to_duckdb
+from .rejects import save_rejected_records
+
+# Motor "parallel": cada archivo de cada fuente se extrae y cura en un proceso
+# distinto, de modo que el tiempo total depende del archivo más grande y no de
+# la suma de todos. Sólo la carga a DuckDB, que necesita el bloqueo de escritura,
+# se hace en serie desde el proceso del flujo.
+
+def open_file_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Crea el pool de procesos. Se usa 'spawn' porque el proceso del flujo tiene hilos de Prefect activos."""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+def extract_and_clean_file(
+    source_config: Dict[str, Any], file_path: Path
+) -> Tuple[Optional[Tuple[pd.DataFrame, pd.DataFrame, np.ndarray, np.ndarray]], List[Dict[str, Any]]]:
+    """
+    Extrae y cura un único archivo dentro de un proceso del pool, donde no hay
+    contexto de Prefect. Devuelve (datos válidos, rechazados, claves de los
+    válidos, claves de los rechazados), o None si el archivo no se pudo leer,
+    junto a las métricas de las etapas ejecutadas en el proceso, que el flujo
+    incorpora a las de la ejecución. Las claves (ver `row_keys`) se calculan
+    sobre los valores leídos, para eliminar los duplicados entre archivos.
+    """
+    with disable_run_logger(), collect_run_metrics() as metrics:
+        try:
+            df_raw = extract_from_files.fn(
+                file_paths=[file_path],
+                cols_map=source_config["cols_map"],
+                separator=source_config["separator"],
+                decimal_separator=source_config["decimal_separator"]
+            )
+        except ValueError:
+            return None, metrics.snapshot()
+        df_good, df_rejected = clean_and_transform_split.fn(
+            df=df_raw, decimal_separator=source_config["decimal_separator"], downcast_integers=False
+        )
+        # Ambos conservan el índice de `df_raw`.
+        keys = pd.Series(row_keys(df_raw), index=df_raw.index)
+        result = (df_good, df_rejected, keys.loc[df_good.index].to_numpy(), keys.loc[df_rejected.index].to_numpy())
+        return result, metrics.snapshot()
+
+def submit_source_files(executor: ProcessPoolExecutor, source_config: Dict[str, Any], files: List[Path]) -> List[Tuple[Path, Future]]:
+    """Encola la extracción y curación de cada archivo de una fuente."""
+    return [(file_path, executor.submit(extract_and_clean_file, source_config, file_path)) for file_path in files]
+
+def load_extracted_files(
+    pending: List[Tuple[Path, Future]],
+    source_config: Dict[str, Any],
+    db_path: Path,
+    table_name: str,
+    source_name: str,
+    run_id: Optional[str] = None,
+    partitions: Optional[List[int]] = None
+) -> int:
+    """
+    Carga en una sola transacción los archivos curados en paralelo, a medida que
+    sus procesos terminan y en el orden de la fuente, y luego guarda juntos los
+    rechazos de todos ellos. Cada proceso elimina los duplicados de su archivo;
+    los que se repiten en un archivo anterior de la fuente se descartan acá,
+    con las claves de los registros ya cargados, como en el motor "pandas".
+    """
+    logger = get_run_logger()
+    run_metrics = active_run_metrics()
+    rejected = []
+    seen_rows = SeenRows()
+
+    def good_chunks() -> Iterator[pd.DataFrame]:
+        read_any = False
+        for file_path, future in pending:
+            result, worker_metrics = future.result()
+            if run_metrics is not None:
+                run_metrics.merge(worker_metrics)
+            if result is None:
+                logger.warning(f"No se pudo leer el archivo {file_path}. Saltando.")
+                continue
+            read_any = True
+            df_good, df_rejected, good_keys, rejected_keys = result
+            new = seen_rows.keep_new(np.concatenate([good_keys, rejected_keys]))
+            repeated = len(new) - int(new.sum())
+            df_good, df_rejected = df_good[new[:len(df_good)]], df_rejected[new[len(df_good):]]
+            logger.info(
+                f"Archivo {file_path.name}: {len(df_good)} filas válidas, {len(df_rejected)} rechazadas"
+                f" y {repeated} repetidas de archivos anteriores."
+            )
+            if not df_rejected.empty:
+                rejected.append(df_rejected)
+            yield df_good
+        if not read_any:
+            raise ValueError("No se pudieron leer datos de los archivos de origen.")
+
+    rows_loaded = load_chunks_to_duckdb(
+        good_chunks(), db_path=db_path, table_name=table_name,
+        integer_candidates=NUMERIC_COLUMNS, partitions=partitions
+    )
+    if rejected:
+        save_rejected_records.fn(df=pd.concat(rejected, ignore_index=True), db_path=db_path, source_name=source_name, run_id=run_id)
+    return rows_loaded
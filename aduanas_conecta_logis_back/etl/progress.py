@@ -0,0 +1,85 @@
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+# Estado de un trabajo de ETL guardado como JSON. Lo crea la API al encolar el
+# trabajo y lo actualiza el proceso de la ETL etapa por etapa, de modo que la API
+# puede informar el avance sin compartir memoria con ese proceso.
+
+JOB_STATES = ("queued", "running", "succeeded", "failed")
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+def read_status(status_path: Path) -> Optional[Dict[str, Any]]:
+    """Lee el estado de un trabajo; None si no existe o no es un JSON válido."""
+    try:
+        return json.loads(status_path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def write_status(status_path: Path, status: Dict[str, Any]):
+    """Escribe el estado de forma atómica (temporal + rename) para no exponer JSON a medias."""
+    status_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = status_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(status, default=str))
+    os.replace(tmp_path, status_path)
+
+def new_status(job_id: str) -> Dict[str, Any]:
+    return {
+        "job_id": job_id, "state": "queued", "created_at": _now(), "started_at": None,
+        "finished_at": None, "error": None, "generation": None, "stages": [],
+    }
+
+class JobProgress:
+    """
+    Registra el avance de una ejecución de la ETL. Sin `status_path` (ejecución
+    desde la línea de comandos) no escribe nada.
+    """
+
+    def __init__(self, status_path: Optional[Path] = None):
+        self.status_path = status_path
+        self.status = (read_status(status_path) if status_path else None) or new_status(job_id=None)
+
+    def _save(self):
+        if self.status_path is not None:
+            write_status(self.status_path, self.status)
+
+    def start(self):
+        self.status.update(state="running", started_at=_now(), error=None)
+        self._save()
+
+    def finish(self, generation: int):
+        self.status.update(state="succeeded", finished_at=_now(), generation=generation)
+        self._save()
+
+    def fail(self, error: BaseException):
+        for stage in self.status["stages"]:
+            if stage["state"] == "running":
+                stage["state"] = "failed"
+        self.status.update(state="failed", finished_at=_now(), error=f"{type(error).__name__}: {error}")
+        self._save()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Dict[str, Any]]:
+        """
+        Marca una etapa como en curso y, al salir, registra su duración. El
+        diccionario entregado permite anotar la cantidad de filas (`rows`).
+        """
+        stage = {"name": name, "state": "running", "started_at": _now(), "duration_seconds": None, "rows": None}
+        self.status["stages"].append(stage)
+        self._save()
+        started = time.perf_counter()
+        try:
+            yield stage
+        except BaseException:
+            stage.update(state="failed", duration_seconds=round(time.perf_counter() - started, 3))
+            self._save()
+            raise
+        stage.update(state="succeeded", duration_seconds=round(time.perf_counter() - started, 3))
+        self._save()
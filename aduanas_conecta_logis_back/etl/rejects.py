@@ -0,0 +1,205 @@
+
+import mmap
+import re
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import duckdb
+import numpy as np
+import pandas as pd
+from prefect import task, get_run_logger
+from .instrumentation import instrumented
+
+# Registros rechazados de la ETL. Se guardan en la tabla `rejected_records` de
+# la bodega, una fila por registro con su fuente, la ejecución que lo rechazó,
+# el motivo, el archivo y la línea de origen, y sus valores originales en JSON,
+# de modo que se pueden consultar y volver a procesar una vez corregidos
+# (ver `replay.py`).
+
+REJECTS_TABLE = "rejected_records"
+
+# Motivos de rechazo. Si un registro tiene el ID y la fecha inválidos se
+# informa el ID.
+MALFORMED_LINE = "malformed_line"
+BAD_NUMEROIDENT = "bad_numeroident"
+BAD_DATE = "bad_date"
+
+PENDING = "pending"
+REPLAYED = "replayed"
+
+# Columnas de linaje que la extracción agrega a cada registro: el archivo de
+# origen y la posición del registro entre los registros leídos del archivo
+# (1, 2, ...). Las líneas mal formadas que el lector descarta llegan como
+# registros sin datos, con el texto de la línea en `linea_cruda` y su número
+# de línea en `registro_origen`.
+SOURCE_FILE_COLUMN = "archivo_origen"
+RECORD_COLUMN = "registro_origen"
+RAW_LINE_COLUMN = "linea_cruda"
+LINEAGE_COLUMNS = [SOURCE_FILE_COLUMN, RECORD_COLUMN, RAW_LINE_COLUMN]
+REASON_COLUMN = "motivo_rechazo"
+
+_SKIPPED_LINE = re.compile(r"Skipping line (\d+)")
+
+def add_lineage(df: pd.DataFrame, file_path: Path, file_paths: List[Path], first_record: int = 1) -> pd.DataFrame:
+    """
+    Agrega las columnas de linaje a los registros leídos de `file_path`. El
+    archivo se guarda como categoría con todos los archivos de la fuente, para
+    que la concatenación de varios archivos conserve el tipo.
+    """
+    categories = [str(f) for f in file_paths]
+    df[SOURCE_FILE_COLUMN] = pd.Categorical.from_codes(
+        np.full(len(df), categories.index(str(file_path)), dtype="int32"), categories=categories
+    )
+    df[RECORD_COLUMN] = np.arange(first_record, first_record + len(df), dtype="int64")
+    return df
+
+def skipped_lines(caught: Iterable[warnings.WarningMessage]) -> List[int]:
+    """Números de las líneas que pandas descartó con `on_bad_lines='warn'`, según sus advertencias."""
+    return [int(n) for w in caught if issubclass(w.category, pd.errors.ParserWarning) for n in _SKIPPED_LINE.findall(str(w.message))]
+
+def read_lines(file_path: Path, line_numbers: Iterable[int], encoding: str = "latin-1") -> Dict[int, str]:
+    """Texto de las líneas indicadas (numeradas desde 1), sin el salto de línea."""
+    wanted, lines = set(line_numbers), {}
+    if not wanted:
+        return lines
+    with open(file_path, encoding=encoding, newline="") as f:
+        for number, line in enumerate(f, start=1):
+            if number in wanted:
+                lines[number] = line.rstrip("\r\n")
+                if len(lines) == len(wanted):
+                    break
+    return lines
+
+def malformed_records(file_path: Path, line_numbers: List[int], file_paths: List[Path], columns: List[str]) -> pd.DataFrame:
+    """Registros sin datos que representan las líneas mal formadas de un archivo."""
+    texts = read_lines(file_path, line_numbers)
+    df = pd.DataFrame({col: pd.Series([None] * len(line_numbers), dtype=object) for col in columns})
+    df = add_lineage(df, file_path, file_paths)
+    df[RECORD_COLUMN] = np.asarray(line_numbers, dtype="int64")
+    df[RAW_LINE_COLUMN] = [texts.get(n) for n in line_numbers]
+    return df
+
+def blank_lines(file_path: Path) -> List[int]:
+    """Números de las líneas vacías del archivo, que los lectores CSV saltan sin contarlas como registros."""
+    if not file_path.exists() or file_path.stat().st_size == 0:
+        return []
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        starts = [0] if data[:1] == b"\n" or data[:2] == b"\r\n" else []
+        for pattern in (b"\n\n", b"\n\r\n"):
+            position = data.find(pattern)
+            while position != -1:
+                starts.append(position + 1)
+                position = data.find(pattern, position + 1)
+        numbers, line, previous = [], 1, 0
+        for start in sorted(starts):
+            line += data[previous:start].count(b"\n")
+            previous = start
+            numbers.append(line)
+    return numbers
+
+def records_to_lines(records: np.ndarray, skipped: List[int]) -> np.ndarray:
+    """
+    Convierte posiciones de registros (1, 2, ...) en números de línea del
+    archivo, sabiendo qué líneas saltó el lector (vacías o mal formadas).
+    """
+    if not skipped:
+        return records
+    skipped = np.unique(np.asarray(skipped, dtype="int64"))
+    # Registros leídos antes de cada línea saltada.
+    records_before = skipped - np.arange(1, len(skipped) + 1)
+    return records + np.searchsorted(records_before, records, side="left")
+
+def record_json(df: pd.DataFrame) -> List[str]:
+    """Valores de cada registro como objeto JSON, con las columnas leídas de la fuente."""
+    data_cols = [c for c in df.columns if c not in LINEAGE_COLUMNS and c != REASON_COLUMN]
+    if df.empty:
+        return []
+    return df[data_cols].to_json(orient="records", lines=True, force_ascii=False).splitlines()
+
+def _reject_rows(df: pd.DataFrame, source_name: str, run_id: Optional[str]) -> pd.DataFrame:
+    """Filas de la tabla de rechazos, con el número de línea de cada registro en su archivo."""
+    files = df[SOURCE_FILE_COLUMN].astype(str).to_numpy()
+    positions = df[RECORD_COLUMN].to_numpy(dtype="int64")
+    raw_lines = df[RAW_LINE_COLUMN].to_numpy(dtype=object) if RAW_LINE_COLUMN in df else np.full(len(df), None, dtype=object)
+    malformed = pd.notna(raw_lines)
+
+    lines = positions.copy()
+    for file_path in np.unique(files[~malformed]):
+        in_file = files == file_path
+        skipped = blank_lines(Path(file_path)) + positions[in_file & malformed].tolist()
+        rows = in_file & ~malformed
+        lines[rows] = records_to_lines(positions[rows], skipped)
+
+    return pd.DataFrame({
+        "reject_id": [f"{Path(f).name}:{n}" for f, n in zip(files, lines)],
+        "run_id": run_id,
+        "source": source_name,
+        "reason": df[REASON_COLUMN].astype(str).to_numpy(),
+        "source_file": files,
+        "line_number": lines,
+        # Las líneas mal formadas no tienen valores: sólo su texto en `raw_line`.
+        "record": np.where(malformed, None, np.asarray(record_json(df), dtype=object)),
+        "raw_line": raw_lines,
+        "rejected_at": datetime.now(),
+        "status": PENDING,
+    })
+
+def ensure_rejects_table(con: duckdb.DuckDBPyConnection):
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {REJECTS_TABLE} (
+            reject_id VARCHAR,
+            run_id VARCHAR,
+            source VARCHAR,
+            reason VARCHAR,
+            source_file VARCHAR,
+            line_number BIGINT,
+            record JSON,
+            raw_line VARCHAR,
+            rejected_at TIMESTAMP,
+            status VARCHAR,
+            replayed_at TIMESTAMP,
+            replay_run_id VARCHAR
+        )
+    """)
+
+@task(name="Clear Rejected Records")
+def clear_rejected_records(db_path: Path, source_name: str, files: Optional[List[Path]] = None):
+    """
+    Elimina los rechazos de una fuente antes de volver a leerla: todos en una
+    carga completa, o sólo los de los archivos indicados en una incremental.
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    with duckdb.connect(database=str(db_path), read_only=False) as con:
+        ensure_rejects_table(con)
+        if files is None:
+            con.execute(f"DELETE FROM {REJECTS_TABLE} WHERE source = ?", [source_name])
+        elif files:
+            con.execute(
+                f"DELETE FROM {REJECTS_TABLE} WHERE source = ? AND list_contains(?, source_file)",
+                [source_name, [str(f) for f in files]]
+            )
+
+@task(name="Save Rejected Records to DuckDB")
+@instrumented("save_rejected")
+def save_rejected_records(df: pd.DataFrame, db_path: Path, source_name: str, run_id: Optional[str] = None):
+    """
+    Guarda los registros rechazados de una fuente en la tabla `rejected_records`.
+    `df` trae las columnas leídas como texto, las de linaje y `motivo_rechazo`.
+    """
+    logger = get_run_logger()
+    if df.empty:
+        logger.info(f"No se encontraron registros rechazados para la fuente '{source_name}'.")
+        return
+
+    logger.info(f"Guardando {len(df)} filas rechazadas de '{source_name}' en la tabla '{REJECTS_TABLE}'...")
+    try:
+        rows = _reject_rows(df, source_name, run_id)
+        with duckdb.connect(database=str(db_path), read_only=False) as con:
+            ensure_rejects_table(con)
+            con.register("incoming_rejects", rows)
+            con.execute(f"INSERT INTO {REJECTS_TABLE} BY NAME SELECT * FROM incoming_rejects ORDER BY reason, source_file, line_number")
+        logger.info("Registros rechazados guardados exitosamente.")
+    except Exception as e:
+        logger.error(f"Error al guardar los registros rechazados: {e}")
+        raise
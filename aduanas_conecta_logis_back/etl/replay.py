@@ -0,0 +1,205 @@
+
+import argparse
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import List
+import duckdb
+import pandas as pd
+from prefect import flow, task, get_run_logger
+from .config import (
+    DATA_SOURCES, DB_PATH, STAGING_DB_PATH, TABLE_NAMES, LAKE_EXPORT, LAKE_DIR, LAKE_COMPRESSION, LAKE_ROW_GROUP_SIZE
+)
+from .transform import clean_and_transform_split, NUMERIC_COLUMNS
+from .load import downcast_integral_columns, frame_select_sql, insert_rows
+from .analyze import generate_quality_report, print_report_and_recommendations
+from .modeling import create_analytical_models
+from .generation import build_lock, prepare_build, publish_build, discard_build, read_generation
+from .lake import export_lake_snapshot, publish_lake_snapshot, discard_lake_snapshot
+from .instrumentation import instrumented, start_run_metrics, stop_run_metrics, save_run_metrics
+from .rejects import REJECTS_TABLE, PENDING, REPLAYED, REASON_COLUMN, record_json
+
+# Reproceso de registros rechazados ya corregidos, sin volver a ejecutar la ETL
+# completa. `export` escribe los rechazos pendientes de una fuente en un CSV
+# editable (una columna por campo leído, más `reject_id`); `replay` lee ese CSV
+# corregido, cura sólo esos registros con las mismas reglas de la ETL, inserta
+# los válidos y recalcula modelos y perfil de calidad de las particiones
+# tocadas. Como la ETL, trabaja sobre una copia de la bodega que se publica al
+# terminar, así que no debe ejecutarse a la vez que un trabajo de ETL.
+#
+#   python -m aduanas_conecta_logis_back.etl.replay export exportaciones correcciones.csv
+#   python -m aduanas_conecta_logis_back.etl.replay replay exportaciones correcciones.csv
+#
+# Al volver a leer un archivo de origen sus rechazos se regeneran como
+# pendientes: las correcciones deben llevarse también a la fuente.
+
+def export_pending_rejects(source_name: str, output_path: Path, db_path: Path = DB_PATH) -> int:
+    """
+    Escribe los rechazos pendientes de una fuente en un CSV con el separador y
+    la codificación de la fuente. Las líneas mal formadas se separan en campos
+    según `cols_map`. Devuelve la cantidad de registros exportados.
+    """
+    source_config = DATA_SOURCES[source_name]
+    cols_map = source_config["cols_map"]
+    with duckdb.connect(database=str(db_path), read_only=True) as con:
+        rows = con.execute(f"""
+            SELECT reject_id, CAST(record AS VARCHAR), raw_line
+            FROM {REJECTS_TABLE}
+            WHERE source = ? AND status = ?
+            ORDER BY source_file, line_number
+        """, [source_name, PENDING]).fetchall()
+
+    records = []
+    for reject_id, record, raw_line in rows:
+        if record is not None:
+            values = json.loads(record)
+        else:
+            fields = raw_line.split(source_config["separator"])
+            values = {name: fields[pos] if pos < len(fields) else None for name, pos in cols_map.items()}
+        records.append({"reject_id": reject_id, **{name: values.get(name) for name in cols_map}})
+    df = pd.DataFrame(records, columns=["reject_id", *cols_map])
+    df.to_csv(output_path, sep=source_config["separator"], index=False, encoding="latin-1")
+    return len(df)
+
+def read_corrections(source_name: str, corrections_path: Path) -> pd.DataFrame:
+    """Lee el CSV corregido con el separador y la codificación de la fuente, todo como texto."""
+    return pd.read_csv(corrections_path, sep=DATA_SOURCES[source_name]["separator"], dtype=str, encoding="latin-1")
+
+@task(name="Replay Corrected Rejects")
+@instrumented("replay")
+def replay_rejected_records(db_path: Path, source_name: str, corrections: pd.DataFrame, run_id: str) -> List[int]:
+    """
+    Cura los registros corregidos de una fuente e inserta los válidos en su
+    tabla. Los rechazos reprocesados quedan como 'replayed'; los que siguen
+    siendo inválidos quedan pendientes con sus nuevos valores y motivo.
+    Devuelve las particiones (AAAAMM) que recibieron registros.
+    """
+    logger = get_run_logger()
+    source_config = DATA_SOURCES[source_name]
+    table_name = TABLE_NAMES[source_name]
+    data_cols = list(source_config["cols_map"])
+    missing = {"reject_id", *data_cols} - set(corrections.columns)
+    if missing:
+        raise ValueError(f"Faltan columnas en el archivo de correcciones: {', '.join(sorted(missing))}.")
+
+    con = duckdb.connect(database=str(db_path), read_only=False)
+    try:
+        pending = {row[0] for row in con.execute(
+            f"SELECT reject_id FROM {REJECTS_TABLE} WHERE source = ? AND status = ? AND list_contains(?, reject_id)",
+            [source_name, PENDING, corrections["reject_id"].dropna().unique().tolist()]
+        ).fetchall()}
+        ignored = corrections["reject_id"].nunique() - len(pending)
+        if ignored:
+            logger.warning(f"{ignored} registro(s) del archivo no son rechazos pendientes de '{source_name}'. Se ignoran.")
+        corrections = corrections[corrections["reject_id"].isin(pending)].drop_duplicates("reject_id", keep="last")
+        if corrections.empty:
+            logger.info("No hay registros corregidos para reprocesar.")
+            return []
+
+        reject_ids = corrections["reject_id"].to_numpy()
+        df_good, df_rejected = clean_and_transform_split.fn(
+            df=corrections[data_cols].reset_index(drop=True),
+            decimal_separator=source_config["decimal_separator"],
+            downcast_integers=False
+        )
+        still_rejected = pd.DataFrame({
+            "reject_id": reject_ids[df_rejected.index],
+            "reason": df_rejected[REASON_COLUMN].to_numpy(),
+            "record": record_json(df_rejected),
+        })
+        replayed = sorted(set(reject_ids) - set(still_rejected["reject_id"]))
+        partitions = sorted(set((df_good["año"] * 100 + df_good["mes"]).tolist()))
+
+        con.execute("BEGIN TRANSACTION")
+        if not df_good.empty:
+            con.register("incoming", df_good)
+            insert_rows(con, table_name, frame_select_sql(df_good), integer_candidates=NUMERIC_COLUMNS)
+            downcast_integral_columns(con, table_name, NUMERIC_COLUMNS)
+        con.execute(f"""
+            UPDATE {REJECTS_TABLE} SET status = ?, replayed_at = ?, replay_run_id = ?
+            WHERE source = ? AND list_contains(?, reject_id)
+        """, [REPLAYED, datetime.now(), run_id, source_name, replayed])
+        if not still_rejected.empty:
+            con.register("still_rejected", still_rejected)
+            con.execute(f"""
+                UPDATE {REJECTS_TABLE} SET reason = still_rejected.reason, record = still_rejected.record
+                FROM still_rejected
+                WHERE {REJECTS_TABLE}.source = ? AND {REJECTS_TABLE}.reject_id = still_rejected.reject_id
+            """, [source_name])
+        con.execute("COMMIT")
+    except Exception as e:
+        logger.error(f"Error al reprocesar los rechazos de '{source_name}': {e}", exc_info=True)
+        raise
+    finally:
+        con.close()
+
+    logger.info(
+        f"Reproceso de '{source_name}': {len(replayed)} registro(s) cargados en '{table_name}', "
+        f"{len(still_rejected)} siguen rechazados. Particiones tocadas: {partitions}."
+    )
+    return partitions
+
+@flow(name="Replay Rejected Records")
+def replay_rejected_flow(source_name: str, corrections_path: str, export_lake: bool = LAKE_EXPORT):
+    """
+    Reprocesa los rechazos corregidos en `corrections_path` (un CSV generado con
+    `export_pending_rejects`) y publica una nueva versión de la bodega con los
+    registros recuperados y los modelos de sus particiones actualizados. Con
+    `export_lake=True` también se actualizan esas particiones en la copia en
+    Parquet.
+    """
+    logger = get_run_logger()
+    if source_name not in DATA_SOURCES:
+        raise ValueError(f"Fuente desconocida: '{source_name}'. Opciones: {', '.join(DATA_SOURCES)}.")
+    corrections = read_corrections(source_name, Path(corrections_path))
+    logger.info(f"Reprocesando {len(corrections)} registro(s) corregidos de '{source_name}'...")
+
+    run_metrics = start_run_metrics(engine="replay", incremental=True)
+    lake_snapshot = None
+    with build_lock(on_wait=lambda: logger.info("Otra ejecución de la ETL está construyendo la bodega; esperando a que termine...")):
+        try:
+            base_generation = read_generation()
+            build_path = prepare_build(DB_PATH, STAGING_DB_PATH)
+            partitions = replay_rejected_records(
+                db_path=build_path, source_name=source_name, corrections=corrections, run_id=run_metrics.run_id
+            )
+            if partitions:
+                modeling_task = create_analytical_models(db_path=build_path, partitions=partitions)
+                report = generate_quality_report(db_path=build_path, partitions=partitions, wait_for=[modeling_task])
+                print_report_and_recommendations(report)
+            if export_lake:
+                lake_snapshot = export_lake_snapshot(
+                    db_path=build_path, lake_dir=LAKE_DIR, snapshot_id=run_metrics.run_id,
+                    base_generation=base_generation, partitions=partitions,
+                    compression=LAKE_COMPRESSION, row_group_size=LAKE_ROW_GROUP_SIZE
+                )
+
+            run_metrics.finish()
+            save_run_metrics(build_path, run_metrics)
+            generation = publish_build(build_path, DB_PATH)
+            if lake_snapshot is not None:
+                publish_lake_snapshot(LAKE_DIR, lake_snapshot["snapshot"], generation)
+            logger.info(f"Bodega publicada en '{DB_PATH}' (generación {generation}).")
+        except Exception as e:
+            discard_build(STAGING_DB_PATH)
+            if lake_snapshot is not None:
+                discard_lake_snapshot(LAKE_DIR, lake_snapshot["snapshot"])
+            logger.error(f"El reproceso de rechazos falló con un error: {e}", exc_info=True)
+            raise
+        finally:
+            stop_run_metrics()
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta y reprocesa registros rechazados por la ETL.")
+    parser.add_argument("command", choices=["export", "replay"], help="'export' escribe los rechazos pendientes; 'replay' reprocesa los corregidos.")
+    parser.add_argument("source", choices=list(DATA_SOURCES), help="Fuente de los registros.")
+    parser.add_argument("path", type=Path, help="Archivo CSV de rechazos a corregir o ya corregidos.")
+    args = parser.parse_args()
+    if args.command == "export":
+        count = export_pending_rejects(args.source, args.path)
+        print(f"{count} rechazo(s) pendientes de '{args.source}' exportados a {args.path}.")
+    else:
+        replay_rejected_flow(source_name=args.source, corrections_path=str(args.path))
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,193 @@
+import numpy as np
 import pandas as pd
 from prefect import task, get_run_logger
-from typing import Tuple
+from typing import Callable, List, Optional, Tuple
+from .instrumentation import instrumented
+from .rejects import LINEAGE_COLUMNS, RAW_LINE_COLUMN, REASON_COLUMN, MALFORMED_LINE, BAD_NUMEROIDENT, BAD_DATE
+
+# Columnas que se convierten a número en los registros válidos.
+NUMERIC_COLUMNS = ['FOBUNITARIO', 'PESOBRUTOTOTAL', 'PESOBRUTOITEM', 'CANTIDADBULTO', 'NRO_EXPORTADOR', 'CODIGOARANCEL']
+
+# Tipos compactos para los registros válidos cuando se convierten a entero:
+# CANTIDADBULTO cabe en int32 y CODIGOARANCEL repite pocos códigos distintos.
+# Los cargadores los amplían a BIGINT al escribir en DuckDB.
+INT32_COLUMNS = ['CANTIDADBULTO']
+CATEGORY_COLUMNS = ['CODIGOARANCEL']
+
+def row_keys(df: pd.DataFrame) -> np.ndarray:
+    """
+    Hash de 64 bits de los datos de cada registro, sin las columnas de linaje.
+    Las líneas mal formadas no traen datos: se distinguen por su texto.
+    """
+    data_cols = [col for col in df.columns if col not in LINEAGE_COLUMNS]
+    keys = pd.util.hash_pandas_object(df[data_cols], index=False).to_numpy()
+    if RAW_LINE_COLUMN in df.columns:
+        malformed = df[RAW_LINE_COLUMN].notna().to_numpy()
+        if malformed.any():
+            keys[malformed] = pd.util.hash_pandas_object(df[RAW_LINE_COLUMN][malformed], index=False).to_numpy()
+    return keys
+
+class SeenRows:
+    """
+    Claves (ver `row_keys`) de los registros ya vistos en los bloques o archivos
+    anteriores de una fuente, para eliminar también los duplicados que caen en
+    bloques distintos. Se guardan en unos pocos arreglos ordenados, de tamaños
+    decrecientes, que se fusionan al crecer: 8 bytes por registro distinto y
+    una búsqueda binaria por arreglo.
+    """
+
+    def __init__(self):
+        self._levels: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return sum(len(level) for level in self._levels)
+
+    def _contains(self, keys: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(keys), dtype=bool)
+        for level in self._levels:
+            positions = np.minimum(np.searchsorted(level, keys), len(level) - 1)
+            found |= level[positions] == keys
+        return found
+
+    def keep_new(self, keys: np.ndarray) -> np.ndarray:
+        """Máscara de las claves que no se habían visto antes; las registra como vistas."""
+        new = ~self._contains(keys)
+        level = np.unique(keys[new])
+        if len(level):
+            self._levels.append(level)
+            while len(self._levels) > 1 and len(self._levels[-2]) < 2 * len(self._levels[-1]):
+                last = self._levels.pop()
+                self._levels[-1] = np.union1d(self._levels[-1], last)
+        return new
+
+def _map_unique(series: pd.Series, convert: Callable[[pd.Series], pd.Series]) -> pd.Series:
+    """
+    Aplica `convert` sólo a los valores distintos de la columna y expande el
+    resultado a todas las filas. Fechas, códigos y cantidades se repiten mucho,
+    así que se limpian y convierten unas pocas veces en lugar de una por fila.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    converted = convert(pd.Series(uniques, dtype=object))
+    return pd.Series(converted.array.take(codes), index=series.index, name=series.name)
+
+def _strip(values: pd.Series) -> pd.Series:
+    return values.str.strip()
+
+def _parse_dates(values: pd.Series) -> pd.Series:
+    """Fechas DDMMAAAA; los valores de 7 dígitos traen el día sin el cero inicial."""
+    return pd.to_datetime(values.str.strip().str.zfill(8), format='%d%m%Y', errors='coerce')
+
+def _numeric_parser(decimal_separator: str) -> Callable[[pd.Series], pd.Series]:
+    def parse(values: pd.Series) -> pd.Series:
+        values = values.str.strip()
+        if decimal_separator != ".":
+            values = values.str.replace(decimal_separator, ".", regex=False)
+        return pd.to_numeric(values, errors='coerce')
+    return parse
+
+def _parse_ids(values: pd.Series) -> pd.Series:
+    """
+    Convierte NUMEROIDENT a número. `to_numeric` ya ignora los espacios ASCII
+    alrededor del valor, así que sólo se vuelven a intentar, tras `strip`, las
+    filas que fallan (por ejemplo, por espacios no ASCII).
+    """
+    ids = pd.to_numeric(values, errors='coerce')
+    retry = ids.isna() & values.notna()
+    if retry.any():
+        ids = ids.astype('float64')
+        ids[retry] = pd.to_numeric(values[retry].str.strip(), errors='coerce')
+    return ids
+
+def _compact_integer(values: pd.Series, col: str) -> pd.Series:
+    """Convierte a entero una columna numérica sin decimales, con el tipo más compacto que le corresponde."""
+    if values.dtype.kind == 'f':
+        if not np.array_equal(values.to_numpy(), np.trunc(values.to_numpy())):
+            return values
+        values = values.astype('int64')
+    if col in INT32_COLUMNS and values.between(np.iinfo('int32').min, np.iinfo('int32').max).all():
+        return values.astype('int32')
+    if col in CATEGORY_COLUMNS:
+        return values.astype('category')
+    return values
 
 @task(name="Clean, Validate, and Split Data")
-def clean_and_transform_split(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+@instrumented("transform")
+def clean_and_transform_split(
+    df: pd.DataFrame,
+    decimal_separator: str = ".",
+    downcast_integers: bool = True,
+    seen_rows: Optional[SeenRows] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
     Aplica curación de datos y luego divide el DataFrame en dos:
     uno con los registros válidos y otro con los registros rechazados.
+
+    `decimal_separator` es el separador decimal de la fuente; los valores se
+    leen como texto, por lo que se normaliza antes de convertirlos a número.
+    Con `downcast_integers=False` las columnas numéricas se mantienen como
+    float, para que todos los bloques del modo streaming compartan el mismo
+    esquema (la conversión a entero se hace al final, en DuckDB).
+
+    Cada columna se recorre una sola vez: la limpieza y la conversión se hacen
+    sobre sus valores distintos, y las columnas no críticas sólo se procesan
+    para las filas válidas.
+
+    Las columnas de linaje de la extracción (archivo y registro de origen) no
+    cuentan para los duplicados ni pasan a los registros válidos; los rechazados
+    las conservan junto al motivo del rechazo en `motivo_rechazo`. Con
+    `seen_rows`, compartido entre los bloques de una misma fuente, se descartan
+    además los registros que ya aparecieron en un bloque anterior.
     """
     logger = get_run_logger()
     logger.info(f"Iniciando curación y validación. Filas iniciales: {len(df)}")
-    
-    # 1. Limpieza Básica
-    # Eliminamos duplicados primero sobre el dataframe original
-    df.drop_duplicates(inplace=True)
-    # Limpiar espacios en blanco en todas las columnas
-    df_clean = df.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
-
-    # 2. Conversión de Tipos con Manejo de Errores
-    # Guardamos los resultados de la conversión en nuevas columnas temporales
-    if "FECHAACEPT" in df_clean.columns:
-        df_clean["FECHAACEPT_norm"] = df_clean["FECHAACEPT"].str.zfill(8)
-        df_clean["FECHAACEPT_clean"] = pd.to_datetime(df_clean["FECHAACEPT_norm"], format='%d%m%Y', errors='coerce')
-
-    if "NUMEROIDENT" in df_clean.columns:
-        df_clean["NUMEROIDENT_clean"] = pd.to_numeric(df_clean["NUMEROIDENT"], errors='coerce')
-
-    # 3. Identificar las Filas Malas
-    # Una fila es mala si su ID o su Fecha no se pudieron convertir (son Nulos)
-    bad_rows_mask = df_clean["NUMEROIDENT_clean"].isnull() | df_clean["FECHAACEPT_clean"].isnull()
-    
-    # 4. Separar los dataframes usando la máscara.
-    # Ahora los índices coinciden perfectamente.
-    df_rejected = df[bad_rows_mask]
-    df_good = df_clean[~bad_rows_mask].copy()
 
+    # 1. Eliminar duplicados (sin modificar el DataFrame recibido). Las líneas
+    # mal formadas no traen datos: se distinguen por su texto.
+    data_cols = [col for col in df.columns if col not in LINEAGE_COLUMNS]
+    has_raw_lines = RAW_LINE_COLUMN in df.columns
+    df = df.drop_duplicates(subset=data_cols + ([RAW_LINE_COLUMN] if has_raw_lines else []))
+    if seen_rows is not None:
+        df = df[seen_rows.keep_new(row_keys(df))]
+
+    # 2. Validar las columnas críticas: una fila es mala si su ID o su fecha no se pudieron convertir
+    fechas = _map_unique(df["FECHAACEPT"], _parse_dates)
+    ids = _parse_ids(df["NUMEROIDENT"])
+    bad_ids = ids.isna().to_numpy()
+    bad_rows_mask = bad_ids | fechas.isna().to_numpy()
+
+    df_rejected = df[bad_rows_mask]
+    reasons = np.where(bad_ids[bad_rows_mask], BAD_NUMEROIDENT, BAD_DATE)
+    if has_raw_lines:
+        reasons = np.where(df_rejected[RAW_LINE_COLUMN].notna().to_numpy(), MALFORMED_LINE, reasons)
+    df_rejected = df_rejected.assign(**{REASON_COLUMN: reasons})
+    good = ~bad_rows_mask
     logger.info(f"{len(df_rejected)} filas fueron rechazadas por datos críticos inválidos.")
-    
-    # 5. Limpieza final solo para los datos buenos
-    df_good["NUMEROIDENT"] = df_good["NUMEROIDENT_clean"].astype(int)
-    df_good["FECHAACEPT"] = df_good["FECHAACEPT_clean"]
-
-    numeric_cols = ['FOBUNITARIO', 'PESOBRUTOTOTAL', 'PESOBRUTOITEM', 'CANTIDADBULTO', 'NRO_EXPORTADOR', 'CODIGOARANCEL']
-    for col in numeric_cols:
-        if col in df_good.columns:
-            df_good[col] = pd.to_numeric(df_good[col], errors='coerce').fillna(0)
-            if df_good[col].dtype == 'float64' and (df_good[col] % 1 == 0).all():
-                df_good[col] = df_good[col].astype(int)
-
-    # 6. Enriquecimiento y selección final de columnas
-    df_good['hora_lectura_archivo'] = pd.Timestamp.now()
+
+    # 3. Construir los registros válidos columna por columna
+    parse_number = _numeric_parser(decimal_separator)
+    columns = {}
+    for col in data_cols:
+        if col == "FECHAACEPT":
+            columns[col] = fechas[good]
+        elif col == "NUMEROIDENT":
+            columns[col] = ids[good].astype('int64')
+        elif col in NUMERIC_COLUMNS:
+            values = _map_unique(df[col][good], parse_number).fillna(0)
+            if not downcast_integers:
+                columns[col] = values.astype('float64')
+            else:
+                columns[col] = _compact_integer(values, col)
+        else:
+            columns[col] = _map_unique(df[col][good], _strip)
+    df_good = pd.DataFrame(columns)
+
+    # 4. Enriquecimiento
+    now = pd.Timestamp.now()
+    df_good['hora_lectura_archivo'] = now
     df_good['año'] = df_good['FECHAACEPT'].dt.year
     df_good['mes'] = df_good['FECHAACEPT'].dt.month
-    df_good['hora_procesamiento'] = pd.Timestamp.now()
-    
-    # Nos quedamos solo con las columnas originales y las de enriquecimiento
-    final_good_columns = list(df.columns) + ['hora_lectura_archivo', 'año', 'mes', 'hora_procesamiento']
-    df_good = df_good[final_good_columns]
+    df_good['hora_procesamiento'] = now
 
     logger.info(f"Curación completada. Filas válidas: {len(df_good)}. Filas rechazadas: {len(df_rejected)}.")
-    
-    return df_good, df_rejected
\ No newline at end of file
+
+    return df_good, df_rejected
@@ -0,0 +1,123 @@
+"""
+Generador reproducible de archivos sintéticos de Aduanas con el formato real:
+separador `;`, codificación latin-1, decimales con coma en exportaciones,
+campos de texto rellenados con espacios y una tasa configurable de fechas e
+identificadores inválidos.
+
+Los nombres siguen el patrón de los archivos reales (`bultosMarzo2025.txt`,
+`exportacionesMarzo2025.txt`), de modo que la ETL los encuentra apuntando
+`DATA_FOLDER` al directorio generado. Con `scale=1` cada mes tiene el volumen
+de los archivos de bultos incluidos en `data/`.
+
+Uso, desde la raíz del proyecto:
+
+    python -m benchmarks.generator DIRECTORIO [--scale 10] [--seed 42] [--malformed-rate 0.002]
+"""
+import argparse
+import calendar
+import random
+from pathlib import Path
+from typing import Dict, List
+
+# Meses que espera `DATA_SOURCES` en config.py.
+MONTHS = {3: "Marzo", 4: "Abril"}
+YEAR = 2025
+
+# Declaraciones por mes con scale=1 (~47.000 líneas de bultos, como los archivos de muestra).
+DECLARATIONS_PER_MONTH = 20_000
+EXPORTACIONES_FIELDS = 68
+
+_TIPOS_BULTO = [76, 74, 80, 40, 22, 85, 13, 17]
+_MARCAS = ["", "", "", "AQUACHILE", "ERRAZURIZ OVALLE", "ROTUL.", "TOYOTA", "S/M", "SIN MARCA", "CAJAS DE CARTON"]
+_ARANCELES = [8061000, 3021400, 22042110, 74031100, 28012000, 8104000, 3044100, 47032100, 26030000, 8092900]
+_EXPORTADORES = [f"EXPORTADORA {name}" for name in ("ANDES", "PACIFICO", "DEL SUR", "AUSTRAL", "FRUTICOLA", "MINERA")]
+
+def _fecha(rng: random.Random, day: int, month: int) -> str:
+    """Fecha DDMMAAAA; algunas sin el cero inicial del día, como en los archivos reales."""
+    fecha = f"{day:02d}{month:02d}{YEAR}"
+    return fecha.lstrip("0") if day < 10 and rng.random() < 0.1 else fecha
+
+def _malformed_fecha(rng: random.Random) -> str:
+    return rng.choice(["99999999", "", "31022025", "00000000", "ABCDEFGH"])
+
+def _malformed_id(rng: random.Random) -> str:
+    return rng.choice(["", "ABC123", "N/A", "   "])
+
+def _decimal(value: float, digits: int) -> str:
+    return f"{value:.{digits}f}".replace(".", ",")
+
+def _declarations(rng: random.Random, month: int, count: int, malformed_rate: float) -> List[Dict[str, str]]:
+    """Identificador y fecha de cada declaración del mes, compartidos por bultos y exportaciones."""
+    days = calendar.monthrange(YEAR, month)[1]
+    first_id = 12_000_000 + month * 1_000_000
+    declarations = []
+    for offset in range(count):
+        malformed = rng.random() < malformed_rate
+        declarations.append({
+            "id": _malformed_id(rng) if malformed and rng.random() < 0.5 else str(first_id + offset),
+            "fecha": _malformed_fecha(rng) if malformed else _fecha(rng, rng.randint(1, days), month),
+            "exportador": str(rng.randint(1_000_000, 99_999_999)),
+        })
+    return declarations
+
+def write_bultos(path: Path, rng: random.Random, declarations: List[Dict[str, str]]) -> int:
+    rows = 0
+    with open(path, "w", encoding="latin-1", newline="\n") as f:
+        for declaration in declarations:
+            for seq in range(1, rng.choice((1, 1, 1, 2, 2, 3, 4)) + 1):
+                marca = rng.choice(_MARCAS).ljust(53)
+                cantidad = rng.choice((1, 1, 1, 2, 3, 10, 23, 100, 126, 500))
+                f.write(f"{declaration['id']};{declaration['fecha']};{seq};{rng.choice(_TIPOS_BULTO)};{cantidad};{marca}\n")
+                rows += 1
+    return rows
+
+def write_exportaciones(path: Path, rng: random.Random, declarations: List[Dict[str, str]]) -> int:
+    rows = 0
+    with open(path, "w", encoding="latin-1", newline="\n") as f:
+        for declaration in declarations:
+            for item in range(1, rng.randint(1, 4) + 1):
+                row = [""] * EXPORTACIONES_FIELDS
+                row[0] = declaration["fecha"]
+                row[1] = declaration["id"]
+                row[2] = str(item)
+                row[5] = rng.choice(_EXPORTADORES).ljust(40)
+                row[10] = "SANTIAGO".ljust(20)
+                row[24] = _decimal(rng.uniform(1, 50_000), 2)
+                row[28] = declaration["exportador"]
+                row[40] = rng.choice(["CHILE", "ESTADOS UNIDOS", "CHINA", "PAÍSES BAJOS"]).ljust(30)
+                row[64] = str(rng.choice(_ARANCELES))
+                row[65] = _decimal(rng.uniform(1, 20_000), 1)
+                row[66] = _decimal(rng.uniform(0.01, 900), 3)
+                f.write(";".join(row) + "\n")
+                rows += 1
+    return rows
+
+def generate(out_dir: Path, scale: float = 1, seed: int = 42, malformed_rate: float = 0.002) -> Dict[str, int]:
+    """
+    Genera los archivos de bultos y exportaciones de cada mes en `out_dir`.
+    Devuelve la cantidad de líneas escritas por archivo. El mismo `seed`
+    produce siempre los mismos archivos.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = {}
+    for month, month_name in MONTHS.items():
+        rng = random.Random(f"{seed}-{YEAR}-{month}")
+        declarations = _declarations(rng, month, int(DECLARATIONS_PER_MONTH * scale), malformed_rate)
+        bultos = out_dir / f"bultos{month_name}{YEAR}.txt"
+        exportaciones = out_dir / f"exportaciones{month_name}{YEAR}.txt"
+        written[bultos.name] = write_bultos(bultos, rng, declarations)
+        written[exportaciones.name] = write_exportaciones(exportaciones, rng, declarations)
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir", type=Path, help="directorio donde se escriben los archivos")
+    parser.add_argument("--scale", type=float, default=1, help="volumen relativo a los archivos de muestra")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--malformed-rate", type=float, default=0.002, help="fracción de declaraciones con fecha o ID inválidos")
+    args = parser.parse_args()
+    for name, rows in generate(args.out_dir, args.scale, args.seed, args.malformed_rate).items():
+        print(f"{name}: {rows} líneas")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Prueba de carga de la API con clientes concurrentes.
+
+Levanta la API con uvicorn en un proceso aparte, sobre la bodega de
+DATA_FOLDER (o la copia en Parquet con API_STORAGE=parquet), y simula
+refrescos de un tablero: en cada ola, N clientes piden a la vez los mismos
+endpoints con el mismo rango de fechas, nuevo en cada ola para que la caché
+de respuestas esté fría. Cada ola se repite enseguida con la caché ya
+llena: la diferencia entre ambos p99 es el "p99 de consulta", la latencia
+que agregan las consultas por sobre el costo de atender N conexiones HTTP a
+la vez. Informa también cuántas consultas se ejecutaron, cuántas se unieron
+a una idéntica en curso y cuántas se rechazaron por falta de turno (según
+/metrics). Con `--distinct` cada cliente pide su propio rango: mide la
+contención y el rechazo por falta de turno cuando no hay consultas que unir.
+
+Uso, desde la raíz del proyecto y con la bodega ya construida:
+
+    python -m benchmarks.load [--concurrency 1 10 50 200] [--waves 5] [--max-p99-ratio 3]
+
+Termina con código 1 si alguna petición falla o, salvo con `--distinct`, si
+el p99 de consulta del mayor nivel de concurrencia supera `--max-p99-ratio`
+veces el del menor.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .generator import MONTHS, YEAR
+
+# Endpoints de un refresco del tablero; `{start}` y `{end}` son el rango de la ola.
+DASHBOARD = [
+    "/api/trends/fob-daily?start_date={start}&end_date={end}",
+    "/api/rankings/exporters-weekly?start_date={start}&end_date={end}&limit=100",
+    "/api/rankings/exporters-weekly/top?start_date={start}&end_date={end}&top=10",
+    "/api/stats/average-weight-per-bulto?start_date={start}&end_date={end}",
+]
+_CONTENT_LENGTH = re.compile(rb"\r\ncontent-length: *(\d+)", re.I)
+_QUERY_REQUESTS = re.compile(r'^aduanas_api_query_requests_total\{endpoint="[^"]+",result="(\w+)"\} (\S+)$', re.M)
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _get(url: str) -> str:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.read().decode()
+
+def _start_server(port: int) -> subprocess.Popen:
+    """Levanta la API y espera a que responda."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "aduanas_conecta_logis_back.api.main:app",
+         "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        env={**os.environ, "PYTHONPATH": os.getcwd()}
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            _get(f"http://127.0.0.1:{port}/metrics")
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("La API no respondió en 60 segundos.")
+
+def _query_counts(base_url: str) -> Dict[str, float]:
+    """Totales de consultas ejecutadas, unidas y rechazadas, sumados sobre todos los endpoints."""
+    counts = {"executed": 0.0, "coalesced": 0.0, "rejected": 0.0}
+    for result, value in _QUERY_REQUESTS.findall(_get(f"{base_url}/metrics")):
+        counts[result] += float(value)
+    return counts
+
+def _date_ranges(rng: random.Random, count: int) -> List[Tuple[date, date]]:
+    """`count` rangos de fechas distintos dentro de los meses de los datos sintéticos."""
+    first = date(YEAR, min(MONTHS), 1)
+    last = date(YEAR, max(MONTHS) + 1, 1) - timedelta(days=1)
+    ranges = set()
+    while len(ranges) < count:
+        start = first + timedelta(days=rng.randint(0, (last - first).days))
+        ranges.add((start, min(last, start + timedelta(days=rng.randint(0, 30)))))
+    return list(ranges)
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))]
+
+class _Connection:
+    """
+    Conexión HTTP/1.1 persistente mínima sobre asyncio. Un cliente HTTP
+    completo en Python cuesta varios ms de CPU por petición y, en la misma
+    máquina, mediría más al generador de carga que a la API.
+    """
+
+    def __init__(self, port: int):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def open(self) -> "_Connection":
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        return self
+
+    async def get(self, path: str) -> int:
+        """
+        Pide `path`, lee la respuesta completa y devuelve su código de estado.
+        Si el servidor cerró la conexión inactiva (keep-alive vencido), se
+        reconecta y repite la petición, como un navegador.
+        """
+        for attempt in range(2):
+            self.writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+            try:
+                await self.writer.drain()
+                head = await self.reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                if attempt or getattr(e, "partial", b""):
+                    raise
+                self.close()
+                await self.open()
+                continue
+            await self.reader.readexactly(int(_CONTENT_LENGTH.search(head).group(1)))
+            return int(head[9:12])
+
+    def close(self):
+        self.writer.close()
+
+async def _client(connections: List[_Connection], urls: List[str], latencies: List[float], errors: Dict[int, int]):
+    """Un cliente del tablero: pide todos sus endpoints a la vez, uno por conexión, como un navegador."""
+    async def fetch(connection: _Connection, url: str):
+        started = time.perf_counter()
+        status = await connection.get(url)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if status != 200:
+            errors[status] = errors.get(status, 0) + 1
+    await asyncio.gather(*(fetch(connection, url) for connection, url in zip(connections, urls)))
+
+def _summary(latencies: List[float]) -> Dict[str, float]:
+    return {"p50_ms": round(_percentile(latencies, 0.50), 1), "p99_ms": round(_percentile(latencies, 0.99), 1)}
+
+async def _run_level(port: int, clients: int, ranges: List[Tuple[date, date]], distinct: bool) -> Dict:
+    """
+    Ejecuta las olas de un nivel de concurrencia. Cada ola se repite enseguida
+    con las mismas URL, ya en la caché: esa repetición mide el costo HTTP de
+    atender a todos los clientes a la vez, que no depende de las consultas.
+    """
+    cold, warm, errors = [], [], {}
+    connections = [[await _Connection(port).open() for _ in DASHBOARD] for _ in range(clients)]
+    started = time.perf_counter()
+    # Con `distinct` hay una sola ola con un rango por cliente; si no, una ola por rango.
+    waves = [ranges] if distinct else [[wave] * clients for wave in ranges]
+    for wave in waves:
+        for latencies in (cold, warm):
+            await asyncio.gather(*(
+                _client(client, [url.format(start=start, end=end) for url in DASHBOARD], latencies, errors)
+                for client, (start, end) in zip(connections, wave)
+            ))
+    seconds = time.perf_counter() - started
+    for client in connections:
+        for connection in client:
+            connection.close()
+    result = {"requests": len(cold) + len(warm), **_summary(cold)}
+    cached = _summary(warm)
+    result.update({
+        "cached_p50_ms": cached["p50_ms"],
+        "cached_p99_ms": cached["p99_ms"],
+        "query_p99_ms": round(max(result["p99_ms"] - cached["p99_ms"], 0.0), 1),
+        "requests_per_second": round(result["requests"] / seconds),
+        "errors": errors,
+    })
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 200], help="clientes simultáneos por nivel")
+    parser.add_argument("--waves", type=int, default=5, help="refrescos del tablero por nivel")
+    parser.add_argument("--distinct", action="store_true", help="cada cliente pide su propio rango de fechas")
+    parser.add_argument("--max-p99-ratio", type=float, default=3.0, help="p99 de consulta máximo del mayor nivel respecto del menor")
+    parser.add_argument("--output", type=Path, help="JSON donde guardar los resultados")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = _start_server(port)
+    rng = random.Random(args.seed)
+    results = {}
+    try:
+        # Calentamiento: abre la conexión a la bodega y carga el índice en memoria.
+        asyncio.run(_run_level(port, 1, _date_ranges(rng, 1), False))
+        for clients in args.concurrency:
+            before = _query_counts(base_url)
+            count = clients if args.distinct else args.waves
+            result = asyncio.run(_run_level(port, clients, _date_ranges(rng, count), args.distinct))
+            after = _query_counts(base_url)
+            result.update({name: int(after[name] - before[name]) for name in after})
+            results[clients] = result
+            print(
+                f"{clients:>5} clientes: p50 {result['p50_ms']:>7.1f} ms, p99 {result['p99_ms']:>7.1f} ms "
+                f"(en caché {result['cached_p99_ms']:>7.1f} ms, de consulta {result['query_p99_ms']:>6.1f} ms), "
+                f"{result['requests_per_second']:>5} pet/s; ejecutadas {result['executed']}, unidas {result['coalesced']}, "
+                f"rechazadas {result['rejected']}, errores {result['errors'] or 0}", flush=True
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+    failures = [f"{clients} clientes: respuestas {result['errors']}" for clients, result in results.items() if result["errors"]]
+    if args.output:
+        args.output.write_text(json.dumps({"date": datetime.now().isoformat(timespec="seconds"), "levels": results}, indent=2))
+    lowest, highest = results[min(results)], results[max(results)]
+    if not args.distinct and highest["query_p99_ms"] > args.max_p99_ratio * max(lowest["query_p99_ms"], 1.0):
+        failures.append(
+            f"el p99 de consulta con {max(results)} clientes ({highest['query_p99_ms']} ms) supera "
+            f"{args.max_p99_ratio:g} veces el de {min(results)} ({lowest['query_p99_ms']} ms)"
+        )
+    if failures:
+        print("\nFallas:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    if args.distinct:
+        print("\nSin errores.")
+    else:
+        print(f"\nSin errores y con el p99 de consulta dentro de {args.max_p99_ratio:g} veces el de {min(results)} cliente(s).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark del arranque en frío de la API.
+
+Importa `aduanas_conecta_logis_back.api.main` en intérpretes nuevos con
+`python -X importtime` y mide el tiempo de importación (mediana y máximo de
+varias repeticiones) y los paquetes que más aportan a ese tiempo. Verifica
+además que el lado de consulta de la API no cargue Prefect, pandas ni las
+tareas de la ETL, que sólo se importan en el proceso de cada trabajo de ETL.
+
+Uso, desde la raíz del proyecto:
+
+    python -m benchmarks.startup [--repeat 7] [--budget-ms 1500]
+
+Termina con código 1 si la mediana supera el presupuesto o si se importa
+algún módulo prohibido.
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+API_MODULE = "aduanas_conecta_logis_back.api.main"
+DEFAULT_BUDGET_MS = 1500
+
+# Paquetes que no deben cargarse al importar la API, y módulos de la ETL que sí
+# puede importar (configuración y nombres compartidos, sin Prefect ni pandas).
+FORBIDDEN_PACKAGES = ("prefect", "pandas")
+ALLOWED_ETL_MODULES = {"catalog", "config", "generation", "progress"}
+
+_CHILD = f"""
+import json, sys, time
+started = time.perf_counter()
+import {API_MODULE}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| *(\S+)$")
+
+def _run_once() -> Tuple[Dict, List[Tuple[int, str]]]:
+    """Importa la API en un intérprete nuevo; devuelve su medición y el tiempo acumulado de cada paquete raíz."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD], capture_output=True, text=True, check=True
+    )
+    packages = []
+    for line in process.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        # Un paquete raíz aparece una sola vez, donde se importa por primera vez.
+        if match and "." not in match.group(3):
+            packages.append((int(match.group(2)), match.group(3)))
+    return json.loads(process.stdout), packages
+
+def _violations(modules: List[str]) -> List[str]:
+    """Módulos cargados al importar la API que deberían cargarse sólo al ejecutar la ETL."""
+    found = [m for m in modules if m in FORBIDDEN_PACKAGES]
+    for module in modules:
+        parts = module.split(".")
+        if parts[:2] == ["aduanas_conecta_logis_back", "etl"] and len(parts) > 2 and parts[2] not in ALLOWED_ETL_MODULES:
+            found.append(module)
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=7, help="intérpretes nuevos a medir")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="presupuesto para la mediana (ms)")
+    parser.add_argument("--top", type=int, default=10, help="paquetes más pesados a mostrar")
+    args = parser.parse_args()
+
+    _run_once()  # Calentamiento: compila los .pyc y carga los archivos en la caché del sistema.
+    samples, packages, modules = [], [], []
+    for _ in range(args.repeat):
+        result, packages = _run_once()
+        samples.append(result["seconds"] * 1000)
+        modules = result["modules"]
+
+    median_ms = statistics.median(samples)
+    print(f"Importación de {API_MODULE}: mediana {median_ms:.0f} ms, máximo {max(samples):.0f} ms ({args.repeat} intérpretes)")
+    print("Paquetes más pesados (tiempo acumulado de importación, última repetición):")
+    for micros, name in sorted(packages, reverse=True)[:args.top]:
+        print(f"  {name:<48}{micros / 1000:>9.1f} ms")
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"la mediana ({median_ms:.0f} ms) supera el presupuesto de {args.budget_ms:.0f} ms")
+    failures.extend(f"se importó '{module}' al iniciar la API" for module in _violations(modules))
+    if failures:
+        print("\nFallas:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print(f"\nDentro del presupuesto de {args.budget_ms:.0f} ms y sin importar Prefect, pandas ni tareas de la ETL.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Suite de benchmarks de la ETL y la API sobre datos sintéticos reproducibles.
+
+Para cada volumen (1x, 10x, 100x de los archivos de muestra) genera los
+archivos con `benchmarks.generator`, mide cada etapa (extracción, curación y
+carga de cada fuente, y modelado) y la latencia de los endpoints de consulta,
+y guarda el resultado en un JSON. Cada volumen se ejecuta en un proceso
+aparte, con su propia bodega, para que la memoria de uno no afecte al otro.
+
+Por etapa se registra duración, filas por segundo y RSS máximo del proceso;
+por endpoint, latencias p50/p99 sin caché y p50 con la caché de respuestas.
+
+Uso, desde la raíz del proyecto:
+
+    python -m benchmarks.suite [--scales 1 10 100] [--output benchmarks/results.json]
+    python -m benchmarks.suite --scales 1 10 --compare benchmarks/baseline.json [--tolerance 0.25]
+
+Con `--compare` el comando termina con código 1 si alguna métrica empeora más
+que la tolerancia respecto de la línea base.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from aduanas_conecta_logis_back.etl.instrumentation import PeakRSS
+from .generator import MONTHS, YEAR, generate
+
+DEFAULT_SCALES = [1, 10, 100]
+REQUESTS_PER_ENDPOINT = 50
+
+# Endpoints medidos; `{start}` y `{end}` se reemplazan por un rango de fechas al
+# azar y `{nro}` por un exportador al azar. Los que responden desde el índice en
+# memoria no usan la caché: sus dos latencias miden la misma búsqueda.
+ENDPOINTS = {
+    "fob-daily": "/api/trends/fob-daily?start_date={start}&end_date={end}",
+    "exporters-weekly": "/api/rankings/exporters-weekly?start_date={start}&end_date={end}&limit=100",
+    "exporters-weekly-arrow": "/api/rankings/exporters-weekly?start_date={start}&end_date={end}&format=arrow&limit=10000",
+    "exporters-weekly-top": "/api/rankings/exporters-weekly/top?start_date={start}&end_date={end}&top=10",
+    "exporter-history": "/api/exporters/{nro}/history?granularity=daily&start_date={start}&end_date={end}",
+    "average-weight-per-bulto": "/api/stats/average-weight-per-bulto?start_date={start}&end_date={end}",
+    "declarations": "/api/declarations?start_date={start}&end_date={end}&codigo_arancel=0302&limit=1000",
+    "declarations-exporter": "/api/declarations?start_date={start}&end_date={end}&nro_exportador={nro}&limit=1000",
+}
+
+@contextmanager
+def measure(results: Dict[str, Any], name: str, rows: int = None) -> Iterator[Dict[str, Any]]:
+    """Registra en `results[name]` la duración, el RSS máximo y el rendimiento de la etapa."""
+    stage = {"rows": rows}
+    with PeakRSS(interval=0.005) as rss:
+        started = time.perf_counter()
+        yield stage
+        seconds = time.perf_counter() - started
+    stage["seconds"] = round(seconds, 4)
+    stage["rows_per_second"] = round(stage["rows"] / seconds) if stage["rows"] and seconds else None
+    stage["peak_rss_mb"] = round(rss.peak / 2**20, 1)
+    results[name] = stage
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+def _random_range(rng: random.Random) -> Dict[str, date]:
+    first = date(YEAR, min(MONTHS), 1)
+    last = date(YEAR, max(MONTHS) + 1, 1) - timedelta(days=1)
+    start = first + timedelta(days=rng.randint(0, (last - first).days))
+    end = min(last, start + timedelta(days=rng.randint(0, 30)))
+    return {"start": start, "end": end}
+
+def run_stages() -> Dict[str, Any]:
+    """Mide cada etapa de la ETL sobre los archivos de DATA_FOLDER, escribiendo en su bodega."""
+    from prefect.logging import disable_run_logger
+    from aduanas_conecta_logis_back.etl.config import DATA_SOURCES, DB_PATH, TABLE_NAMES
+    from aduanas_conecta_logis_back.etl.extract import extract_from_files
+    from aduanas_conecta_logis_back.etl.transform import clean_and_transform_split
+    from aduanas_conecta_logis_back.etl.load import load_to_duckdb
+    from aduanas_conecta_logis_back.etl.modeling import create_analytical_models
+
+    stages: Dict[str, Any] = {}
+    with disable_run_logger():
+        for source_name, config in DATA_SOURCES.items():
+            with measure(stages, f"extract:{source_name}") as stage:
+                df_raw = extract_from_files.fn(
+                    file_paths=config["files"], cols_map=config["cols_map"],
+                    separator=config["separator"], decimal_separator=config["decimal_separator"]
+                )
+                stage["rows"] = len(df_raw)
+            with measure(stages, f"transform:{source_name}", rows=len(df_raw)):
+                df_good, _ = clean_and_transform_split.fn(df=df_raw, decimal_separator=config["decimal_separator"])
+            del df_raw
+            with measure(stages, f"load:{source_name}", rows=len(df_good)):
+                load_to_duckdb.fn(df=df_good, db_path=DB_PATH, table_name=TABLE_NAMES[source_name])
+            if source_name == "exportaciones":
+                modeled_rows = len(df_good)
+            del df_good
+        with measure(stages, "modeling", rows=modeled_rows):
+            create_analytical_models.fn(db_path=DB_PATH)
+    return stages
+
+def run_api(requests: int, seed: int) -> Dict[str, Any]:
+    """Latencia de los endpoints de consulta sobre la bodega recién construida."""
+    from fastapi.testclient import TestClient
+    from aduanas_conecta_logis_back.api.main import app, pool, response_cache
+
+    client = TestClient(app)
+    exporters = [row[0] for row in pool.cursor().execute("SELECT NRO_EXPORTADOR FROM dim_exportador").fetchall()]
+    results = {}
+    for name, template in ENDPOINTS.items():
+        rng = random.Random(f"{seed}-{name}")
+        urls = [template.format(**_random_range(rng), nro=rng.choice(exporters)) for _ in range(requests)]
+        client.get(urls[0])  # Calentamiento: abre la conexión y compila la consulta.
+        uncached, cached = [], []
+        for url in urls:
+            response_cache.clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            uncached.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+            started = time.perf_counter()
+            client.get(url)
+            cached.append((time.perf_counter() - started) * 1000)
+        results[name] = {
+            "requests": requests,
+            "p50_ms": round(_percentile(uncached, 0.50), 3),
+            "p99_ms": round(_percentile(uncached, 0.99), 3),
+            "cached_p50_ms": round(_percentile(cached, 0.50), 3),
+        }
+    return results
+
+def run_single_scale(scale: float, seed: int, malformed_rate: float, requests: int) -> Dict[str, Any]:
+    """Genera los datos de un volumen y mide la ETL y la API. Se ejecuta en un proceso hijo."""
+    data_dir = Path(os.environ["DATA_FOLDER"])
+    started = time.perf_counter()
+    files = generate(data_dir, scale=scale, seed=seed, malformed_rate=malformed_rate)
+    generation_seconds = time.perf_counter() - started
+    result = {
+        "input_lines": files,
+        "input_mb": round(sum(f.stat().st_size for f in data_dir.glob("*.txt")) / 2**20, 1),
+        "generation_seconds": round(generation_seconds, 2),
+        "stages": run_stages(),
+        "api": run_api(requests, seed),
+    }
+    result["peak_rss_mb"] = max(stage["peak_rss_mb"] for stage in result["stages"].values())
+    return result
+
+def run_scale_in_subprocess(scale: float, args: argparse.Namespace) -> Dict[str, Any]:
+    work_dir = Path(tempfile.mkdtemp(prefix=f"aduanas-bench-{scale}x-"))
+    result_file = work_dir / "result.json"
+    env = {**os.environ, "DATA_FOLDER": str(work_dir / "data"), "PREFECT_LOGGING_LEVEL": "WARNING"}
+    command = [
+        sys.executable, "-m", "benchmarks.suite", "--single-scale", str(scale), "--result-file", str(result_file),
+        "--seed", str(args.seed), "--malformed-rate", str(args.malformed_rate), "--requests", str(args.requests),
+    ]
+    try:
+        subprocess.run(command, env=env, check=True)
+        return json.loads(result_file.read_text())
+    finally:
+        if not args.keep_data:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Lista las métricas que empeoraron más que `tolerance` (fracción) respecto de la línea base."""
+    regressions = []
+
+    def check(label: str, base: float, value: float, higher_is_better: bool):
+        if not base or value is None:
+            return
+        change = (value - base) / base
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append(f"{label}: {base:g} -> {value:g} ({change:+.0%})")
+
+    for scale, result in current["scales"].items():
+        base = baseline.get("scales", {}).get(scale)
+        if base is None:
+            continue
+        for name, stage in result["stages"].items():
+            base_stage = base["stages"].get(name, {})
+            check(f"{scale}x {name} filas/s", base_stage.get("rows_per_second"), stage["rows_per_second"], True)
+            check(f"{scale}x {name} RSS MB", base_stage.get("peak_rss_mb"), stage["peak_rss_mb"], False)
+        for name, endpoint in result["api"].items():
+            base_endpoint = base["api"].get(name, {})
+            check(f"{scale}x {name} p50 ms", base_endpoint.get("p50_ms"), endpoint["p50_ms"], False)
+            check(f"{scale}x {name} p99 ms", base_endpoint.get("p99_ms"), endpoint["p99_ms"], False)
+    return regressions
+
+def _print_summary(results: Dict[str, Any]):
+    for scale, result in results["scales"].items():
+        print(f"\n=== {scale}x ({result['input_mb']} MB de entrada) ===")
+        for name, stage in result["stages"].items():
+            print(f"  {name:<24}{stage['seconds']:>9.3f} s{stage['rows_per_second'] or 0:>14,} filas/s{stage['peak_rss_mb']:>10.1f} MB")
+        for name, endpoint in result["api"].items():
+            print(f"  {name:<24} p50 {endpoint['p50_ms']:>8.2f} ms  p99 {endpoint['p99_ms']:>8.2f} ms  caché {endpoint['cached_p50_ms']:>6.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=float, nargs="+", default=DEFAULT_SCALES, help="volúmenes a medir")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--malformed-rate", type=float, default=0.002)
+    parser.add_argument("--requests", type=int, default=REQUESTS_PER_ENDPOINT, help="peticiones por endpoint")
+    parser.add_argument("--output", type=Path, default=Path("benchmarks/results.json"))
+    parser.add_argument("--compare", type=Path, help="línea base con la que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="empeoramiento tolerado (fracción)")
+    parser.add_argument("--keep-data", action="store_true", help="no borrar los archivos y bodegas generados")
+    parser.add_argument("--single-scale", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single_scale is not None:
+        result = run_single_scale(args.single_scale, args.seed, args.malformed_rate, args.requests)
+        args.result_file.write_text(json.dumps(result))
+        return
+
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "seed": args.seed,
+        "malformed_rate": args.malformed_rate,
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "scales": {},
+    }
+    for scale in args.scales:
+        print(f"Midiendo volumen {scale:g}x...", flush=True)
+        results["scales"][f"{scale:g}"] = run_scale_in_subprocess(scale, args)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False) + "\n")
+    _print_summary(results)
+    print(f"\nResultados guardados en {args.output}")
+
+    if args.compare:
+        regressions = compare(json.loads(args.compare.read_text()), results, args.tolerance)
+        if regressions:
+            print(f"\nRegresiones respecto de {args.compare} (tolerancia {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print(f"\nSin regresiones respecto de {args.compare}.")
+
+if __name__ == "__main__":
+    main()
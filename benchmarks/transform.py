@@ -0,0 +1,102 @@
+"""
+Micro-benchmark de `clean_and_transform_split` sobre los archivos de bultos
+incluidos en `data/`. Compara la implementación actual con la anterior
+(`legacy_clean_and_transform_split`, conservada aquí sólo como referencia) y
+muestra filas por segundo y memoria máxima asignada durante la curación.
+
+Uso, desde la raíz del proyecto:
+
+    python -m benchmarks.transform [--repeat 5] [--scale 10]
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Callable, Tuple
+import pandas as pd
+from prefect.logging import disable_run_logger
+from aduanas_conecta_logis_back.etl.config import BASE_DIR, DATA_SOURCES
+from aduanas_conecta_logis_back.etl.extract import _read_options, _rename_columns
+from aduanas_conecta_logis_back.etl.transform import NUMERIC_COLUMNS, clean_and_transform_split
+
+def legacy_clean_and_transform_split(df: pd.DataFrame, decimal_separator: str = ".") -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Versión anterior de la curación (apply por columna, columnas temporales y copias)."""
+    df.drop_duplicates(inplace=True)
+    df_clean = df.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
+    df_clean["FECHAACEPT_norm"] = df_clean["FECHAACEPT"].str.zfill(8)
+    df_clean["FECHAACEPT_clean"] = pd.to_datetime(df_clean["FECHAACEPT_norm"], format='%d%m%Y', errors='coerce')
+    df_clean["NUMEROIDENT_clean"] = pd.to_numeric(df_clean["NUMEROIDENT"], errors='coerce')
+    bad_rows_mask = df_clean["NUMEROIDENT_clean"].isnull() | df_clean["FECHAACEPT_clean"].isnull()
+    df_rejected = df[bad_rows_mask]
+    df_good = df_clean[~bad_rows_mask].copy()
+    df_good["NUMEROIDENT"] = df_good["NUMEROIDENT_clean"].astype(int)
+    df_good["FECHAACEPT"] = df_good["FECHAACEPT_clean"]
+    for col in NUMERIC_COLUMNS:
+        if col in df_good.columns:
+            if decimal_separator != ".":
+                df_good[col] = df_good[col].str.replace(decimal_separator, ".", regex=False)
+            df_good[col] = pd.to_numeric(df_good[col], errors='coerce').fillna(0)
+            if df_good[col].dtype == 'float64' and (df_good[col] % 1 == 0).all():
+                df_good[col] = df_good[col].astype(int)
+    df_good['hora_lectura_archivo'] = pd.Timestamp.now()
+    df_good['año'] = df_good['FECHAACEPT'].dt.year
+    df_good['mes'] = df_good['FECHAACEPT'].dt.month
+    df_good['hora_procesamiento'] = pd.Timestamp.now()
+    final_good_columns = list(df.columns) + ['hora_lectura_archivo', 'año', 'mes', 'hora_procesamiento']
+    return df_good[final_good_columns], df_rejected
+
+def current_clean_and_transform_split(df: pd.DataFrame, decimal_separator: str = ".") -> Tuple[pd.DataFrame, pd.DataFrame]:
+    with disable_run_logger():
+        return clean_and_transform_split.fn(df=df, decimal_separator=decimal_separator)
+
+def load_bultos(scale: int) -> pd.DataFrame:
+    """Lee los archivos bultos*.txt incluidos en el repositorio, repetidos `scale` veces."""
+    config = DATA_SOURCES["bultos"]
+    read_options = _read_options(config["cols_map"], config["separator"], config["decimal_separator"])
+    frames = [
+        _rename_columns(pd.read_csv(path, **read_options), config["cols_map"])
+        for path in sorted((BASE_DIR / "data").glob("bultos*.txt"))
+    ]
+    if not frames:
+        raise SystemExit("No se encontraron archivos bultos*.txt en data/.")
+    df = pd.concat(frames, ignore_index=True)
+    # Cada copia recibe identificadores distintos para que no se descarte como duplicada.
+    copies = [df]
+    for k in range(1, scale):
+        copy = df.copy()
+        has_id = copy["NUMEROIDENT"].str.strip() != ""
+        copy["NUMEROIDENT"] = copy["NUMEROIDENT"].where(~has_id, copy["NUMEROIDENT"].str.strip() + str(k))
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+def measure(transform: Callable, df: pd.DataFrame, decimal_separator: str, repeat: int) -> Tuple[float, int, pd.DataFrame]:
+    """Mejor tiempo de `repeat` ejecuciones y memoria máxima de una ejecución adicional."""
+    best = float("inf")
+    for _ in range(repeat):
+        data = df.copy()
+        started = time.perf_counter()
+        transform(data, decimal_separator)
+        best = min(best, time.perf_counter() - started)
+    data = df.copy()
+    tracemalloc.start()
+    df_good, _ = transform(data, decimal_separator)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, df_good
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="ejecuciones cronometradas por implementación")
+    parser.add_argument("--scale", type=int, default=1, help="veces que se repiten los archivos de entrada")
+    args = parser.parse_args()
+
+    df = load_bultos(args.scale)
+    decimal_separator = DATA_SOURCES["bultos"]["decimal_separator"]
+    print(f"Filas de entrada: {len(df)} ({args.scale}x bultos*.txt), mejor de {args.repeat} ejecuciones\n")
+    print(f"{'implementación':<16}{'segundos':>10}{'filas/s':>14}{'memoria máx. (MB)':>20}{'salida (MB)':>14}")
+    for name, transform in (("anterior", legacy_clean_and_transform_split), ("actual", current_clean_and_transform_split)):
+        seconds, peak, df_good = measure(transform, df, decimal_separator, args.repeat)
+        output_mb = df_good.memory_usage(index=True, deep=True).sum() / 2**20
+        print(f"{name:<16}{seconds:>10.3f}{len(df) / seconds:>14,.0f}{peak / 2**20:>20.1f}{output_mb:>14.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import itertools
+from datetime import date
+
+import duckdb
+import pytest
+from prefect.logging import disable_run_logger
+
+from aduanas_conecta_logis_back.etl.modeling import create_analytical_models
+
+def build_warehouse(db_path, days=3, declarations_per_day=4, items_per_declaration=5):
+    """
+    Bodega chica con los modelos analíticos: varios ítems por declaración, que
+    comparten fecha, número y a veces exportador y código arancelario.
+    """
+    with duckdb.connect(str(db_path)) as con:
+        con.execute("""
+            CREATE TABLE exportaciones (
+                FECHAACEPT TIMESTAMP_NS, NUMEROIDENT BIGINT, NRO_EXPORTADOR BIGINT, PESOBRUTOTOTAL DOUBLE,
+                FOBUNITARIO DOUBLE, PESOBRUTOITEM DOUBLE, CODIGOARANCEL BIGINT, año INTEGER, mes INTEGER
+            )
+        """)
+        con.execute("CREATE TABLE bultos_exportaciones (NUMEROIDENT BIGINT, FECHAACEPT TIMESTAMP_NS, CANTIDADBULTO BIGINT, año INTEGER, mes INTEGER)")
+        numbers = itertools.count(1000)
+        for day in range(1, days + 1):
+            fecha = date(2025, 3, day)
+            for _ in range(declarations_per_day):
+                nro = next(numbers)
+                for item in range(items_per_declaration):
+                    con.execute(
+                        "INSERT INTO exportaciones VALUES (?, ?, ?, 100.0, ?, ?, ?, 2025, 3)",
+                        [fecha, nro, 7 + item % 2, float(item % 3 + 1), float(item + 1), 22042110 + item % 2]
+                    )
+                con.execute("INSERT INTO bultos_exportaciones VALUES (?, ?, 2, 2025, 3)", [nro, fecha])
+        # Las horas de lectura y de procesamiento que agrega la curación.
+        for table_name in ("exportaciones", "bultos_exportaciones"):
+            for col in ("hora_lectura_archivo", "hora_procesamiento"):
+                con.execute(f"ALTER TABLE {table_name} ADD COLUMN {col} TIMESTAMP")
+    with disable_run_logger():
+        create_analytical_models.fn(db_path=db_path)
+    return db_path
+
+@pytest.fixture
+def warehouse(tmp_path):
+    return build_warehouse(tmp_path / "bodega.db")
+
+@pytest.fixture
+def api(warehouse, monkeypatch):
+    """La aplicación de la API leyendo `warehouse`, con una versión propia para no compartir la caché."""
+    from aduanas_conecta_logis_back.api import main
+    from aduanas_conecta_logis_back.api.db import ConnectionPool
+    from aduanas_conecta_logis_back.api.memory_index import MemoryIndex
+
+    pool = ConnectionPool(warehouse)
+    pool.version = lambda: str(warehouse)
+    monkeypatch.setattr(main, "pool", pool)
+    monkeypatch.setattr(main, "memory_index", MemoryIndex(pool.cursor, pool.version))
+    yield main
+    pool.close()
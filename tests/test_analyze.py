@@ -0,0 +1,74 @@
+import duckdb
+import pytest
+from prefect.logging import disable_run_logger
+
+from aduanas_conecta_logis_back.etl.analyze import (
+    DISTINCT_RELATIVE_ERROR, METRICS_TABLE, PROFILED_TABLES, generate_quality_report
+)
+from aduanas_conecta_logis_back.etl.modeling import create_analytical_models
+
+def _report(db_path, **kwargs):
+    with disable_run_logger():
+        return generate_quality_report.fn(db_path=db_path, **kwargs)
+
+def _metrics(db_path, table_name, column_name):
+    with duckdb.connect(str(db_path), read_only=True) as con:
+        return dict(con.execute(
+            f"SELECT metric, value FROM {METRICS_TABLE} WHERE table_name = ? AND column_name = ?", [table_name, column_name]
+        ).fetchall())
+
+def test_exact_profile_matches_direct_queries(warehouse):
+    report = _report(warehouse, mode="exact")
+
+    # 60 ítems en 'exportaciones' y en 'datos_idty', y 12 líneas de bultos.
+    assert report["profiled_rows"] == 132
+    assert report["total_rows"] == 60
+    assert set(report["tables"]) == set(PROFILED_TABLES)
+    exportaciones = report["tables"]["exportaciones"]
+    assert (exportaciones["total_rows"], exportaciones["partitions"]) == (60, 1)
+    # 12 declaraciones de 5 ítems cada una.
+    assert exportaciones["columns"]["NUMEROIDENT"]["uniqueness"] == pytest.approx(12 / 60)
+    assert exportaciones["columns"]["FOBUNITARIO"]["completeness"] == 1.0
+
+    metrics = _metrics(warehouse, "exportaciones", "PESOBRUTOITEM")
+    with duckdb.connect(str(warehouse), read_only=True) as con:
+        expected = con.execute("""
+            SELECT MIN(PESOBRUTOITEM), MAX(PESOBRUTOITEM), AVG(PESOBRUTOITEM), median(PESOBRUTOITEM), COUNT(DISTINCT PESOBRUTOITEM)
+            FROM exportaciones
+        """).fetchone()
+    assert (metrics["min"], metrics["max"], metrics["mean"], metrics["p50"], metrics["distinct"]) == pytest.approx(expected)
+
+def test_approximate_profile_stays_within_its_error_bounds(warehouse):
+    _report(warehouse, mode="exact")
+    exact = _metrics(warehouse, "datos_idty", "FOBUNITARIO"), _metrics(warehouse, "exportaciones", "NUMEROIDENT")
+    _report(warehouse, mode="approx")
+    approx = _metrics(warehouse, "datos_idty", "FOBUNITARIO"), _metrics(warehouse, "exportaciones", "NUMEROIDENT")
+
+    for exact_metrics, approx_metrics in zip(exact, approx):
+        assert approx_metrics["distinct"] == pytest.approx(exact_metrics["distinct"], rel=3 * DISTINCT_RELATIVE_ERROR)
+        assert approx_metrics["min"] == exact_metrics["min"]
+        assert approx_metrics["max"] == exact_metrics["max"]
+    # Los valores de FOB son 1, 2 y 3: con QUANTILE_RANK_ERROR la mediana no cambia.
+    assert approx[0]["p50"] == exact[0]["p50"]
+
+def test_incremental_profile_only_rereads_the_loaded_partitions(warehouse):
+    _report(warehouse, mode="exact")
+    with duckdb.connect(str(warehouse)) as con:
+        march = con.execute(f"SELECT * FROM {METRICS_TABLE} WHERE partition_key = 202503 ORDER BY ALL").fetchall()
+        con.execute("""
+            INSERT INTO exportaciones
+            SELECT * REPLACE (FECHAACEPT + INTERVAL 31 DAY AS FECHAACEPT, NUMEROIDENT + 100 AS NUMEROIDENT, 4 AS mes)
+            FROM exportaciones
+        """)
+    with disable_run_logger():
+        create_analytical_models.fn(db_path=warehouse, partitions=[202504])
+
+    report = _report(warehouse, mode="exact", partitions=[202504])
+
+    # Sólo los 60 ítems nuevos, en 'exportaciones' y en 'datos_idty'.
+    assert report["profiled_rows"] == 120
+    assert report["total_rows"] == 120
+    assert report["tables"]["exportaciones"]["partitions"] == 2
+    with duckdb.connect(str(warehouse), read_only=True) as con:
+        assert con.execute(f"SELECT * FROM {METRICS_TABLE} WHERE partition_key = 202503 ORDER BY ALL").fetchall() == march
+    assert _report(warehouse, mode="exact")["tables"] == report["tables"]
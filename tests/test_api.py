@@ -0,0 +1,62 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+DECLARATIONS_URL = "/api/declarations?start_date=2025-03-01&end_date=2025-03-31"
+EXPORT_URL = "/api/export/declarations?start_date=2025-03-01&end_date=2025-03-31&format=csv"
+
+def test_declaration_pages_cover_every_item_once(api):
+    client = TestClient(api.app)
+    everything = client.get(DECLARATIONS_URL).json()
+    assert len(everything) == 60
+
+    pages = [client.get(f"{DECLARATIONS_URL}&limit=7&offset={offset}").json() for offset in range(0, 60, 7)]
+    assert [row for page in pages for row in page] == everything
+    assert everything == sorted(everything, key=lambda row: (
+        row["fecha_aceptacion"], row["numeroident"], row["nro_exportador"], row["codigo_arancel"],
+        row["fob_unitario"], row["peso_bruto_item"]
+    ))
+
+def test_export_disconnected_while_reading_a_chunk_releases_its_slot(api):
+    reading, resume = threading.Event(), threading.Event()
+    closed = []
+
+    def chunks():
+        try:
+            yield b"primero"
+            reading.set()
+            resume.wait(5)
+            yield b"segundo"
+        finally:
+            closed.append("chunks")
+
+    class Connection:
+        def close(self):
+            closed.append("connection")
+
+    async def disconnect_mid_read():
+        slot = asyncio.Semaphore(1)
+        await slot.acquire()
+        stream = api._stream_export(chunks(), Connection(), slot)
+        assert await stream.__anext__() == b"primero"
+        # El cliente se desconecta mientras un hilo lee el segundo bloque.
+        pending = asyncio.ensure_future(stream.__anext__())
+        assert await asyncio.to_thread(reading.wait, 5)
+        pending.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+        assert closed == []
+        resume.set()
+        await asyncio.wait_for(slot.acquire(), 5)
+
+    asyncio.run(disconnect_mid_read())
+    assert closed == ["chunks", "connection"]
+
+    # Las descargas siguientes encuentran turno.
+    client = TestClient(api.app)
+    for _ in range(api.API_EXPORT_CONCURRENCY + 1):
+        response = client.get(EXPORT_URL)
+        assert response.status_code == 200
+        assert len(response.text.splitlines()) == 61
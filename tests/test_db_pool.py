@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import duckdb
+import pytest
+
+from aduanas_conecta_logis_back.api.db import ConnectionPool
+
+def _build(path, value):
+    with duckdb.connect(str(path)) as con:
+        con.execute(f"CREATE TABLE t AS SELECT {value} AS generation, range AS n FROM range(200000)")
+
+class _Publisher:
+    """Publica generaciones como la ETL: reemplaza el archivo y avanza el número."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.generation = 1
+        _build(db_path, 1)
+
+    def publish(self):
+        staging = self.db_path.with_name("staging.db")
+        _build(staging, self.generation + 1)
+        os.replace(staging, self.db_path)
+        self.generation += 1
+
+@pytest.fixture
+def publisher(tmp_path):
+    return _Publisher(tmp_path / "bodega.db")
+
+@pytest.fixture
+def pool(publisher):
+    pool = ConnectionPool(publisher.db_path)
+    pool.version = lambda: publisher.generation
+    yield pool
+    pool.close()
+
+def test_query_started_before_a_publish_finishes_on_its_generation(pool, publisher):
+    got_cursor, published = threading.Event(), threading.Event()
+
+    def query():
+        cursor = pool.cursor()
+        got_cursor.set()
+        published.wait(5)
+        return cursor.execute("SELECT max(generation), count(*) FROM t, range(20)").fetchone()
+
+    with ThreadPoolExecutor(max_workers=1) as worker:
+        running = worker.submit(query)
+        assert got_cursor.wait(5)
+        publisher.publish()
+        # Otro hilo pide su cursor: se abre la nueva generación mientras la consulta sigue en curso.
+        assert pool.cursor().execute("SELECT max(generation) FROM t").fetchone() == (2,)
+        published.set()
+        assert running.result() == (1, 4_000_000)
+
+        # El próximo cursor del mismo hilo ya ve la nueva generación y la conexión anterior se cierra.
+        retired = worker.submit(lambda: pool._local.connection).result()
+        assert worker.submit(lambda: pool.cursor().execute("SELECT max(generation) FROM t").fetchone()).result() == (2,)
+    with pytest.raises(duckdb.ConnectionException):
+        retired.execute("SELECT 1")
+
+def test_concurrent_queries_survive_repeated_publishes(pool, publisher):
+    final_generation = publisher.generation + 5
+    published = threading.Event()
+
+    def query_until_final_generation():
+        # Consulta sin pausa mientras se publica; termina cuando ve la última generación.
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            generation = pool.cursor().execute("SELECT max(generation) FROM t, range(5)").fetchone()[0]
+            if published.is_set() and generation == final_generation:
+                break
+        # Un último cursor, ya con la versión final publicada: el hilo suelta las conexiones anteriores.
+        pool.cursor()
+        return generation
+
+    with ThreadPoolExecutor(max_workers=4) as workers:
+        running = [workers.submit(query_until_final_generation) for _ in range(4)]
+        for _ in range(5):
+            publisher.publish()
+        published.set()
+        assert [future.result() for future in running] == [final_generation] * 4
+    # Sólo queda abierta la conexión vigente: las retiradas se cerraron al soltarlas su último hilo.
+    assert pool._users == {pool._connection: 4}
@@ -0,0 +1,63 @@
+import duckdb
+import pytest
+from prefect.logging import disable_run_logger
+
+from aduanas_conecta_logis_back.etl.config import BULTOS_COLS_MAP
+from aduanas_conecta_logis_back.etl.extract import extract_from_files
+from aduanas_conecta_logis_back.etl.load import load_to_duckdb
+from aduanas_conecta_logis_back.etl.native import ingest_with_duckdb
+from aduanas_conecta_logis_back.etl.rejects import save_rejected_records
+from aduanas_conecta_logis_back.etl.transform import clean_and_transform_split
+
+# Textos que pandas trata como nulos por defecto. Las filas que sólo difieren
+# en ellos son distintas para ambos motores.
+LINES = [
+    "1;01032025;a;b;5",
+    "NULL;01032025;a;b;1",
+    "N/A;01032025;a;b;1",
+    "nan;01032025;a;b;1",
+    "2;NA;a;b;1",
+    "2;#N/A;a;b;1",
+    "3;01032025;a;b;NULL",
+    "3;01032025;a;b;n/a",
+    "4;;a;b;2",
+    "5;02032025;a;b;",
+]
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "bultos.txt"
+    path.write_text("\n".join(LINES) + "\n", encoding="latin-1")
+    return {"files": [path], "cols_map": BULTOS_COLS_MAP, "separator": ";", "decimal_separator": "."}
+
+def _run_pandas(source, db_path):
+    df_raw = extract_from_files.fn(
+        file_paths=source["files"], cols_map=source["cols_map"],
+        separator=source["separator"], decimal_separator=source["decimal_separator"]
+    )
+    df_good, df_rejected = clean_and_transform_split.fn(df=df_raw, decimal_separator=source["decimal_separator"])
+    load_to_duckdb.fn(df=df_good, db_path=db_path, table_name="bultos_exportaciones")
+    save_rejected_records.fn(df=df_rejected, db_path=db_path, source_name="bultos")
+
+def _run_duckdb(source, db_path):
+    ingest_with_duckdb.fn(source_config=source, db_path=db_path, table_name="bultos_exportaciones", source_name="bultos")
+
+def _contents(db_path):
+    with duckdb.connect(str(db_path), read_only=True) as con:
+        curated = con.execute("""
+            SELECT NUMEROIDENT, FECHAACEPT, CANTIDADBULTO, año, mes FROM bultos_exportaciones ORDER BY ALL
+        """).fetchall()
+        rejected = con.execute("SELECT reason, line_number, record FROM rejected_records ORDER BY line_number").fetchall()
+    return curated, rejected
+
+def test_engines_agree_on_null_like_tokens(source, tmp_path):
+    with disable_run_logger():
+        _run_pandas(source, tmp_path / "pandas.db")
+        _run_duckdb(source, tmp_path / "duckdb.db")
+
+    pandas_curated, pandas_rejected = _contents(tmp_path / "pandas.db")
+    duckdb_curated, duckdb_rejected = _contents(tmp_path / "duckdb.db")
+    assert pandas_curated == duckdb_curated
+    assert pandas_rejected == duckdb_rejected
+    assert [row[0] for row in pandas_curated] == [1, 3, 3, 5]
+    assert [row[1] for row in pandas_rejected] == [2, 3, 4, 5, 6, 9]
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from aduanas_conecta_logis_back.api.db import ConnectionPool
+from aduanas_conecta_logis_back.api.executor import QueryExecutor
+from aduanas_conecta_logis_back.api.metrics import REGISTRY
+
+@pytest.fixture
+def pool(warehouse):
+    pool = ConnectionPool(warehouse)
+    pool.version = lambda: 1
+    yield pool
+    pool.close()
+
+@pytest.fixture
+def executor():
+    executor = QueryExecutor(max_workers=4, max_concurrency=4, queue_timeout=0.2, limits={"lento": 1})
+    yield executor
+    executor.shutdown()
+
+def _requests(endpoint, result):
+    return REGISTRY.get_sample_value("aduanas_api_query_requests_total", {"endpoint": endpoint, "result": result}) or 0
+
+class _BlockedQuery:
+    """Cuenta los ítems de la bodega después de esperar a que el test la libere."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.started, self.release = threading.Event(), threading.Event()
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        return self.pool.cursor().execute("SELECT COUNT(*) FROM datos_idty").fetchone()[0]
+
+def test_identical_queries_in_flight_run_once(pool, executor):
+    query = _BlockedQuery(pool)
+    executed, coalesced = _requests("declaraciones", "executed"), _requests("declaraciones", "coalesced")
+
+    async def concurrent_requests():
+        first = asyncio.ensure_future(executor.run("declaraciones", ("marzo",), query))
+        assert await asyncio.to_thread(query.started.wait, 5)
+        others = [asyncio.ensure_future(executor.run("declaraciones", ("marzo",), query)) for _ in range(4)]
+        # El cliente que la inició se desconecta; los demás siguen esperando el resultado.
+        first.cancel()
+        await asyncio.sleep(0)
+        query.release.set()
+        return await asyncio.gather(*others)
+
+    assert asyncio.run(concurrent_requests()) == [60] * 4
+    assert query.calls == 1
+    assert _requests("declaraciones", "executed") - executed == 1
+    assert _requests("declaraciones", "coalesced") - coalesced == 4
+
+    # Una vez terminada, la misma consulta se vuelve a ejecutar.
+    assert asyncio.run(executor.run("declaraciones", ("marzo",), query)) == 60
+    assert query.calls == 2
+
+def test_failed_query_reaches_every_waiter_and_is_forgotten(executor):
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ValueError("falla")
+
+    async def concurrent_requests():
+        return await asyncio.gather(*(executor.run("declaraciones", ("falla",), failing) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(concurrent_requests())
+    assert [type(error) for error in errors] == [ValueError] * 3
+    assert len(calls) == 1
+    with pytest.raises(ValueError):
+        asyncio.run(executor.run("declaraciones", ("falla",), failing))
+    assert len(calls) == 2
+
+def test_endpoint_without_a_free_slot_rejects_with_retry_after(pool, executor):
+    query = _BlockedQuery(pool)
+    rejected = _requests("lento", "rejected")
+
+    async def saturated():
+        running = asyncio.ensure_future(executor.run("lento", ("a",), query))
+        assert await asyncio.to_thread(query.started.wait, 5)
+        with pytest.raises(HTTPException) as excinfo:
+            await executor.run("lento", ("b",), lambda: 0)
+        # El límite es por endpoint: los demás siguen atendiendo.
+        assert await executor.run("otro", ("b",), lambda: 1) == 1
+        query.release.set()
+        assert await running == 60
+        # Liberado el turno, el endpoint vuelve a aceptar consultas.
+        assert await executor.run("lento", ("b",), lambda: 2) == 2
+        return excinfo.value
+
+    error = asyncio.run(saturated())
+    assert error.status_code == 503
+    assert error.headers == {"Retry-After": "1"}
+    assert _requests("lento", "rejected") - rejected == 1
+
+def test_queued_query_runs_when_a_slot_frees_in_time(pool, executor):
+    query = _BlockedQuery(pool)
+
+    async def queued():
+        running = asyncio.ensure_future(executor.run("lento", ("a",), query))
+        assert await asyncio.to_thread(query.started.wait, 5)
+        waiting = asyncio.ensure_future(executor.run("lento", ("b",), lambda: 2))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        query.release.set()
+        return await asyncio.gather(running, waiting)
+
+    assert asyncio.run(queued()) == [60, 2]
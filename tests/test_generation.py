@@ -0,0 +1,42 @@
+import multiprocessing
+import threading
+
+from aduanas_conecta_logis_back.etl.generation import build_lock
+
+def _hold_lock(lock_path, holding, release):
+    with build_lock(lock_path=lock_path):
+        holding.set()
+        release.wait(10)
+
+def test_build_lock_waits_for_another_process(tmp_path):
+    lock_path = tmp_path / "bodega.db.lock"
+    context = multiprocessing.get_context("spawn")
+    holding, release = context.Event(), context.Event()
+    other = context.Process(target=_hold_lock, args=(lock_path, holding, release))
+    other.start()
+    try:
+        assert holding.wait(30)
+        waited, acquired = threading.Event(), threading.Event()
+
+        def build():
+            with build_lock(on_wait=waited.set, lock_path=lock_path):
+                acquired.set()
+
+        builder = threading.Thread(target=build)
+        builder.start()
+        assert waited.wait(5)
+        assert not acquired.wait(0.2)
+        release.set()
+        assert acquired.wait(10)
+        builder.join()
+    finally:
+        release.set()
+        other.join(10)
+
+def test_build_lock_does_not_wait_when_free(tmp_path):
+    waits = []
+    with build_lock(on_wait=lambda: waits.append(1), lock_path=tmp_path / "bodega.db.lock"):
+        pass
+    with build_lock(on_wait=lambda: waits.append(1), lock_path=tmp_path / "bodega.db.lock"):
+        pass
+    assert waits == []
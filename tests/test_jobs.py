@@ -0,0 +1,75 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from aduanas_conecta_logis_back.api.jobs import JobManager
+from aduanas_conecta_logis_back.etl.progress import new_status, read_status, write_status
+
+@pytest.fixture
+def manager(tmp_path):
+    return JobManager(tmp_path / "jobs")
+
+def _write_job(manager, job_id, owner, state="running"):
+    status = new_status(job_id)
+    status["state"] = state
+    if owner is not None:
+        status["owner"] = owner
+    write_status(manager._status_path(job_id), status)
+
+def test_only_jobs_whose_api_process_is_gone_are_abandoned(manager):
+    live = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    host = socket.gethostname()
+    try:
+        _write_job(manager, "a" * 32, {"host": host, "pid": live.pid})
+        _write_job(manager, "b" * 32, {"host": host, "pid": dead.pid})
+        _write_job(manager, "c" * 32, {"host": "otro-equipo", "pid": dead.pid}, state="queued")
+        _write_job(manager, "d" * 32, None)
+        _write_job(manager, "e" * 32, {"host": host, "pid": dead.pid}, state="succeeded")
+        manager._abandon_stale_jobs()
+    finally:
+        live.kill()
+        live.wait()
+
+    states = {job_id[0]: manager.get(job_id)["state"] for job_id in (c * 32 for c in "abcde")}
+    assert states == {"a": "running", "b": "failed", "c": "queued", "d": "failed", "e": "succeeded"}
+
+class _LostStatusProcess:
+    """Proceso falso de la ETL que termina sin resultado y deja el archivo de estado ilegible o borrado."""
+
+    def __init__(self, target, args, name, corrupt):
+        self.status_path, self.corrupt, self.exitcode = args[0], corrupt, -9
+
+    def start(self):
+        if self.corrupt:
+            with open(self.status_path, "w") as f:
+                f.write("{")
+        else:
+            os.remove(self.status_path)
+
+    def join(self):
+        pass
+
+@pytest.mark.parametrize("corrupt", [False, True])
+def test_job_whose_status_file_is_lost_is_marked_failed(manager, corrupt):
+    class Context:
+        def Process(self, target, args, name):
+            return _LostStatusProcess(target, args, name, corrupt)
+    manager._context = Context()
+
+    job, created = manager.submit()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        status = read_status(manager._status_path(job["job_id"]))
+        if status and status["state"] == "failed":
+            break
+        time.sleep(0.05)
+    assert created
+    assert status["job_id"] == job["job_id"]
+    assert status["state"] == "failed"
+    assert "código -9" in status["error"]
@@ -0,0 +1,95 @@
+import duckdb
+import pytest
+from prefect.logging import disable_run_logger
+
+from aduanas_conecta_logis_back.etl.catalog import LAKE_TABLES, lake_table_sql, read_lake_pointer
+from aduanas_conecta_logis_back.etl.lake import discard_lake_snapshot, export_lake_snapshot, publish_lake_snapshot
+from aduanas_conecta_logis_back.etl.modeling import create_analytical_models
+
+def _export(warehouse, lake_dir, snapshot_id, base_generation, partitions=None):
+    with disable_run_logger():
+        return export_lake_snapshot.fn(
+            db_path=warehouse, lake_dir=lake_dir, snapshot_id=snapshot_id,
+            base_generation=base_generation, partitions=partitions
+        )
+
+def _assert_same_rows(warehouse, snapshot_dir):
+    with duckdb.connect(str(warehouse), read_only=True) as con:
+        for table_name in LAKE_TABLES:
+            expected = con.execute(f"SELECT * FROM {table_name} ORDER BY ALL").fetchall()
+            actual = con.execute(f"SELECT * FROM ({lake_table_sql(snapshot_dir, table_name)}) ORDER BY ALL").fetchall()
+            assert actual == expected, table_name
+
+def _add_april(warehouse):
+    """Copia las declaraciones de marzo en abril y recalcula sólo esa partición."""
+    with duckdb.connect(str(warehouse)) as con:
+        for table_name in ("exportaciones", "bultos_exportaciones"):
+            con.execute(f"""
+                INSERT INTO {table_name} BY NAME
+                SELECT * REPLACE (FECHAACEPT + INTERVAL 1 MONTH AS FECHAACEPT, NUMEROIDENT + 1000 AS NUMEROIDENT, 4 AS mes)
+                FROM {table_name}
+            """)
+    with disable_run_logger():
+        create_analytical_models.fn(db_path=warehouse, partitions=[202504])
+
+@pytest.fixture
+def lake_dir(tmp_path):
+    path = tmp_path / "lake"
+    path.mkdir()
+    return path
+
+def test_full_export_writes_hive_partitions_and_publishes_pointer(warehouse, lake_dir):
+    snapshot = _export(warehouse, lake_dir, "s1", base_generation=1)
+    assert read_lake_pointer(lake_dir) is None
+
+    snapshot_dir = lake_dir / "s1"
+    assert (snapshot_dir / "exportaciones" / "año=2025" / "mes=3" / "data.parquet").is_file()
+    assert (snapshot_dir / "agg_top_exportadores_semanal" / "año=2025" / "data.parquet").is_file()
+    assert (snapshot_dir / "dim_exportador" / "data.parquet").is_file()
+    assert snapshot["files"] == len(list(snapshot_dir.glob("**/*.parquet")))
+    _assert_same_rows(warehouse, snapshot_dir)
+
+    publish_lake_snapshot(lake_dir, "s1", generation=1)
+    assert read_lake_pointer(lake_dir) == {"snapshot": "s1", "generation": 1}
+    assert not (lake_dir / "CURRENT.tmp").exists()
+
+def test_incremental_export_links_untouched_partitions(warehouse, lake_dir):
+    _export(warehouse, lake_dir, "s1", base_generation=1)
+    publish_lake_snapshot(lake_dir, "s1", generation=1)
+    _add_april(warehouse)
+
+    _export(warehouse, lake_dir, "s2", base_generation=1, partitions=[202504])
+    march = "exportaciones/año=2025/mes=3/data.parquet"
+    assert (lake_dir / "s2" / march).stat().st_ino == (lake_dir / "s1" / march).stat().st_ino
+    assert (lake_dir / "s2" / "exportaciones" / "año=2025" / "mes=4" / "data.parquet").is_file()
+    # Se reescribe completa aunque la carga sea incremental.
+    peso = "agg_peso_bultos_diario/año=2025/mes=3/data.parquet"
+    assert (lake_dir / "s2" / peso).stat().st_ino != (lake_dir / "s1" / peso).stat().st_ino
+    _assert_same_rows(warehouse, lake_dir / "s2")
+    # La instantánea publicada sigue vigente hasta que se publica la nueva.
+    assert read_lake_pointer(lake_dir)["snapshot"] == "s1"
+
+    (lake_dir / "huerfana").mkdir()
+    publish_lake_snapshot(lake_dir, "s2", generation=2)
+    assert read_lake_pointer(lake_dir) == {"snapshot": "s2", "generation": 2}
+    assert sorted(path.name for path in lake_dir.iterdir() if path.is_dir()) == ["s1", "s2"]
+
+def test_incremental_export_of_another_generation_is_full(warehouse, lake_dir):
+    _export(warehouse, lake_dir, "s1", base_generation=1)
+    publish_lake_snapshot(lake_dir, "s1", generation=1)
+    _add_april(warehouse)
+
+    _export(warehouse, lake_dir, "s2", base_generation=5, partitions=[202504])
+    march = "exportaciones/año=2025/mes=3/data.parquet"
+    assert (lake_dir / "s2" / march).stat().st_ino != (lake_dir / "s1" / march).stat().st_ino
+    _assert_same_rows(warehouse, lake_dir / "s2")
+
+def test_discarded_snapshot_keeps_published_pointer(warehouse, lake_dir):
+    _export(warehouse, lake_dir, "s1", base_generation=1)
+    publish_lake_snapshot(lake_dir, "s1", generation=1)
+    _export(warehouse, lake_dir, "s2", base_generation=1, partitions=[202503])
+
+    discard_lake_snapshot(lake_dir, "s2")
+    assert not (lake_dir / "s2").exists()
+    assert read_lake_pointer(lake_dir) == {"snapshot": "s1", "generation": 1}
+    _assert_same_rows(warehouse, lake_dir / "s1")
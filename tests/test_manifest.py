@@ -0,0 +1,93 @@
+import duckdb
+import pytest
+from prefect.logging import disable_run_logger
+
+from aduanas_conecta_logis_back.etl.config import BULTOS_COLS_MAP
+from aduanas_conecta_logis_back.etl.load import clear_partitions
+from aduanas_conecta_logis_back.etl.manifest import MANIFEST_TABLE, fingerprint_source, plan_incremental_load, record_manifest
+from aduanas_conecta_logis_back.etl.native import ingest_with_duckdb
+
+# Dos archivos de marzo y uno de abril: (nombre, líneas).
+FILES = {
+    "bultos_marzo_1.txt": ["1;03032025;a;b;5", "2;04032025;a;b;3"],
+    "bultos_marzo_2.txt": ["3;10032025;a;b;7"],
+    "bultos_abril.txt": ["4;02042025;a;b;2", "5;15042025;a;b;1"],
+}
+
+@pytest.fixture
+def source(tmp_path):
+    paths = []
+    for name, lines in FILES.items():
+        path = tmp_path / name
+        path.write_text("\n".join(lines) + "\n", encoding="latin-1")
+        paths.append(path)
+    return {"files": paths, "cols_map": BULTOS_COLS_MAP, "separator": ";", "decimal_separator": "."}
+
+def _ingest(source, db_path, partitions=None):
+    ingest_with_duckdb.fn(
+        source_config=source, db_path=db_path, table_name="bultos_exportaciones", source_name="bultos", partitions=partitions
+    )
+
+def _full_load(source, db_path):
+    """Carga completa, como la del flujo: reemplaza la tabla y el manifiesto de la fuente."""
+    with disable_run_logger():
+        _ingest(source, db_path)
+        record_manifest.fn(db_path=db_path, source_name="bultos", entries=fingerprint_source.fn(source_config=source), replace=True)
+
+def _incremental_load(source, db_path):
+    """Carga incremental, como la del flujo: lee sólo lo que indica el plan."""
+    with disable_run_logger():
+        plan = plan_incremental_load.fn(db_path=db_path, source_name="bultos", source_config=source)
+        if plan["files"]:
+            _ingest({**source, "files": plan["files"]}, db_path, plan["partitions"])
+        elif plan["partitions"]:
+            clear_partitions.fn(db_path=db_path, table_name="bultos_exportaciones", partitions=plan["partitions"])
+        record_manifest.fn(db_path=db_path, source_name="bultos", entries=plan["manifest"], removed=plan["removed"])
+    return plan
+
+def _contents(db_path):
+    with duckdb.connect(str(db_path), read_only=True) as con:
+        rows = con.execute("SELECT NUMEROIDENT, FECHAACEPT, CANTIDADBULTO FROM bultos_exportaciones ORDER BY ALL").fetchall()
+        files = con.execute(f"SELECT file_path, partitions FROM {MANIFEST_TABLE} ORDER BY file_path").fetchall()
+    return rows, files
+
+def test_plan_reads_changed_files_and_the_files_sharing_their_partitions(source, tmp_path):
+    db_path = tmp_path / "bodega.db"
+    _full_load(source, db_path)
+    marzo_1, marzo_2, abril = source["files"]
+
+    assert _incremental_load(source, db_path) == {"files": [], "partitions": [], "manifest": [], "removed": []}
+
+    with open(abril, "a", encoding="latin-1") as f:
+        f.write("6;20042025;a;b;4\n")
+    plan = _incremental_load(source, db_path)
+    assert (plan["files"], plan["partitions"]) == ([abril], [202504])
+
+    with open(marzo_1, "a", encoding="latin-1") as f:
+        f.write("7;05032025;a;b;1\n")
+    plan = _incremental_load(source, db_path)
+    assert (plan["files"], plan["partitions"]) == ([marzo_1, marzo_2], [202503])
+
+    _full_load(source, tmp_path / "completa.db")
+    assert _contents(db_path) == _contents(tmp_path / "completa.db")
+
+@pytest.mark.parametrize("removed, read", [
+    # Otro archivo de marzo sigue en la fuente y se vuelve a leer.
+    ("bultos_marzo_2.txt", ["bultos_marzo_1.txt"]),
+    # Nadie más carga abril: la partición sólo se vacía.
+    ("bultos_abril.txt", []),
+])
+def test_removed_file_leaves_the_same_warehouse_as_a_full_load(source, tmp_path, removed, read):
+    db_path = tmp_path / "bodega.db"
+    _full_load(source, db_path)
+    (tmp_path / removed).unlink()
+    remaining = {**source, "files": [f for f in source["files"] if f.name != removed]}
+
+    plan = _incremental_load(remaining, db_path)
+    assert plan["removed"] == [str(tmp_path / removed)]
+    assert [f.name for f in plan["files"]] == read
+
+    _full_load(remaining, tmp_path / "completa.db")
+    assert _contents(db_path) == _contents(tmp_path / "completa.db")
+    # La siguiente carga ya no tiene nada que hacer.
+    assert _incremental_load(remaining, db_path)["partitions"] == []
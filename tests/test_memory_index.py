@@ -0,0 +1,89 @@
+import os
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from aduanas_conecta_logis_back.api.db import ConnectionPool
+from aduanas_conecta_logis_back.api.memory_index import MemoryIndex
+from tests.conftest import build_warehouse
+
+# En `build_warehouse` los días 1 y 2 de marzo de 2025 caen en la semana
+# 2025-08 (desde el lunes 24 de febrero) y el 3 en la 2025-09.
+RANGES = [
+    (date(2025, 2, 24), date(2025, 3, 31)),
+    (date(2025, 2, 24), date(2025, 3, 2)),
+    (date(2025, 3, 3), date(2025, 3, 3)),
+    (date(2025, 4, 7), date(2025, 4, 30)),
+]
+
+@pytest.fixture
+def pool(warehouse):
+    pool = ConnectionPool(warehouse)
+    pool.version = lambda: 1
+    yield pool
+    pool.close()
+
+def _rows(table):
+    return [tuple(row.values()) for row in table.to_pylist()]
+
+@pytest.mark.parametrize("first_week, end", RANGES)
+@pytest.mark.parametrize("top", [1, 2, 10])
+def test_top_exporters_match_the_weekly_ranking_view(pool, first_week, end, top):
+    index = MemoryIndex(pool.cursor, pool.version)
+    expected = pool.cursor().execute("""
+        SELECT week, rank, NRO_EXPORTADOR, total_fob
+        FROM V_TOP_EXPORTADORES_SEMANAL
+        WHERE week_start BETWEEN ? AND ? AND rank <= ?
+        ORDER BY week_start, rank, NRO_EXPORTADOR
+    """, [first_week, end, top]).fetchall()
+    assert _rows(index.snapshot().top_exporters(first_week, end, top)) == expected
+
+@pytest.mark.parametrize("start, end", [(None, None), *RANGES])
+@pytest.mark.parametrize("nro", [7, 8])
+def test_exporter_history_matches_the_series_views(pool, nro, start, end):
+    index = MemoryIndex(pool.cursor, pool.version)
+    queries = {
+        "weekly": "SELECT week, total_fob FROM V_FOB_EXPORTADOR_SEMANAL WHERE NRO_EXPORTADOR = ? AND week_start BETWEEN ? AND ? ORDER BY week_start",
+        "daily": "SELECT strftime(fecha, '%Y-%m-%d'), total_fob FROM V_FOB_EXPORTADOR_DIARIO WHERE NRO_EXPORTADOR = ? AND fecha BETWEEN ? AND ? ORDER BY fecha",
+    }
+    for granularity, query in queries.items():
+        expected = pool.cursor().execute(query, [nro, start or date.min, end or date.max]).fetchall()
+        assert _rows(index.snapshot().exporter_history(nro, granularity, start, end)) == expected
+
+def test_unknown_exporter_has_no_history(pool):
+    index = MemoryIndex(pool.cursor, pool.version)
+    assert index.snapshot().exporter_history(99, "weekly", None, None) is None
+
+def test_index_is_rebuilt_when_the_version_changes(warehouse, tmp_path):
+    version = {"value": 1}
+    pool = ConnectionPool(warehouse)
+    pool.version = lambda: version["value"]
+    index = MemoryIndex(pool.cursor, pool.version)
+    try:
+        snapshot = index.snapshot()
+        assert index.snapshot() is snapshot
+        assert snapshot.exporter_history(7, "daily", None, None).num_rows == 3
+
+        # Se publica una bodega con dos días más.
+        os.replace(build_warehouse(tmp_path / "nueva.db", days=5), warehouse)
+        assert index.snapshot() is snapshot
+        version["value"] = 2
+        rebuilt = index.snapshot()
+        assert rebuilt is not snapshot
+        assert rebuilt.exporter_history(7, "daily", None, None).num_rows == 5
+    finally:
+        pool.close()
+
+def test_endpoints_answer_from_the_index(api):
+    client = TestClient(api.app)
+    top = client.get("/api/rankings/exporters-weekly/top?start_date=2025-03-01&end_date=2025-03-31&top=1").json()
+    expected = api.pool.cursor().execute("""
+        SELECT week, NRO_EXPORTADOR, total_fob FROM V_TOP_EXPORTADORES_SEMANAL WHERE rank = 1 ORDER BY week_start
+    """).fetchall()
+    assert [(row["week"], row["nro_exportador"], row["total_fob"]) for row in top] == expected
+
+    # Con `weekly` la primera semana es la que contiene a `start_date`.
+    history = client.get("/api/exporters/7/history?start_date=2025-03-02").json()
+    assert [row["period"] for row in history] == ["2025-08", "2025-09"]
+    assert client.get("/api/exporters/99/history").status_code == 404
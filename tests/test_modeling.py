@@ -0,0 +1,77 @@
+from datetime import date
+
+import duckdb
+import pytest
+from prefect.logging import disable_run_logger
+
+from aduanas_conecta_logis_back.etl.modeling import SUMMARY_TABLES, create_analytical_models
+
+# Declaraciones con varios ítems y varias líneas de bultos: (NUMEROIDENT, día, pesos de los ítems, bultos por línea).
+DECLARATIONS = [
+    (100, 3, [10.0, 20.0, 30.0], [2, 3]),
+    (101, 3, [40.0], [4, 4, 2]),
+    (102, 4, [5.0, 7.0], [3]),
+]
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "bodega.db"
+    with duckdb.connect(str(path)) as con:
+        con.execute("""
+            CREATE TABLE exportaciones (
+                FECHAACEPT TIMESTAMP_NS, NUMEROIDENT BIGINT, NRO_EXPORTADOR BIGINT, PESOBRUTOTOTAL DOUBLE,
+                FOBUNITARIO DOUBLE, PESOBRUTOITEM DOUBLE, CODIGOARANCEL BIGINT, año INTEGER, mes INTEGER
+            )
+        """)
+        con.execute("CREATE TABLE bultos_exportaciones (NUMEROIDENT BIGINT, FECHAACEPT TIMESTAMP_NS, CANTIDADBULTO BIGINT, año INTEGER, mes INTEGER)")
+        for nro, day, pesos, bultos in DECLARATIONS:
+            fecha = date(2025, 3, day)
+            for peso in pesos:
+                con.execute("INSERT INTO exportaciones VALUES (?, ?, 7, ?, 1.0, ?, 1234567, 2025, 3)", [fecha, nro, sum(pesos), peso])
+            for cantidad in bultos:
+                con.execute("INSERT INTO bultos_exportaciones VALUES (?, ?, ?, 2025, 3)", [nro, fecha, cantidad])
+    return path
+
+def _declaration_totals(con):
+    return con.execute("""
+        SELECT p.NUMEROIDENT, p.peso_total, b.total_bultos
+        FROM peso_por_declaracion AS p JOIN bultos_por_declaracion AS b USING (NUMEROIDENT)
+        ORDER BY p.NUMEROIDENT
+    """).fetchall()
+
+@pytest.mark.parametrize("partitions", [None, [202503]])
+def test_weight_per_bulto_does_not_fan_out_items_and_bultos(db_path, partitions):
+    with disable_run_logger():
+        create_analytical_models.fn(db_path=db_path)
+        if partitions is not None:
+            create_analytical_models.fn(db_path=db_path, partitions=partitions)
+
+    with duckdb.connect(str(db_path), read_only=True) as con:
+        assert _declaration_totals(con) == [(100, 60.0, 5), (101, 40.0, 10), (102, 12.0, 3)]
+        assert con.execute("SELECT fecha, peso_sum, bultos_sum FROM agg_peso_bultos_diario ORDER BY fecha").fetchall() == [
+            (date(2025, 3, 3), 100.0, 15),
+            (date(2025, 3, 4), 12.0, 3),
+        ]
+        averages = con.execute(
+            "SELECT fecha_aceptacion, average_weight_per_bulto FROM V_PESO_PROMEDIO_BULTO ORDER BY fecha_aceptacion"
+        ).fetchall()
+    assert averages == [(date(2025, 3, 3), pytest.approx(100 / 15)), (date(2025, 3, 4), pytest.approx(4.0))]
+
+def _summaries(db_path):
+    with duckdb.connect(str(db_path), read_only=True) as con:
+        return {table: con.execute(f"SELECT * FROM {table} ORDER BY ALL").fetchall() for table in ["peso_por_declaracion", "bultos_por_declaracion", *SUMMARY_TABLES]}
+
+@pytest.mark.parametrize("change, partition", [
+    # Bultos de la declaración 1000 (aceptada el 1 de marzo) registrados en abril.
+    ("INSERT INTO bultos_exportaciones BY NAME SELECT 1000 AS NUMEROIDENT, TIMESTAMP '2025-04-02' AS FECHAACEPT, 3 AS CANTIDADBULTO, 2025 AS año, 4 AS mes", 202504),
+    # Un ítem de febrero adelanta la fecha de la declaración 1011, antes del 3 de marzo.
+    ("INSERT INTO exportaciones BY NAME SELECT * REPLACE (TIMESTAMP '2025-02-27' AS FECHAACEPT, 9.0 AS PESOBRUTOITEM, 2 AS mes) FROM exportaciones WHERE NUMEROIDENT = 1011 LIMIT 1", 202502),
+])
+def test_incremental_refresh_matches_full_rebuild_across_months(warehouse, change, partition):
+    with duckdb.connect(str(warehouse)) as con:
+        con.execute(change)
+    with disable_run_logger():
+        create_analytical_models.fn(db_path=warehouse, partitions=[partition])
+        incremental = _summaries(warehouse)
+        create_analytical_models.fn(db_path=warehouse)
+    assert incremental == _summaries(warehouse)
@@ -0,0 +1,42 @@
+import duckdb
+from prefect.logging import disable_run_logger
+
+from aduanas_conecta_logis_back.etl.config import BULTOS_COLS_MAP
+from aduanas_conecta_logis_back.etl.extract import extract_from_files
+from aduanas_conecta_logis_back.etl.parallel import open_file_pool, submit_source_files, load_extracted_files
+from aduanas_conecta_logis_back.etl.transform import clean_and_transform_split
+
+# El segundo archivo repite un registro válido y uno rechazado del primero.
+FILES = {
+    "bultosMarzo2025.txt": ["1;01032025;a;b;5", "x;01032025;a;b;1", "2;02032025;a;b;3"],
+    "bultosAbril2025.txt": ["1;01032025;a;b;5", "3;01042025;a;b;4", "x;01032025;a;b;1", "3;01042025;a;b;4"],
+}
+
+def test_duplicates_across_files_are_dropped_like_pandas(tmp_path):
+    files = []
+    for name, lines in FILES.items():
+        files.append(tmp_path / name)
+        files[-1].write_text("\n".join(lines) + "\n", encoding="latin-1")
+    source = {"files": files, "cols_map": BULTOS_COLS_MAP, "separator": ";", "decimal_separator": "."}
+    db_path = tmp_path / "bodega.db"
+
+    executor = open_file_pool(2)
+    try:
+        with disable_run_logger():
+            rows_loaded = load_extracted_files(
+                submit_source_files(executor, source, files), source, db_path, "bultos_exportaciones", "bultos"
+            )
+    finally:
+        executor.shutdown()
+
+    with disable_run_logger():
+        df_raw = extract_from_files.fn(file_paths=files, cols_map=BULTOS_COLS_MAP, separator=";", decimal_separator=".")
+        df_good, df_rejected = clean_and_transform_split.fn(df=df_raw, decimal_separator=".")
+
+    with duckdb.connect(str(db_path), read_only=True) as con:
+        loaded = con.execute("SELECT NUMEROIDENT, CANTIDADBULTO FROM bultos_exportaciones ORDER BY ALL").fetchall()
+        rejected = con.execute("SELECT source_file, line_number FROM rejected_records").fetchall()
+    assert rows_loaded == len(df_good) == 3
+    assert loaded == [(1, 5), (2, 3), (3, 4)]
+    assert len(df_rejected) == 1
+    assert rejected == [(str(files[0]), 2)]
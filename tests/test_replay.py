@@ -0,0 +1,64 @@
+import duckdb
+import pandas as pd
+from prefect.logging import disable_run_logger
+
+from aduanas_conecta_logis_back.etl.config import BULTOS_COLS_MAP
+from aduanas_conecta_logis_back.etl.extract import extract_from_files
+from aduanas_conecta_logis_back.etl.modeling import create_analytical_models
+from aduanas_conecta_logis_back.etl.rejects import BAD_DATE, BAD_NUMEROIDENT, PENDING, REJECTS_TABLE, REPLAYED, save_rejected_records
+from aduanas_conecta_logis_back.etl.replay import export_pending_rejects, read_corrections, replay_rejected_records
+from aduanas_conecta_logis_back.etl.transform import clean_and_transform_split
+
+# Bultos de la declaración 1000 (1 de marzo en `build_warehouse`) con un ID
+# inválido y una fecha inválida.
+LINES = [
+    "1000;01032025;a;b;2",
+    "x1000;01032025;a;b;4",
+    "1000;99999999;a;b;8",
+]
+
+def _reject_bultos(warehouse, tmp_path):
+    path = tmp_path / "bultos.txt"
+    path.write_text("\n".join(LINES) + "\n", encoding="latin-1")
+    with disable_run_logger():
+        df_raw = extract_from_files.fn(file_paths=[path], cols_map=BULTOS_COLS_MAP, separator=";", decimal_separator=".")
+        _, df_rejected = clean_and_transform_split.fn(df=df_raw, decimal_separator=".")
+        save_rejected_records.fn(df=df_rejected, db_path=warehouse, source_name="bultos", run_id="carga")
+
+def _bultos_1000(con):
+    return con.execute("SELECT total_bultos FROM bultos_por_declaracion WHERE NUMEROIDENT = 1000").fetchone()[0]
+
+def test_exported_rejects_replay_after_correction(warehouse, tmp_path):
+    _reject_bultos(warehouse, tmp_path)
+    corrections_path = tmp_path / "correcciones.csv"
+    assert export_pending_rejects("bultos", corrections_path, db_path=warehouse) == 2
+
+    # Se corrige el ID; la fecha inválida queda igual.
+    corrections = read_corrections("bultos", corrections_path)
+    assert corrections["reject_id"].tolist() == ["bultos.txt:2", "bultos.txt:3"]
+    corrections.loc[0, "NUMEROIDENT"] = "1000"
+    corrections.to_csv(corrections_path, sep=";", index=False, encoding="latin-1")
+
+    with duckdb.connect(str(warehouse), read_only=True) as con:
+        bultos_before = _bultos_1000(con)
+    with disable_run_logger():
+        partitions = replay_rejected_records.fn(
+            db_path=warehouse, source_name="bultos", corrections=read_corrections("bultos", corrections_path), run_id="reproceso"
+        )
+        create_analytical_models.fn(db_path=warehouse, partitions=partitions)
+
+    assert partitions == [202503]
+    with duckdb.connect(str(warehouse), read_only=True) as con:
+        assert _bultos_1000(con) == bultos_before + 4
+        assert con.execute(f"SELECT reject_id, status, reason, replay_run_id FROM {REJECTS_TABLE} ORDER BY reject_id").fetchall() == [
+            ("bultos.txt:2", REPLAYED, BAD_NUMEROIDENT, "reproceso"),
+            ("bultos.txt:3", PENDING, BAD_DATE, None),
+        ]
+
+    # Sólo queda pendiente la fecha inválida, y volver a reprocesar no carga nada.
+    assert export_pending_rejects("bultos", corrections_path, db_path=warehouse) == 1
+    with disable_run_logger():
+        again = replay_rejected_records.fn(
+            db_path=warehouse, source_name="bultos", corrections=read_corrections("bultos", corrections_path), run_id="otra"
+        )
+    assert again == []
@@ -0,0 +1,12 @@
+import statistics
+
+from benchmarks.startup import DEFAULT_BUDGET_MS, _run_once, _violations
+
+def test_api_import_skips_etl_dependencies_and_fits_the_budget():
+    _run_once()  # Calentamiento: compila los .pyc y carga los archivos en la caché del sistema.
+    results = [_run_once()[0] for _ in range(3)]
+
+    for package in ("prefect", "pandas"):
+        assert not any(module == package or module.startswith(package + ".") for module in results[-1]["modules"])
+    assert _violations(results[-1]["modules"]) == []
+    assert statistics.median(result["seconds"] * 1000 for result in results) <= DEFAULT_BUDGET_MS
@@ -0,0 +1,71 @@
+import duckdb
+import pytest
+from prefect.logging import disable_run_logger
+
+from aduanas_conecta_logis_back.etl import extract, main
+from aduanas_conecta_logis_back.etl.config import BULTOS_COLS_MAP
+from aduanas_conecta_logis_back.etl.extract import extract_from_files
+from aduanas_conecta_logis_back.etl.transform import clean_and_transform_split
+
+# Con bloques de 2 filas, los duplicados de las filas 1 y 4 caen en el bloque siguiente.
+LINES = [
+    "1;01032025;a;b;5",
+    "2;01032025;a;b;3",
+    "1;01032025;a;b;5",
+    "x;01032025;a;b;1",
+    "x;01032025;a;b;1",
+    "3;02032025;a;b;7",
+]
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "bultos.txt"
+    path.write_text("\n".join(LINES) + "\n", encoding="latin-1")
+    return {"files": [path], "cols_map": BULTOS_COLS_MAP, "separator": ";", "decimal_separator": "."}
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(main, "CHUNK_MAX_ROWS", 2)
+
+def _stream(source, db_path):
+    with disable_run_logger():
+        return main.stream_source_to_duckdb.fn(
+            source_config=source, db_path=db_path, table_name="bultos_exportaciones", source_name="bultos"
+        )
+
+def test_duplicates_across_chunks_are_dropped_like_pandas(source, tmp_path):
+    db_path = tmp_path / "bodega.db"
+    rows_loaded = _stream(source, db_path)
+
+    with disable_run_logger():
+        df_raw = extract_from_files.fn(
+            file_paths=source["files"], cols_map=source["cols_map"],
+            separator=source["separator"], decimal_separator=source["decimal_separator"]
+        )
+        df_good, df_rejected = clean_and_transform_split.fn(df=df_raw, decimal_separator=".")
+
+    with duckdb.connect(str(db_path), read_only=True) as con:
+        loaded = con.execute("SELECT NUMEROIDENT, CANTIDADBULTO FROM bultos_exportaciones ORDER BY NUMEROIDENT").fetchall()
+        rejected = con.execute("SELECT line_number FROM rejected_records").fetchall()
+    assert rows_loaded == len(df_good) == 3
+    assert loaded == [(1, 5), (2, 3), (3, 7)]
+    assert len(rejected) == len(df_rejected) == 1
+
+def test_error_mid_file_rolls_back_the_load(source, tmp_path, monkeypatch):
+    db_path = tmp_path / "bodega.db"
+    with duckdb.connect(str(db_path)) as con:
+        con.execute("CREATE TABLE bultos_exportaciones AS SELECT 99 AS NUMEROIDENT")
+
+    read_chunk = extract._read_with_bad_lines
+    calls = []
+    def failing_read(read):
+        calls.append(read)
+        if len(calls) == 2:
+            raise OSError("disco desconectado")
+        return read_chunk(read)
+    monkeypatch.setattr(extract, "_read_with_bad_lines", failing_read)
+
+    with pytest.raises(OSError):
+        _stream(source, db_path)
+    with duckdb.connect(str(db_path), read_only=True) as con:
+        assert con.execute("SELECT NUMEROIDENT FROM bultos_exportaciones").fetchall() == [(99,)]